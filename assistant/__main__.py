@@ -1,7 +1,89 @@
-from assistant.cli.repl import run_repl
+import argparse
+import sys
 
 
 def main() -> None:
+    if sys.argv[1:2] == ["client"]:
+        # The thin client must not pay for importing (let alone loading) the stores
+        from assistant.cli.client import main as client_main
+
+        sys.exit(client_main(sys.argv[2:]))
+
+    from assistant.storage.factory import BACKENDS
+    from assistant.utils.io import CODECS
+    from assistant.utils.instrumentation import metrics
+
+    parser = argparse.ArgumentParser(prog="assistant")
+    parser.add_argument("--script", metavar="FILE", help="Run commands from FILE (one per line; - for stdin) and exit")
+    parser.add_argument("--json", action="store_true", help="With --script: one JSON object per command on stdout")
+    parser.add_argument(
+        "--commit-every",
+        type=int,
+        default=0,
+        metavar="N",
+        help="With --script: commit writes every N commands (default: once, at the end)",
+    )
+    parser.add_argument("--trace", metavar="FILE", help="Append one JSON line per command with its timings and I/O")
+    parser.add_argument("--trace-memory", action="store_true", help="With --trace: also record peak memory (slower)")
+    sub = parser.add_subparsers(dest="command")
+    convert = sub.add_parser("convert", help="Convert ~/.assistant stores between storage backends")
+    convert.add_argument("--to", dest="target", required=True, choices=BACKENDS)
+    convert.add_argument("--from", dest="source", default="json", choices=BACKENDS)
+    convert.add_argument("--codec", choices=CODECS, help="File format to write (--to may then equal --from)")
+    reshard = sub.add_parser("reshard", help="Rebalance sharded stores into a new number of shards")
+    reshard.add_argument("--shards", type=int, help="Shard count (default: picked from the store size, ~1 MiB per shard)")
+    migrate = sub.add_parser("migrate", help="Upgrade contacts stored under an older schema (validated in parallel)")
+    migrate.add_argument("--workers", type=int, help="Validating processes (default: one per CPU)")
+    migrate.add_argument("--check", action="store_true", help="Only validate and count the older contacts; write nothing")
+    serve = sub.add_parser("serve", help="Keep the stores loaded and answer commands from `assistant client`")
+    serve.add_argument("--socket", metavar="PATH", help="Unix socket to listen on (default: ~/.assistant/assistant.sock)")
+    serve.add_argument("--port", type=int, help="Listen on 127.0.0.1:PORT instead of a Unix socket")
+    sub.add_parser("client", help="Send commands to a running server (see: assistant client --help)")
+    args = parser.parse_args()
+
+    if args.trace is not None:
+        metrics.enable(trace_path=args.trace, trace_memory=args.trace_memory)
+    try:
+        _run(args)
+    finally:
+        metrics.close()
+
+
+def _run(args: argparse.Namespace) -> None:
+    from assistant.cli.repl import flush_output, run_repl
+
+    if args.command == "serve":
+        from assistant.cli.server import run_server
+
+        run_server(args.socket, args.port)
+        return
+    if args.command == "reshard":
+        from assistant.cli.admin import reshard_stores
+
+        reshard_stores(args.shards)
+        flush_output()
+        return
+    if args.command == "migrate":
+        from assistant.cli.admin import migrate_contacts
+
+        migrate_contacts(args.workers, args.check)
+        flush_output()
+        return
+    if args.command == "convert":
+        from assistant.cli.admin import convert_stores
+
+        convert_stores(args.target, args.source, args.codec)
+        flush_output()
+        return
+    if args.script is not None:
+        from assistant.cli.script import run_script
+
+        if args.script == "-":
+            failed = run_script(sys.stdin, json_output=args.json, commit_every=args.commit_every)
+        else:
+            with open(args.script, "r", encoding="utf-8") as f:
+                failed = run_script(f, json_output=args.json, commit_every=args.commit_every)
+        sys.exit(1 if failed else 0)
     run_repl()
 
 
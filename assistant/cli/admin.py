@@ -0,0 +1,62 @@
+from __future__ import annotations
+import os
+from typing import List, Optional, Tuple
+
+from assistant.cli.repl import (
+    CONTACTS_FILE,
+    MAX_REPORTED_REJECTS,
+    NOTES_FILE,
+    STORAGE_BACKEND,
+    STORAGE_CODEC,
+    print_error,
+    print_line,
+)
+from assistant.models.contact import SCHEMA_VERSION
+from assistant.services.contacts_service import ContactsService
+from assistant.storage.factory import convert_storage, open_storage
+from assistant.storage.sharded_store import ShardedStorage, sharded_path
+
+
+STORES: List[Tuple[str, str]] = [
+    (CONTACTS_FILE, "contacts"),
+    (NOTES_FILE, "notes"),
+]
+
+
+def convert_stores(target: str, source: str = "json", codec: Optional[str] = None) -> None:
+    for file_path, kind in STORES:
+        count = convert_storage(file_path, source, target, kind=kind, codec=codec)
+        suffix = f" ({codec})" if codec else ""
+        print_line(f"Converted {count} {kind} from {source} to {target}{suffix}")
+
+
+def reshard_stores(count: Optional[int] = None) -> None:
+    for file_path, kind in STORES:
+        if not os.path.isdir(sharded_path(file_path)):
+            print_error(f"The {kind} store is not sharded. Convert it first: python -m assistant convert --to sharded")
+            continue
+        storage = ShardedStorage(file_path, codec=STORAGE_CODEC)
+        before = storage.shard_count
+        records = storage.reshard(count)
+        print_line(f"Resharded {records} {kind} from {before} to {storage.shard_count} shards")
+
+
+def migrate_contacts(workers: Optional[int] = None, check: bool = False) -> None:
+    # Notes have no load-time normalization, so only contacts carry a schema
+    contacts = ContactsService(open_storage(CONTACTS_FILE, STORAGE_BACKEND, "contacts", STORAGE_CODEC))
+    try:
+        report = contacts.migrate(workers, check=check)
+    finally:
+        contacts.close()
+    if not report.total:
+        print_line(f"All contacts are at schema {SCHEMA_VERSION}")
+        return
+    done = "can be upgraded" if check else "upgraded"
+    print_line(f"{report.succeeded} of {report.total} older contacts {done} to schema {SCHEMA_VERSION} in {report.elapsed:.2f}s")
+    if not report.failed:
+        return
+    print_line(f"{report.failed} failed validation and were left as they are (fix them with contact edit):")
+    for _, error in report.failures[:MAX_REPORTED_REJECTS]:
+        print_line(f"  {error}")
+    if report.failed > MAX_REPORTED_REJECTS:
+        print_line(f"  ... and {report.failed - MAX_REPORTED_REJECTS} more")
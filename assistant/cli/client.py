@@ -0,0 +1,132 @@
+# Thin client for `python -m assistant serve`: sends commands to the running
+# server and prints its output. Imports nothing but the standard library, so a
+# call costs interpreter startup plus one round trip instead of loading and
+# indexing the stores.
+#
+# Protocol (both directions one JSON object per line, UTF-8):
+#   request   {"command": "contact list limit=5", "id": 1}
+#             {"op": "health"} | {"op": "metrics"}
+#   response  {"id": 1, "ok": true, "output": ["..."], "elapsed": 0.0012}
+# Over TCP the first request must be {"op": "auth", "token": "..."}, with the
+# token the server wrote to TOKEN_PATH (readable by its user only); anything
+# else closes the connection. The Unix socket itself is private to that user.
+from __future__ import annotations
+import argparse
+import json
+import os
+import shlex
+import socket
+import sys
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional
+
+SOCKET_PATH = os.path.join(os.path.expanduser("~"), ".assistant", "assistant.sock")
+TOKEN_PATH = os.path.join(os.path.expanduser("~"), ".assistant", "server.token")
+HOST = "127.0.0.1"
+
+
+def connect(socket_path: Optional[str] = None, port: Optional[int] = None) -> socket.socket:
+    if port is not None:
+        return socket.create_connection((HOST, port))
+    if not hasattr(socket, "AF_UNIX"):
+        raise OSError("Unix sockets are not available here; use --port")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path or SOCKET_PATH)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def read_token(token_path: Optional[str] = None) -> str:
+    with open(token_path or TOKEN_PATH, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+class Client:
+    def __init__(self, socket_path: Optional[str] = None, port: Optional[int] = None, token_path: Optional[str] = None) -> None:
+        self._sock = connect(socket_path, port)
+        self._reader: IO[bytes] = self._sock.makefile("rb")
+        self._next_id = 0
+        if port is not None:
+            try:
+                response = self.request({"op": "auth", "token": read_token(token_path)})
+            except (OSError, ValueError):
+                self.close()
+                raise
+            if not response.get("ok"):
+                self.close()
+                raise PermissionError("the server rejected the token in " + (token_path or TOKEN_PATH))
+
+    def close(self) -> None:
+        self._reader.close()
+        self._sock.close()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        self._next_id += 1
+        message = dict(message, id=self._next_id)
+        self._sock.sendall(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        return json.loads(line)
+
+    def run(self, command: str) -> Dict[str, Any]:
+        return self.request({"command": command})
+
+    def run_many(self, commands: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        for command in commands:
+            yield self.run(command)
+
+
+def _command_lines(lines: Iterable[str]) -> Iterator[str]:
+    # Same rules as --script: blank lines and # comments are skipped
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="assistant client", description="Send commands to a running assistant server")
+    parser.add_argument("--socket", metavar="PATH", help=f"Server Unix socket (default: {SOCKET_PATH})")
+    parser.add_argument("--port", type=int, help=f"Connect to the server on {HOST}:PORT instead of a Unix socket")
+    parser.add_argument("--token-file", metavar="PATH", help=f"With --port: the server's token (default: {TOKEN_PATH})")
+    parser.add_argument("--json", action="store_true", help="Print the raw JSON responses")
+    parser.add_argument("--health", action="store_true", help="Print the server's health and exit")
+    parser.add_argument("--metrics", action="store_true", help="Print the server's latency metrics and exit")
+    parser.add_argument("words", nargs=argparse.REMAINDER, help="Command to run; without one, commands are read from stdin")
+    args = parser.parse_args(argv)
+
+    try:
+        client = Client(args.socket, args.port, args.token_file)
+    except OSError as e:
+        sys.stderr.write(f"Cannot reach the assistant server: {e}. Start it with: python -m assistant serve\n")
+        return 2
+    with client:
+        if args.health or args.metrics:
+            response = client.request({"op": "health" if args.health else "metrics"})
+            sys.stdout.write(json.dumps(response, indent=2) + "\n")
+            return 0 if response.get("ok") else 1
+        if args.words:
+            # A single argument is taken as the whole command line; several are
+            # re-quoted so arguments with spaces survive
+            words = args.words
+            commands: Iterable[str] = [words[0] if len(words) == 1 else shlex.join(words)]
+        else:
+            commands = _command_lines(sys.stdin)
+        failed = 0
+        for response in client.run_many(commands):
+            failed += not response.get("ok")
+            if args.json:
+                sys.stdout.write(json.dumps(response, ensure_ascii=False) + "\n")
+            elif response.get("output"):
+                sys.stdout.write("\n".join(response["output"]) + "\n")
+        sys.stdout.flush()
+    return 1 if failed else 0
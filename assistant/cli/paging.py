@@ -0,0 +1,59 @@
+from __future__ import annotations
+import base64
+import binascii
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+PAGING_KEYS = ("limit", "offset", "cursor")
+
+
+@dataclass
+class Paging:
+    limit: Optional[int] = None
+    offset: int = 0
+    # Identifies the command the cursor belongs to (command words and filters)
+    scope: str = ""
+
+    def next_cursor(self) -> str:
+        return encode_cursor(self.offset + (self.limit or 0), self.scope)
+
+
+def encode_cursor(offset: int, scope: str) -> str:
+    # Opaque to users; the scope checksum rejects cursors reused on another command
+    raw = "%d:%08x" % (offset, zlib.crc32(scope.encode("utf-8")))
+    return base64.urlsafe_b64encode(raw.encode("ascii")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, scope: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        offset_text, checksum = raw.split(":", 1)
+        offset = int(offset_text)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("invalid cursor")
+    if offset < 0 or checksum != "%08x" % zlib.crc32(scope.encode("utf-8")):
+        raise ValueError("cursor does not belong to this command")
+    return offset
+
+
+def split_paging(args: List[str], fields: Dict[str, str], scope: str) -> Tuple[List[str], Paging]:
+    # Strips limit=/offset=/cursor= tokens from args; fields are the parsed key=value pairs
+    rest = [a for a in args if a.split("=", 1)[0] not in PAGING_KEYS]
+    scope = " ".join([scope, *rest])
+    paging = Paging(scope=scope)
+    try:
+        if "limit" in fields:
+            paging.limit = int(fields["limit"])
+        if "offset" in fields:
+            paging.offset = int(fields["offset"])
+    except ValueError:
+        raise ValueError("limit and offset must be integers")
+    if paging.limit is not None and paging.limit <= 0:
+        raise ValueError("limit must be positive")
+    if paging.offset < 0:
+        raise ValueError("offset must be non-negative")
+    if "cursor" in fields:
+        paging.offset = decode_cursor(fields["cursor"], scope)
+    return rest, paging
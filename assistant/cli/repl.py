@@ -1,22 +1,92 @@
 from __future__ import annotations
+import io
 import os
 import shlex
 import sys
 from difflib import get_close_matches
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, TextIO, Tuple
 
-from assistant.services.contacts_service import ContactsService
+from assistant.cli.paging import Paging, split_paging
+from assistant.services.bulk import BulkReport
+from assistant.services.contacts_service import FUZZY_LIMIT, ContactsService
 from assistant.services.notes_service import NotesService
-from assistant.storage.json_store import JSONStorage
+from assistant.storage.factory import open_storage
+from assistant.utils.instrumentation import metrics
+from assistant.utils.io import DEFAULT_CODEC, iter_records
 
 
 DATA_DIR = os.path.join(os.path.expanduser("~"), ".assistant")
 CONTACTS_FILE = os.path.join(DATA_DIR, "contacts.json")
 NOTES_FILE = os.path.join(DATA_DIR, "notes.json")
+STORAGE_BACKEND = os.environ.get("ASSISTANT_STORAGE", "json")
+# File format for writes (see assistant.utils.io.CODECS); files in any codec are read
+STORAGE_CODEC = os.environ.get("ASSISTANT_CODEC", DEFAULT_CODEC)
+MAX_REPORTED_REJECTS = 20
+OUTPUT_BLOCK_SIZE = 64 * 1024  # characters of output handed to stdout per write
+
+
+class CommandOutput:
+    # Lines printed by the current command. Normally handed to stdout in blocks
+    # and flushed once per command; while capturing (script mode with JSON
+    # output) they are kept for the caller instead.
+
+    def __init__(self) -> None:
+        self.lines: List[str] = []
+        self.size = 0
+        self.failed = False
+        self.capturing = False
+
+    def write(self, text: str) -> None:
+        self.lines.append(text)
+        self.size += len(text) + 1
+        if self.size >= OUTPUT_BLOCK_SIZE and not self.capturing:
+            self.write_pending()
+
+    def write_pending(self) -> None:
+        if self.lines and not self.capturing:
+            self.lines.append("")
+            sys.stdout.write("\n".join(self.lines))
+            self.lines = []
+            self.size = 0
+
+    def begin_command(self, capture: bool = False) -> None:
+        self.write_pending()
+        self.capturing = capture
+        self.failed = False
+
+    def end_command(self) -> Tuple[List[str], bool]:
+        # (captured lines, whether the command reported an error)
+        lines: List[str] = []
+        if self.capturing:
+            lines, self.lines, self.size = self.lines, [], 0
+            self.capturing = False
+        return lines, self.failed
+
+
+_output = CommandOutput()
 
 
 def print_line(text: str = "") -> None:
-    sys.stdout.write(text + "\n")
+    # Buffered: written to stdout in blocks, flushed once per command by flush_output()
+    _output.write(text)
+
+
+def print_error(text: str) -> None:
+    # Same as print_line, and marks the current command as failed
+    _output.failed = True
+    _output.write(text)
+
+
+def begin_command(capture: bool = False) -> None:
+    _output.begin_command(capture)
+
+
+def end_command() -> Tuple[List[str], bool]:
+    return _output.end_command()
+
+
+def flush_output() -> None:
+    _output.write_pending()
     sys.stdout.flush()
 
 
@@ -35,6 +105,8 @@ def format_contact(c: Dict) -> str:
         parts.append(f"birthday={c.get('birthday')}")
     if c.get("days_until_birthday") is not None:
         parts.append(f"in={c.get('days_until_birthday')}d")
+    if c.get("similarity") is not None:
+        parts.append(f"similarity={c.get('similarity'):.2f}")
     return "; ".join(parts)
 
 
@@ -49,24 +121,65 @@ def format_note(n: Dict) -> str:
     return "; ".join(parts)
 
 
+def print_page(
+    fetch: Callable[[Optional[int], int], List[Dict]],
+    paging: Paging,
+    formatter: Callable[[Dict], str],
+    empty_message: str,
+) -> None:
+    # fetch(limit, offset); one extra row is requested to tell whether a next page exists
+    limit = paging.limit
+    items = fetch(None if limit is None else limit + 1, paging.offset)
+    if not items:
+        print_line(empty_message)
+        return
+    for item in items[:limit]:
+        print_line(formatter(item))
+    if limit is not None and len(items) > limit:
+        print_line(f"More results: cursor={paging.next_cursor()}")
+
+
+def print_import_report(report: BulkReport, kind: str) -> None:
+    print_line(
+        f"Imported {report.succeeded} of {report.total} {kind} in {report.elapsed:.2f}s "
+        f"({report.rate:.0f} rows/s)"
+    )
+    if not report.failed:
+        return
+    print_line(f"Rejected {report.failed} rows:")
+    for index, error in report.failures[:MAX_REPORTED_REJECTS]:
+        print_line(f"  line {index}: {error}")
+    if report.failed > MAX_REPORTED_REJECTS:
+        print_line(f"  ... and {report.failed - MAX_REPORTED_REJECTS} more")
+
+
 HELP_TEXT = """
 Commands:
   help                                   Show this help
   exit | quit                            Exit the assistant
+  stats [on [memory]|off|reset]          Show or toggle timing, I/O and memory instrumentation
 
   contact add name="..." [address="..."] [phones="+123, +456"] [email="..."] [birthday="YYYY-MM-DD"]
-  contact list
-  contact search <query>
+  contact list [limit=N] [offset=N] [cursor=...]
+  contact search <query> [limit=N] [offset=N] [cursor=...]
+  contact fuzzy <name> [limit=N] [offset=N] [cursor=...]
+  contact by-phone <phone>
+  contact by-email <email>
   contact edit <id> [name="..."] [address="..."] [phones="+123, +456"] [email="..."] [birthday="YYYY-MM-DD"]
   contact delete <id>
   contact birthdays <days>
+  contact import <file.csv|file.jsonl>
+  contact export [file] [format=jsonl|csv] [--sorted]
 
   note add text="..." [tags="tag1,tag2"]
-  note list [sort=created|updated|text|tags]
-  note search <query>
-  note search-tags <tag1,tag2>
+  note list [sort=created|updated|text|tags] [limit=N] [offset=N] [cursor=...]
+  note search <query> [rank=relevance|updated] [limit=N] [offset=N] [cursor=...]
+  note search-tags <tag1,tag2> [limit=N] [offset=N] [cursor=...]
+  note tags
   note edit <id> [text="..."] [tags="tag1,tag2"]
   note delete <id>
+  note import <file.csv|file.jsonl>
+  note export [file] [format=jsonl|csv] [--sorted] [sort=created|updated|text|tags]
 """.strip()
 
 
@@ -74,18 +187,27 @@ VALID_COMMANDS = [
     "help",
     "exit",
     "quit",
+    "stats",
     "contact add",
     "contact list",
     "contact search",
+    "contact fuzzy",
+    "contact by-phone",
+    "contact by-email",
     "contact edit",
     "contact delete",
     "contact birthdays",
+    "contact import",
+    "contact export",
     "note add",
     "note list",
     "note search",
     "note search-tags",
+    "note tags",
     "note edit",
     "note delete",
+    "note import",
+    "note export",
 ]
 
 
@@ -111,16 +233,83 @@ def parse_kv(args: List[str]) -> Dict[str, str]:
     return result
 
 
+def run_export(args: List[str], export: Callable[[TextIO, str], int], kind: str) -> None:
+    # args: [file] [format=jsonl|csv]; stdout when no file (or "-") is given
+    fields = parse_kv(args)
+    paths = [a for a in args if "=" not in a and not a.startswith("--")]
+    path = paths[0] if paths and paths[0] != "-" else None
+    fmt = fields.get("format")
+    if fmt is None:
+        fmt = "csv" if path and path.lower().endswith(".csv") else "jsonl"
+    if fmt not in ("csv", "jsonl"):
+        print_error("format must be csv or jsonl")
+        return
+    if path is None:
+        if _output.capturing:
+            buffer = io.StringIO()
+            export(buffer, fmt)
+            for line in buffer.getvalue().splitlines():
+                print_line(line)
+            return
+        # Export writes to stdout directly; keep it after anything already printed
+        _output.write_pending()
+        export(sys.stdout, fmt)
+        return
+    try:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            count = export(f, fmt)
+    except OSError as e:
+        print_error(f"Error: {e}")
+        return
+    print_line(f"Exported {count} {kind} to {path}")
+
+
+def print_stats(app: "App") -> None:
+    if not metrics.enabled and not metrics.timers:
+        print_line("Instrumentation is off. Turn it on with: stats on [memory]")
+        return
+    snapshot = metrics.snapshot()
+    print_line(f"{'call':44} {'count':>7} {'total ms':>11} {'mean ms':>9} {'max ms':>9}")
+    for name, timer in snapshot["timers"].items():
+        print_line(
+            f"{name:44} {timer['count']:7d} {timer['seconds'] * 1000:11.2f} "
+            f"{timer['seconds'] * 1000 / timer['count']:9.3f} {timer['max_seconds'] * 1000:9.2f}"
+        )
+    counters = snapshot["counters"]
+    print_line(
+        f"I/O: read {counters['bytes_read']:.0f} B, written {counters['bytes_written']:.0f} B, "
+        f"parse {counters['parse_seconds'] * 1000:.1f} ms, serialize {counters['serialize_seconds'] * 1000:.1f} ms, "
+        f"fsyncs {counters['fsyncs']:.0f} ({counters['fsync_seconds'] * 1000:.1f} ms)"
+    )
+    if snapshot["peak_memory"] is not None:
+        print_line(f"Peak traced memory of a single command: {snapshot['peak_memory'] / 1024:.1f} KiB")
+    for kind, service in (("contacts", app.contacts), ("notes", app.notes)):
+        cache_stats = getattr(service.storage, "cache_stats", None)
+        if cache_stats is not None:
+            hits_misses = cache_stats()
+            print_line(f"{kind} store cache: {hits_misses['hits']} hits, {hits_misses['misses']} misses")
+
+
 class App:
     def __init__(self) -> None:
-        self.contacts = ContactsService(JSONStorage(CONTACTS_FILE))
-        self.notes = NotesService(JSONStorage(NOTES_FILE))
+        self.contacts = ContactsService(open_storage(CONTACTS_FILE, STORAGE_BACKEND, "contacts", STORAGE_CODEC))
+        self.notes = NotesService(open_storage(NOTES_FILE, STORAGE_BACKEND, "notes", STORAGE_CODEC))
+
+    def close(self) -> None:
+        self.contacts.close()
+        self.notes.close()
 
     def handle_line(self, line: str) -> bool:
+        if not metrics.enabled:
+            return self._dispatch(line)
+        with metrics.command(line):
+            return self._dispatch(line)
+
+    def _dispatch(self, line: str) -> bool:
         try:
             tokens = shlex.split(line)
         except ValueError as e:
-            print_line(f"Parse error: {e}")
+            print_error(f"Parse error: {e}")
             return True
         if not tokens:
             return True
@@ -132,25 +321,55 @@ class App:
         if cmd == "help":
             print_line(HELP_TEXT)
             return True
+        if cmd == "stats":
+            return self._handle_stats(tokens[1:])
         if cmd == "contact":
             return self._handle_contact(tokens[1:])
         if cmd == "note":
             return self._handle_note(tokens[1:])
 
         suggestion = suggest_command(line)
-        print_line(f"Unknown command. {('Did you mean: ' + suggestion) if suggestion else 'Type: help'}")
+        print_error(f"Unknown command. {('Did you mean: ' + suggestion) if suggestion else 'Type: help'}")
+        return True
+
+    def _split_paging(self, args: List[str], scope: str) -> Optional[Tuple[List[str], Paging]]:
+        try:
+            return split_paging(args, parse_kv(args), scope)
+        except ValueError as e:
+            print_error(f"Error: {e}")
+            return None
+
+    def _warn_duplicates(self, contact: Dict) -> None:
+        for field, value, other in self.contacts.find_duplicates(contact):
+            print_line(f"Warning: {field} {value} is also used by contact {other}")
+
+    def _handle_stats(self, args: List[str]) -> bool:
+        sub = args[0].lower() if args else "show"
+        if sub == "on":
+            metrics.enable(trace_memory="memory" in args[1:])
+            print_line("Instrumentation on" + (" (with memory tracking)" if metrics.trace_memory else ""))
+        elif sub == "off":
+            metrics.disable()
+            print_line("Instrumentation off")
+        elif sub == "reset":
+            metrics.reset()
+            print_line("Stats reset")
+        elif sub == "show":
+            print_stats(self)
+        else:
+            print_error("Usage: stats [on [memory]|off|reset]")
         return True
 
     def _handle_contact(self, args: List[str]) -> bool:
         if not args:
-            print_line("Missing subcommand. Try: contact list | contact add | help")
+            print_error("Missing subcommand. Try: contact list | contact add | help")
             return True
         sub = args[0].lower()
         if sub == "add":
             fields = parse_kv(args[1:])
             name = fields.get("name")
             if not name:
-                print_line("name is required")
+                print_error("name is required")
                 return True
             try:
                 contact = self.contacts.add_contact(
@@ -161,23 +380,64 @@ class App:
                     birthday=fields.get("birthday"),
                 )
                 print_line("Added contact: " + format_contact(contact))
+                self._warn_duplicates(contact)
             except Exception as e:
-                print_line(f"Error: {e}")
+                print_error(f"Error: {e}")
             return True
         if sub == "list":
-            items = self.contacts.list_contacts()
-            if not items:
-                print_line("No contacts yet.")
+            parsed = self._split_paging(args[1:], "contact list")
+            if parsed is None:
                 return True
-            for c in items:
-                print_line(format_contact(c))
+            _, paging = parsed
+            print_page(
+                lambda limit, offset: self.contacts.list_contacts(limit=limit, offset=offset),
+                paging,
+                format_contact,
+                "No contacts yet.",
+            )
             return True
         if sub == "search":
+            parsed = self._split_paging(args[1:], "contact search")
+            if parsed is None:
+                return True
+            terms, paging = parsed
+            if not terms:
+                print_error("Usage: contact search <query> [limit=N] [offset=N] [cursor=...]")
+                return True
+            query = " ".join(terms)
+            print_page(
+                lambda limit, offset: self.contacts.search_contacts(query, limit=limit, offset=offset),
+                paging,
+                format_contact,
+                "No matches.",
+            )
+            return True
+        if sub == "fuzzy":
+            parsed = self._split_paging(args[1:], "contact fuzzy")
+            if parsed is None:
+                return True
+            terms, paging = parsed
+            if not terms:
+                print_error("Usage: contact fuzzy <name> [limit=N] [offset=N] [cursor=...]")
+                return True
+            query = " ".join(terms)
+            if paging.limit is None:
+                paging.limit = FUZZY_LIMIT
+            print_page(
+                lambda limit, offset: self.contacts.fuzzy_search(query, limit=limit, offset=offset),
+                paging,
+                format_contact,
+                "No matches.",
+            )
+            return True
+        if sub in ("by-phone", "by-email"):
             if len(args) < 2:
-                print_line("Usage: contact search <query>")
+                print_error(f"Usage: contact {sub} <{sub[3:]}>")
                 return True
-            query = " ".join(args[1:])
-            items = self.contacts.search_contacts(query)
+            if sub == "by-phone":
+                items = self.contacts.find_by_phone(args[1])
+            else:
+                items = self.contacts.find_by_email(args[1])
             if not items:
                 print_line("No matches.")
                 return True
@@ -186,34 +446,37 @@ class App:
             return True
         if sub == "edit":
             if len(args) < 2:
-                print_line("Usage: contact edit <id> [name=..] [address=..] [phones=..] [email=..] [birthday=..]")
+                print_error("Usage: contact edit <id> [name=..] [address=..] [phones=..] [email=..] [birthday=..]")
                 return True
             contact_id = args[1]
             fields = parse_kv(args[2:])
             try:
                 updated = self.contacts.edit_contact(contact_id, **fields)
                 if not updated:
-                    print_line("Contact not found")
+                    print_error("Contact not found")
                 else:
                     print_line("Updated: " + format_contact(updated))
+                    self._warn_duplicates(updated)
             except Exception as e:
-                print_line(f"Error: {e}")
+                print_error(f"Error: {e}")
             return True
         if sub == "delete":
             if len(args) < 2:
-                print_line("Usage: contact delete <id>")
+                print_error("Usage: contact delete <id>")
                 return True
-            found = self.contacts.delete_contact(args[1])
-            print_line("Deleted" if found else "Contact not found")
+            if self.contacts.delete_contact(args[1]):
+                print_line("Deleted")
+            else:
+                print_error("Contact not found")
             return True
         if sub == "birthdays":
             if len(args) < 2:
-                print_line("Usage: contact birthdays <days>")
+                print_error("Usage: contact birthdays <days>")
                 return True
             try:
                 days = int(args[1])
             except ValueError:
-                print_line("days must be an integer")
+                print_error("days must be an integer")
                 return True
             items = self.contacts.birthdays_in(days)
             if not items:
@@ -222,93 +485,159 @@ class App:
             for c in items:
                 print_line(format_contact(c))
             return True
+        if sub == "import":
+            if len(args) < 2:
+                print_error("Usage: contact import <file.csv|file.jsonl>")
+                return True
+            try:
+                report = self.contacts.import_contacts(iter_records(args[1]))
+            except (OSError, ValueError) as e:
+                print_error(f"Error: {e}")
+                return True
+            print_import_report(report, "contacts")
+            return True
+        if sub == "export":
+            sort = "--sorted" in args[1:]
+            run_export(args[1:], lambda out, fmt: self.contacts.export_contacts(out, fmt, sort=sort), "contacts")
+            return True
         suggestion = suggest_command("contact " + sub)
-        print_line(f"Unknown contact subcommand. {('Did you mean: ' + suggestion) if suggestion else 'Type: help'}")
+        print_error(f"Unknown contact subcommand. {('Did you mean: ' + suggestion) if suggestion else 'Type: help'}")
         return True
 
     def _handle_note(self, args: List[str]) -> bool:
         if not args:
-            print_line("Missing subcommand. Try: note list | note add | help")
+            print_error("Missing subcommand. Try: note list | note add | help")
             return True
         sub = args[0].lower()
         if sub == "add":
             fields = parse_kv(args[1:])
             text = fields.get("text")
             if not text:
-                print_line("text is required")
+                print_error("text is required")
                 return True
             try:
                 note = self.notes.add_note(text=text, tags_text=fields.get("tags"))
                 print_line("Added note: " + format_note(note))
             except Exception as e:
-                print_line(f"Error: {e}")
+                print_error(f"Error: {e}")
             return True
         if sub == "list":
-            sort_by = "created"
-            if len(args) >= 2 and args[1].startswith("sort="):
-                sort_by = args[1].split("=", 1)[1]
-            items = self.notes.list_notes(sort_by=sort_by)
-            if not items:
-                print_line("No notes yet.")
+            parsed = self._split_paging(args[1:], "note list")
+            if parsed is None:
                 return True
-            for n in items:
-                print_line(format_note(n))
+            rest, paging = parsed
+            sort_by = parse_kv(rest).get("sort", "created")
+            print_page(
+                lambda limit, offset: self.notes.list_notes(sort_by=sort_by, limit=limit, offset=offset),
+                paging,
+                format_note,
+                "No notes yet.",
+            )
             return True
         if sub == "search":
-            if len(args) < 2:
-                print_line("Usage: note search <query>")
+            parsed = self._split_paging(args[1:], "note search")
+            if parsed is None:
                 return True
-            query = " ".join(args[1:])
-            items = self.notes.search_notes(query)
-            if not items:
-                print_line("No matches.")
+            rest, paging = parsed
+            rank = parse_kv(rest).get("rank", "relevance")
+            terms = [a for a in rest if not a.startswith("rank=")]
+            if not terms:
+                print_error("Usage: note search <query> [rank=relevance|updated] [limit=N] [offset=N] [cursor=...]")
                 return True
-            for n in items:
-                print_line(format_note(n))
+            query = " ".join(terms)
+            try:
+                print_page(
+                    lambda limit, offset: self.notes.search_notes(query, rank=rank, limit=limit, offset=offset),
+                    paging,
+                    format_note,
+                    "No matches.",
+                )
+            except ValueError as e:
+                print_error(f"Error: {e}")
             return True
         if sub == "search-tags":
-            if len(args) < 2:
-                print_line("Usage: note search-tags <tag1,tag2>")
+            parsed = self._split_paging(args[1:], "note search-tags")
+            if parsed is None:
                 return True
-            tags = [t.strip() for t in args[1].split(",") if t.strip()]
-            items = self.notes.search_by_tags(tags)
-            if not items:
-                print_line("No matches.")
+            rest, paging = parsed
+            if not rest:
+                print_error("Usage: note search-tags <tag1,tag2> [limit=N] [offset=N] [cursor=...]")
+                return True
+            tags = [t.strip() for t in rest[0].split(",") if t.strip()]
+            print_page(
+                lambda limit, offset: self.notes.search_by_tags(tags, limit=limit, offset=offset),
+                paging,
+                format_note,
+                "No matches.",
+            )
+            return True
+        if sub == "tags":
+            counts = self.notes.tag_counts()
+            if not counts:
+                print_line("No tags yet.")
                 return True
-            for n in items:
-                print_line(format_note(n))
+            for tag, count in counts:
+                print_line(f"{tag}: {count}")
             return True
         if sub == "edit":
             if len(args) < 2:
-                print_line("Usage: note edit <id> [text=..] [tags=..]")
+                print_error("Usage: note edit <id> [text=..] [tags=..]")
                 return True
             note_id = args[1]
             fields = parse_kv(args[2:])
             try:
                 updated = self.notes.edit_note(note_id, **fields)
                 if not updated:
-                    print_line("Note not found")
+                    print_error("Note not found")
                 else:
                     print_line("Updated: " + format_note(updated))
             except Exception as e:
-                print_line(f"Error: {e}")
+                print_error(f"Error: {e}")
             return True
         if sub == "delete":
             if len(args) < 2:
-                print_line("Usage: note delete <id>")
+                print_error("Usage: note delete <id>")
                 return True
-            found = self.notes.delete_note(args[1])
-            print_line("Deleted" if found else "Note not found")
+            if self.notes.delete_note(args[1]):
+                print_line("Deleted")
+            else:
+                print_error("Note not found")
+            return True
+        if sub == "import":
+            if len(args) < 2:
+                print_error("Usage: note import <file.csv|file.jsonl>")
+                return True
+            try:
+                report = self.notes.import_notes(iter_records(args[1]))
+            except (OSError, ValueError) as e:
+                print_error(f"Error: {e}")
+                return True
+            print_import_report(report, "notes")
+            return True
+        if sub == "export":
+            fields = parse_kv(args[1:])
+            sort_by = fields.get("sort") or ("created" if "--sorted" in args[1:] else None)
+            run_export(args[1:], lambda out, fmt: self.notes.export_notes(out, fmt, sort_by=sort_by), "notes")
             return True
         suggestion = suggest_command("note " + sub)
-        print_line(f"Unknown note subcommand. {('Did you mean: ' + suggestion) if suggestion else 'Type: help'}")
+        print_error(f"Unknown note subcommand. {('Did you mean: ' + suggestion) if suggestion else 'Type: help'}")
         return True
 
 
 def run_repl() -> None:
     app = App()
+    try:
+        _repl_loop(app)
+    finally:
+        flush_output()
+        app.close()
+
+
+def _repl_loop(app: App) -> None:
     print_line("Personal Assistant CLI. Type 'help' to see commands. Ctrl+C to exit.")
     while True:
+        # One flush per command: everything the previous command printed goes out here
+        flush_output()
         try:
             line = input("assistant> ").strip()
         except (EOFError, KeyboardInterrupt):
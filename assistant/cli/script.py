@@ -0,0 +1,73 @@
+from __future__ import annotations
+import json
+import sys
+import time
+from contextlib import ExitStack
+from typing import Iterable, Iterator, TextIO, Tuple
+
+from assistant.cli.repl import App, begin_command, end_command, flush_output, print_error
+
+
+def _script_lines(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    # (line number, command); blank lines and # comments are skipped
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield number, line
+
+
+def run_script(source: TextIO, json_output: bool = False, commit_every: int = 0) -> int:
+    # Runs one command per line against a single App. Writes are staged in bulk
+    # batches and committed every `commit_every` commands (0: once, at the end);
+    # imports commit chunk by chunk regardless. Writes staged by a command that
+    # fails are dropped. Returns the number of failed commands.
+    app = App()
+    started = time.perf_counter()
+    count = failed = 0
+    try:
+        with ExitStack() as batches:
+            batches.enter_context(app.contacts.bulk())
+            batches.enter_context(app.notes.bulk())
+            for number, line in _script_lines(source):
+                command_started = time.perf_counter()
+                begin_command(capture=json_output)
+                app.contacts.savepoint()
+                app.notes.savepoint()
+                try:
+                    keep_running = app.handle_line(line)
+                except Exception as e:
+                    print_error(f"Error: {e}")
+                    keep_running = True
+                lines, command_failed = end_command()
+                if command_failed:
+                    app.contacts.rollback()
+                    app.notes.rollback()
+                count += 1
+                failed += command_failed
+                if json_output:
+                    record = {
+                        "line": number,
+                        "command": line,
+                        "ok": not command_failed,
+                        "output": lines,
+                        "elapsed": round(time.perf_counter() - command_started, 6),
+                    }
+                    sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+                if not keep_running:
+                    break
+                if commit_every and count % commit_every == 0:
+                    batches.close()
+                    batches.enter_context(app.contacts.bulk())
+                    batches.enter_context(app.notes.bulk())
+    finally:
+        flush_output()
+        app.close()
+    elapsed = time.perf_counter() - started
+    if json_output:
+        summary = {"summary": True, "commands": count, "failed": failed, "elapsed": round(elapsed, 6)}
+        sys.stdout.write(json.dumps(summary) + "\n")
+        sys.stdout.flush()
+    else:
+        # On stderr so stdout stays exactly the commands' output
+        sys.stderr.write(f"Ran {count} commands ({failed} failed) in {elapsed:.3f}s\n")
+    return failed
@@ -0,0 +1,332 @@
+# `python -m assistant serve`: keeps one App (both stores loaded and indexed)
+# alive and answers commands from local clients (assistant.cli.client has the
+# protocol). Connections are handled on their own threads, but every command
+# runs on a single worker thread: it takes whatever requests are queued, runs
+# them inside one bulk batch per store and commits once before answering them
+# all (group commit), so a reply always means the write is on disk. Writes of
+# a command that fails are rolled back and not committed with the others.
+from __future__ import annotations
+import hmac
+import json
+import os
+import queue
+import secrets
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from typing import Any, Deque, Dict, List, Optional
+
+from assistant.cli.client import HOST, SOCKET_PATH, TOKEN_PATH
+from assistant.cli.repl import STORAGE_BACKEND, App, begin_command, end_command, print_error
+from assistant.utils.instrumentation import metrics
+from assistant.utils.io import ensure_directory
+
+GROUP_COMMIT_MAX = 256  # requests run (and committed) together at most
+LATENCY_WINDOW = 4096  # most recent request latencies kept for the percentiles
+
+
+class Request:
+    __slots__ = ("message", "received", "done", "response")
+
+    def __init__(self, message: Dict[str, Any]) -> None:
+        self.message = message
+        self.received = time.perf_counter()
+        self.done = threading.Event()
+        self.response: Dict[str, Any] = {}
+
+
+class ServerStats:
+    # Request counts and latencies (queueing + execution + commit), shared
+    # between the connection threads and the worker
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.failed = 0
+        self.groups = 0
+        self.max_group = 0
+        self.connections = 0
+        self.active_connections = 0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def connection(self, opened: bool) -> None:
+        with self._lock:
+            if opened:
+                self.connections += 1
+                self.active_connections += 1
+            else:
+                self.active_connections -= 1
+
+    def group(self, size: int) -> None:
+        with self._lock:
+            self.groups += 1
+            self.max_group = max(self.max_group, size)
+
+    def request(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            self.failed += not ok
+            self._latencies.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            commands = self.requests
+            result: Dict[str, Any] = {
+                "uptime": round(time.time() - self.started, 3),
+                "requests": commands,
+                "failed": self.failed,
+                "connections": self.connections,
+                "active_connections": self.active_connections,
+                "groups": self.groups,
+                "mean_group": round(commands / self.groups, 3) if self.groups else 0,
+                "max_group": self.max_group,
+            }
+        if latencies:
+            result["latency_ms"] = {
+                "window": len(latencies),
+                "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+                **{f"p{p}": round(_percentile(latencies, p) * 1000, 3) for p in (50, 90, 99)},
+                "max": round(latencies[-1] * 1000, 3),
+            }
+        return result
+
+
+def _percentile(ordered: List[float], p: int) -> float:
+    return ordered[min(len(ordered) - 1, len(ordered) * p // 100)]
+
+
+class Server:
+    def __init__(
+        self, socket_path: Optional[str] = None, port: Optional[int] = None, token_path: Optional[str] = None
+    ) -> None:
+        self.socket_path = None if port is not None else socket_path or SOCKET_PATH
+        self.port = port
+        # TCP is open to every local user, so clients must present this token
+        # (see assistant.cli.client); the Unix socket is private to our user
+        self.token_path = (token_path or TOKEN_PATH) if port is not None else None
+        self.token = _write_token(self.token_path) if self.token_path is not None else None
+        self.stats = ServerStats()
+        self._queue: "queue.Queue[Optional[Request]]" = queue.Queue()
+        self._app = App()
+        self._worker = threading.Thread(target=self._work, name="assistant-worker", daemon=True)
+        self._listener = self._listen()
+
+    def _listen(self) -> socketserver.BaseServer:
+        handler = type("Handler", (_Handler,), {"server_state": self})
+        if self.port is not None:
+            return _TCPServer((HOST, self.port), handler)
+        ensure_directory(os.path.dirname(self.socket_path))
+        _remove_stale_socket(self.socket_path)
+        # Created owner-only from the start: a chmod after bind() would leave
+        # a window in which other users could connect
+        umask = os.umask(0o177)
+        try:
+            return _UnixServer(self.socket_path, handler)
+        finally:
+            os.umask(umask)
+
+    @property
+    def address(self) -> str:
+        if self.port is not None:
+            return f"{HOST}:{self._listener.server_address[1]}"
+        return self.socket_path
+
+    def serve_forever(self) -> None:
+        self._worker.start()
+        try:
+            self._listener.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self) -> None:
+        # From another thread: makes serve_forever() return
+        self._listener.shutdown()
+
+    def close(self) -> None:
+        self._listener.server_close()
+        for path in (self.socket_path, self.token_path):
+            if path is not None and os.path.exists(path):
+                os.unlink(path)
+        if self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+        self._app.close()
+
+    def submit(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        # Called on a connection thread; blocks until the worker has answered
+        op = message.get("op")
+        if op == "auth":
+            # Checked by the connection handler; nothing more to do once through
+            return {"ok": True}
+        if op == "health":
+            return {"ok": True, "status": "ok", "pid": os.getpid(), "backend": STORAGE_BACKEND,
+                    "uptime": round(time.time() - self.stats.started, 3), "queue": self._queue.qsize()}
+        if op == "metrics":
+            result = {"ok": True, **self.stats.snapshot()}
+            if metrics.enabled:
+                result["instrumentation"] = metrics.snapshot()
+            return result
+        if op is not None or not isinstance(message.get("command"), str):
+            return {"ok": False, "output": ['Expected {"command": "..."} or {"op": "health" | "metrics"}']}
+        request = Request(message)
+        self._queue.put(request)
+        request.done.wait()
+        elapsed = time.perf_counter() - request.received
+        self.stats.request(elapsed, request.response["ok"])
+        request.response["elapsed"] = round(elapsed, 6)
+        return request.response
+
+    def _work(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            group = [first]
+            while len(group) < GROUP_COMMIT_MAX:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._queue.put(None)
+                    break
+                group.append(request)
+            self._run_group(group)
+
+    def _run_group(self, group: List[Request]) -> None:
+        app = self._app
+        try:
+            with ExitStack() as batches:
+                batches.enter_context(app.contacts.bulk())
+                batches.enter_context(app.notes.bulk())
+                for request in group:
+                    # A failed command's staged writes are dropped, not committed with the group
+                    app.contacts.savepoint()
+                    app.notes.savepoint()
+                    request.response = self._run_command(request.message["command"])
+                    if not request.response["ok"]:
+                        app.contacts.rollback()
+                        app.notes.rollback()
+        except Exception as e:
+            # The commit failed: none of the group's writes can be reported as done
+            for request in group:
+                request.response = {"ok": False, "output": [f"Error: could not save changes: {e}"]}
+        self.stats.group(len(group))
+        for request in group:
+            request.done.set()
+
+    def _run_command(self, line: str) -> Dict[str, Any]:
+        begin_command(capture=True)
+        try:
+            # exit/quit end the client's session, not the server: nothing to do here
+            self._app.handle_line(line)
+        except Exception as e:
+            print_error(f"Error: {e}")
+        lines, failed = end_command()
+        return {"ok": not failed, "output": lines}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server_state: Server
+
+    def handle(self) -> None:
+        state = self.server_state
+        state.stats.connection(True)
+        authenticated = state.token is None
+        try:
+            for raw in self.rfile:
+                if not raw.strip():
+                    continue
+                try:
+                    message = json.loads(raw)
+                except ValueError as e:
+                    message, response = {}, {"ok": False, "output": [f"Invalid JSON: {e}"]}
+                else:
+                    if not isinstance(message, dict):
+                        message = {}
+                    if authenticated:
+                        response = state.submit(message)
+                if not authenticated:
+                    if not _token_matches(message, state.token):
+                        response = {"ok": False, "output": ['Expected {"op": "auth", "token": "..."} first']}
+                        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+                        return
+                    authenticated = True
+                    response = {"ok": True}
+                if "id" in message:
+                    response = {"id": message["id"], **response}
+                self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            state.stats.connection(False)
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):  # type: ignore[name-defined]
+        daemon_threads = True
+
+
+def _write_token(path: str) -> str:
+    # A fresh token per server start, in a file only our user can read
+    token = secrets.token_hex(32)
+    ensure_directory(os.path.dirname(path))
+    if os.path.exists(path):
+        os.unlink(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token + "\n")
+    return token
+
+
+def _token_matches(message: Dict[str, Any], token: Optional[str]) -> bool:
+    presented = message.get("token")
+    return (
+        message.get("op") == "auth"
+        and isinstance(presented, str)
+        and token is not None
+        and hmac.compare_digest(presented.encode("utf-8"), token.encode("utf-8"))
+    )
+
+
+def _remove_stale_socket(path: str) -> None:
+    # A socket file left by a server that did not shut down cleanly blocks
+    # bind(); remove it, unless a server is still answering on it
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise OSError(f"An assistant server is already running on {path}")
+
+
+def run_server(socket_path: Optional[str] = None, port: Optional[int] = None) -> None:
+    if port is None and not hasattr(socketserver, "UnixStreamServer"):
+        raise OSError("Unix sockets are not available here; use --port")
+    server = Server(socket_path, port)
+    # SIGTERM shuts down as cleanly as Ctrl+C: queued commands finish and commit
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    sys.stderr.write(f"Assistant server ({STORAGE_BACKEND} storage) listening on {server.address}\n")
+    sys.stderr.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,144 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from assistant.storage.base import Storage
+from assistant.utils.instrumentation import timed
+
+
+class Index:
+    # Derived, in-memory view over a store's records, kept current by IndexSet
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def add(self, record_id: str, record: Dict[str, Any]) -> None:
+        # Insert or replace
+        raise NotImplementedError
+
+    def discard(self, record_id: str) -> None:
+        raise NotImplementedError
+
+    def load(self, fingerprint: str) -> bool:
+        # Persistent indexes restore themselves here when saved for the same fingerprint
+        return False
+
+    def save(self, fingerprint: str) -> None:
+        pass
+
+
+class IndexSet:
+    def __init__(self, storage: Storage, indexes: List[Index]) -> None:
+        self.storage = storage
+        self.indexes = indexes
+        # Storage generation the indexes reflect; None forces a rebuild
+        self._generation: Optional[int] = None
+        self._loaded = False
+        self._dirty = False
+        self._write_depth = 0
+        self._changed = False
+        # Generation the indexes reflect as of the last commit inside writing()
+        self._committed: Optional[int] = None
+
+    def refresh(self) -> None:
+        generation = self.storage.generation
+        if generation == self._generation:
+            return
+        pending = list(self.indexes)
+        if not self._loaded:
+            # First build in this process: try indexes persisted by a previous run
+            self._loaded = True
+            fingerprint = self.storage.fingerprint()
+            if fingerprint is not None:
+                pending = [index for index in self.indexes if not index.load(fingerprint)]
+        if pending:
+            self._rebuild(pending)
+        self._generation = self.storage.generation
+
+    def attach(self, index: Index) -> None:
+        # Adds an index that is only needed by some reads, on first use: it is
+        # built from the storage on its own and maintained from then on. Staged
+        # batch writes are not in the storage yet, so commit them first
+        if index in self.indexes:
+            return
+        self.refresh()
+        self._rebuild([index])
+        self.indexes.append(index)
+
+    @timed("indexes.rebuild")
+    def _rebuild(self, pending: List[Index]) -> None:
+        for index in pending:
+            index.clear()
+        for record_id, record in self.storage.iter_items():
+            for index in pending:
+                index.add(record_id, record)
+        self._dirty = True
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        # Wrap a service write (or a whole bulk batch): indexes are updated eagerly
+        # via add()/discard() and stay valid only if the storage generation moved by
+        # exactly the one commit we made; anything else means another writer got in
+        if self._write_depth:
+            self._write_depth += 1
+            try:
+                yield
+            finally:
+                self._write_depth -= 1
+            return
+        self.refresh()
+        self._committed = self._generation
+        self._write_depth = 1
+        self._changed = False
+        try:
+            yield
+        except BaseException:
+            if self._changed:
+                self._generation = None
+            raise
+        finally:
+            self._write_depth = 0
+        before = self._committed
+        expected = before + 1 if self._changed and before is not None else before
+        self._generation = expected if self.storage.generation == expected else None
+
+    def checkpoint(self) -> None:
+        # Called after an intermediate commit inside writing() (e.g. a batch flushed
+        # early): the indexes already reflect it, so move the baseline forward
+        if not self._write_depth or not self._changed:
+            return
+        before = self._committed
+        expected = before + 1 if before is not None else None
+        self._committed = expected if self.storage.generation == expected else None
+        self._generation = self._committed
+        self._changed = False
+
+    def reset(self) -> None:
+        # Staged writes the indexes were updated for have been dropped (see
+        # Batch.rollback) and the rest committed: rebuild from the storage and
+        # take it as the new baseline
+        self._rebuild(list(self.indexes))
+        self._generation = self.storage.generation
+        if self._write_depth:
+            self._committed = self._generation
+            self._changed = False
+
+    def add(self, record_id: str, record: Dict[str, Any]) -> None:
+        self._changed = self._dirty = True
+        for index in self.indexes:
+            index.add(record_id, record)
+
+    def discard(self, record_id: str) -> None:
+        self._changed = self._dirty = True
+        for index in self.indexes:
+            index.discard(record_id)
+
+    def close(self) -> None:
+        if not self._dirty or self._generation is None or self.storage.generation != self._generation:
+            return
+        fingerprint = self.storage.fingerprint()
+        if fingerprint is None:
+            return
+        for index in self.indexes:
+            index.save(fingerprint)
+        self._dirty = False
@@ -0,0 +1,75 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List, Tuple
+
+from assistant.indexes.base import Index
+from assistant.utils.dates import parse_date
+
+
+MonthDay = Tuple[int, int]
+_LEAP_DAY: MonthDay = (2, 29)
+
+
+class BirthdayIndex(Index):
+    # (month, day) -> contact ids, with the (month, day) keys kept sorted so a
+    # window of upcoming days is one or two bisect range scans
+
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self) -> None:
+        self._dates: Dict[str, date] = {}
+        self._by_day: Dict[MonthDay, Dict[str, None]] = {}
+        self._days: List[MonthDay] = []
+
+    def add(self, record_id: str, record: Dict[str, Any]) -> None:
+        birthday = parse_date(record.get("birthday"))
+        if self._dates.get(record_id) == birthday:
+            return
+        self.discard(record_id)
+        if birthday is None:
+            return
+        key = (birthday.month, birthday.day)
+        ids = self._by_day.get(key)
+        if ids is None:
+            ids = self._by_day[key] = {}
+            insort(self._days, key)
+        ids[record_id] = None
+        self._dates[record_id] = birthday
+
+    def discard(self, record_id: str) -> None:
+        birthday = self._dates.pop(record_id, None)
+        if birthday is None:
+            return
+        key = (birthday.month, birthday.day)
+        ids = self._by_day[key]
+        del ids[record_id]
+        if not ids:
+            del self._by_day[key]
+            del self._days[bisect_left(self._days, key)]
+
+    def _keys_between(self, start: MonthDay, end: MonthDay) -> List[MonthDay]:
+        return self._days[bisect_left(self._days, start):bisect_right(self._days, end)]
+
+    def candidates(self, today: date, days: int) -> Iterator[Tuple[str, date]]:
+        # Superset of the contacts whose next birthday falls within `days` of
+        # today; callers confirm with days_until_next_birthday. Feb 29 birthdays
+        # are always included because they fall on Feb 28 in non-leap years.
+        if days < 0:
+            return
+        end = today + timedelta(days=days)
+        start_key = (today.month, today.day)
+        end_key = (end.month, end.day)
+        if end.year == today.year:
+            keys = self._keys_between(start_key, end_key)
+        elif end.year == today.year + 1 and end_key < start_key:
+            # Window wraps around the end of the year
+            keys = self._keys_between(start_key, (12, 31)) + self._keys_between((1, 1), end_key)
+        else:
+            keys = list(self._days)
+        if _LEAP_DAY in self._by_day and _LEAP_DAY not in keys:
+            keys.append(_LEAP_DAY)
+        for key in keys:
+            for record_id in self._by_day[key]:
+                yield record_id, self._dates[record_id]
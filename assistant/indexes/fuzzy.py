@@ -0,0 +1,141 @@
+from __future__ import annotations
+import heapq
+import re
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+from assistant.indexes.base import Index
+from assistant.indexes.postings import PostingLists
+
+
+# Words (and whole matches) scoring below this trigram similarity are not returned
+MIN_SIMILARITY = 0.3
+
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+def normalize_name(text: str) -> str:
+    # Case-, accent- and punctuation-insensitive form: "Zoë O'Neil" -> "zoe o neil"
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(_SEPARATORS.split(stripped.casefold())).strip()
+
+
+def word_trigrams(word: str) -> Set[str]:
+    # Padded like PostgreSQL's pg_trgm ("  an", " ann", "nna "), so short words
+    # and word starts carry weight
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyNameIndex(Index):
+    # Typo-tolerant name lookup. Names are normalized and split into words;
+    # trigram postings are kept over the distinct words, which repeat across
+    # contacts far more than whole names do. A query word is compared with the
+    # vocabulary by trigram similarity (|shared| / |union|), and a name scores
+    # the mean, over the query words, of its best-matching word. Scoring works
+    # on distinct names; records sharing a name are expanded at the end.
+
+    def __init__(self, name_of: Callable[[Dict[str, Any]], str]) -> None:
+        self.name_of = name_of
+        self.clear()
+
+    def clear(self) -> None:
+        self._postings = PostingLists()  # trigram -> word slots
+        self._sizes = array("H")  # trigram count per word slot
+        self._names: Dict[str, Set[str]] = {}  # word -> normalized names using it
+        self._members: Dict[str, Set[str]] = {}  # normalized name -> record ids
+        self._name: Dict[str, str] = {}  # record id -> normalized name
+
+    def add(self, record_id: str, record: Dict[str, Any]) -> None:
+        name = normalize_name(self.name_of(record))
+        if self._name.get(record_id) == name:
+            return
+        self.discard(record_id)
+        self._name[record_id] = name
+        members = self._members.get(name)
+        if members is not None:
+            members.add(record_id)
+            return
+        self._members[name] = {record_id}
+        for word in set(name.split()):
+            names = self._names.get(word)
+            if names is None:
+                names = self._names[word] = set()
+                grams = word_trigrams(word)
+                self._postings.add(word, grams)
+                self._sizes.append(min(len(grams), 0xFFFF))
+            names.add(name)
+
+    def discard(self, record_id: str) -> None:
+        name = self._name.pop(record_id, None)
+        if name is None:
+            return
+        members = self._members[name]
+        members.discard(record_id)
+        if members:
+            return
+        del self._members[name]
+        for word in set(name.split()):
+            names = self._names[word]
+            names.discard(name)
+            if not names:
+                del self._names[word]
+                self._postings.discard(word, word_trigrams(word))
+
+    def _similar_words(self, word: str) -> List[Tuple[float, str]]:
+        # (similarity, vocabulary word), best first
+        grams = word_trigrams(word)
+        counts: Counter = Counter()
+        lists = self._postings.lists
+        for gram in grams:
+            postings = lists.get(gram)
+            if postings is not None:
+                counts.update(postings)
+        wanted = len(grams)
+        # similarity <= shared / wanted, so words sharing fewer trigrams cannot qualify
+        min_shared = MIN_SIMILARITY * wanted
+        sizes, words = self._sizes, self._postings.ids
+        similar = []
+        for slot, shared in counts.items():
+            if shared >= min_shared:
+                score = shared / (wanted + sizes[slot] - shared)
+                if score >= MIN_SIMILARITY:
+                    similar.append((score, words[slot]))
+        similar.sort(reverse=True)
+        return similar  # type: ignore[return-value]
+
+    def _best_per_name(self, word: str) -> Dict[str, float]:
+        # normalized name -> similarity of its closest word to `word`
+        best: Dict[str, float] = {}
+        for score, similar in self._similar_words(word):
+            for name in self._names[similar]:
+                if name not in best:
+                    best[name] = score
+        return best
+
+    def search(self, query: str, limit: int) -> List[Tuple[float, str]]:
+        # (similarity, record id) of the best matches, best first; ties by name, then id
+        words = list(dict.fromkeys(normalize_name(query).split()))
+        if not words or limit <= 0:
+            return []
+        per_word = [best for best in map(self._best_per_name, words) if best]
+        if not per_word:
+            return []
+        totals = dict(per_word[0])
+        for best in per_word[1:]:
+            for name, score in best.items():
+                totals[name] = totals.get(name, 0.0) + score
+        # The limit-th best total decides; names tied on it are taken in name order
+        cutoff = max(heapq.nlargest(limit, totals.values())[-1], MIN_SIMILARITY * len(words))
+        above = sorted((-total, name) for name, total in totals.items() if total > cutoff)
+        tied = heapq.nsmallest(limit - len(above), (name for name, total in totals.items() if total == cutoff))
+        results: List[Tuple[float, str]] = []
+        for total, name in [(-total, name) for total, name in above] + [(cutoff, name) for name in tied]:
+            for record_id in sorted(self._members[name]):
+                if len(results) == limit:
+                    return results
+                results.append((total / len(words), record_id))
+        return results
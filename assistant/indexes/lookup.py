@@ -0,0 +1,37 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List
+
+from assistant.indexes.base import Index
+
+
+class KeyIndex(Index):
+    # Hash index: normalized key -> ids of the records that carry it
+
+    def __init__(self, keys_of: Callable[[Dict[str, Any]], Iterable[str]]) -> None:
+        self.keys_of = keys_of
+        self._ids: Dict[str, Dict[str, None]] = {}
+        self._keys: Dict[str, FrozenSet[str]] = {}
+
+    def clear(self) -> None:
+        self._ids = {}
+        self._keys = {}
+
+    def add(self, record_id: str, record: Dict[str, Any]) -> None:
+        keys = frozenset(k for k in self.keys_of(record) if k)
+        if self._keys.get(record_id) == keys:
+            return
+        self.discard(record_id)
+        self._keys[record_id] = keys
+        for key in keys:
+            # dict as an insertion-ordered set
+            self._ids.setdefault(key, {})[record_id] = None
+
+    def discard(self, record_id: str) -> None:
+        for key in self._keys.pop(record_id, ()):
+            ids = self._ids[key]
+            del ids[record_id]
+            if not ids:
+                del self._ids[key]
+
+    def lookup(self, key: str) -> List[str]:
+        return list(self._ids.get(key, ()))
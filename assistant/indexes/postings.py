@@ -0,0 +1,81 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Binary-search probes win while candidates are this many times rarer than the list
+_PROBE_RATIO = 16
+
+
+def _contains(postings: array, slot: int) -> bool:
+    i = bisect_left(postings, slot)
+    return i < len(postings) and postings[i] == slot
+
+
+class PostingLists:
+    # key -> sorted array of record slots. Slots are dense integers handed out
+    # in insertion order, so adding a record appends to each of its posting
+    # lists; slots of removed records are not reused until clear().
+
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self) -> None:
+        self.ids: List[Optional[str]] = []
+        self.slots: Dict[str, int] = {}
+        self.lists: Dict[str, array] = {}
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def add(self, record_id: str, keys: Iterable[str]) -> int:
+        # Caller must discard() a previous version of the record first
+        slot = len(self.ids)
+        self.ids.append(record_id)
+        self.slots[record_id] = slot
+        for key in keys:
+            postings = self.lists.get(key)
+            if postings is None:
+                postings = self.lists[key] = array("I")
+            postings.append(slot)
+        return slot
+
+    def discard(self, record_id: str, keys: Iterable[str]) -> Optional[int]:
+        slot = self.slots.pop(record_id, None)
+        if slot is None:
+            return None
+        self.ids[slot] = None
+        for key in keys:
+            postings = self.lists[key]
+            del postings[bisect_left(postings, slot)]
+            if not postings:
+                del self.lists[key]
+        return slot
+
+    def intersect(self, keys: Iterable[str]) -> List[int]:
+        # Slots present under every key, ascending. Starts from the rarest list;
+        # longer lists are probed by binary search, or through a set when the
+        # candidates are not much fewer than the list is long.
+        lists = []
+        for key in set(keys):
+            postings = self.lists.get(key)
+            if postings is None:
+                return []
+            lists.append(postings)
+        if not lists:
+            return [slot for slot, record_id in enumerate(self.ids) if record_id is not None]
+        lists.sort(key=len)
+        result: Iterable[int] = lists[0]
+        for postings in lists[1:]:
+            if len(result) * _PROBE_RATIO < len(postings):
+                result = [slot for slot in result if _contains(postings, slot)]
+            else:
+                members = set(postings)
+                result = [slot for slot in result if slot in members]
+            if not result:
+                return []
+        return list(result)
+
+    def counts(self) -> List[Tuple[str, int]]:
+        return sorted(((key, len(p)) for key, p in self.lists.items()), key=lambda x: (-x[1], x[0]))
@@ -0,0 +1,90 @@
+from __future__ import annotations
+import heapq
+from bisect import bisect_left, insort
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from assistant.indexes.base import Index
+
+
+# sort name -> (key over stored records, descending)
+SortKeys = Dict[str, Tuple[Callable[[Dict[str, Any]], Any], bool]]
+# (sort key, insertion sequence, record id); the sequence is negated for
+# descending orders so reading the list backwards keeps ties in insertion order
+_Item = Tuple[Any, int, str]
+
+
+class SortIndex(Index):
+    # Record ids kept in order for each named sort key. An order is built on
+    # first use and from then on maintained with bisect on every add/discard;
+    # the very first bounded request for a key is answered with a heap instead,
+    # so one-off "newest 20" listings never pay for a full sort. Keys are
+    # computed from the stored records on demand (stored records are replaced,
+    # never mutated), which keeps add() cheap while the index is being built.
+
+    def __init__(self, sort_keys: SortKeys) -> None:
+        self.sort_keys = sort_keys
+        self.clear()
+
+    def clear(self) -> None:
+        self._seq = 0
+        # record id -> (insertion sequence, record)
+        self._entries: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._orders: Dict[str, List[_Item]] = {}
+        self._heap_served: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _item(self, name: str, record_id: str, seq: int, record: Dict[str, Any]) -> _Item:
+        key, descending = self.sort_keys[name]
+        return (key(record), -seq if descending else seq, record_id)
+
+    def add(self, record_id: str, record: Dict[str, Any]) -> None:
+        entry = self._entries.get(record_id)
+        if entry is None:
+            seq = self._seq
+            self._seq += 1
+        else:
+            # Updates keep their place among equal keys, like a dict update does
+            seq, old_record = entry
+            self._remove(record_id, seq, old_record)
+        self._entries[record_id] = (seq, record)
+        for name, order in self._orders.items():
+            insort(order, self._item(name, record_id, seq, record))
+
+    def discard(self, record_id: str) -> None:
+        entry = self._entries.pop(record_id, None)
+        if entry is not None:
+            self._remove(record_id, *entry)
+
+    def _remove(self, record_id: str, seq: int, record: Dict[str, Any]) -> None:
+        for name, order in self._orders.items():
+            del order[bisect_left(order, self._item(name, record_id, seq, record))]
+
+    def _build(self, name: str) -> List[_Item]:
+        order = sorted(self._item(name, record_id, seq, record) for record_id, (seq, record) in self._entries.items())
+        self._orders[name] = order
+        return order
+
+    def _top(self, name: str, count: int) -> List[_Item]:
+        items = (self._item(name, record_id, seq, record) for record_id, (seq, record) in self._entries.items())
+        if self.sort_keys[name][1]:
+            return heapq.nlargest(count, items)
+        return heapq.nsmallest(count, items)
+
+    def page(self, name: str, offset: int = 0, limit: Optional[int] = None) -> List[str]:
+        # Ids in `name` order, skipping `offset` and returning at most `limit`
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("limit and offset must be non-negative")
+        order = self._orders.get(name)
+        if order is None:
+            if limit is not None and name not in self._heap_served:
+                self._heap_served.add(name)
+                return [item[2] for item in self._top(name, offset + limit)[offset:]]
+            order = self._build(name)
+        if not self.sort_keys[name][1]:
+            stop = None if limit is None else offset + limit
+            return [item[2] for item in order[offset:stop]]
+        end = max(len(order) - offset, 0)
+        start = 0 if limit is None else max(end - limit, 0)
+        return [item[2] for item in reversed(order[start:end])]
@@ -0,0 +1,38 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Tuple
+
+from assistant.indexes.base import Index
+from assistant.indexes.postings import PostingLists
+
+
+class TagIndex(Index):
+    # tag (lowercased) -> posting list of notes carrying it
+
+    def __init__(self) -> None:
+        self._postings = PostingLists()
+        self._tags_of: Dict[str, Tuple[str, ...]] = {}
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._tags_of = {}
+
+    def add(self, record_id: str, record: Dict[str, Any]) -> None:
+        tags = tuple(sorted({t.lower() for t in (record.get("tags") or []) if t}))
+        if self._tags_of.get(record_id) == tags:
+            return
+        self.discard(record_id)
+        self._postings.add(record_id, tags)
+        self._tags_of[record_id] = tags
+
+    def discard(self, record_id: str) -> None:
+        tags = self._tags_of.pop(record_id, None)
+        if tags is not None:
+            self._postings.discard(record_id, tags)
+
+    def lookup(self, tags: Iterable[str]) -> List[str]:
+        # Ids of notes carrying every tag, in insertion order
+        ids = self._postings.ids
+        return [ids[slot] for slot in self._postings.intersect(t.lower() for t in tags)]
+
+    def counts(self) -> List[Tuple[str, int]]:
+        return self._postings.counts()
@@ -0,0 +1,157 @@
+from __future__ import annotations
+import marshal
+import math
+import re
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from assistant.indexes.base import Index
+from assistant.utils.io import atomic_write_bytes
+
+
+_TOKEN_RE = re.compile(r"\w+")
+_FORMAT_VERSION = 1
+
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class TextIndex(Index):
+    # Inverted index: term -> {record id: term frequency}. Query terms match as
+    # prefixes of indexed terms, all query terms must match (AND), and results
+    # are scored with BM25.
+
+    def __init__(self, text_of: Callable[[Dict[str, Any]], str], path: Optional[str] = None) -> None:
+        self.text_of = text_of
+        self.path = path
+        self.clear()
+
+    def clear(self) -> None:
+        self._postings: Dict[str, Dict[str, int]] = {}
+        # record id -> its terms, for discard(); derived lazily after load()
+        self._doc_terms: Optional[Dict[str, Tuple[str, ...]]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._total_length = 0
+        # Sorted terms for prefix lookups; built lazily so bulk (re)builds avoid insort
+        self._vocab: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, record_id: str, record: Dict[str, Any]) -> None:
+        self.discard(record_id)
+        counts = Counter(tokenize(self.text_of(record)))
+        self._add_counts(record_id, counts)
+
+    def _add_counts(self, record_id: str, counts: Dict[str, int]) -> None:
+        for term, tf in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if self._vocab is not None:
+                    insort(self._vocab, term)
+            postings[record_id] = tf
+        length = sum(counts.values())
+        self._terms_of()[record_id] = tuple(counts)
+        self._lengths[record_id] = length
+        self._total_length += length
+
+    def _terms_of(self) -> Dict[str, Tuple[str, ...]]:
+        if self._doc_terms is None:
+            doc_terms: Dict[str, List[str]] = {}
+            for term, postings in self._postings.items():
+                for record_id in postings:
+                    doc_terms.setdefault(record_id, []).append(term)
+            self._doc_terms = {record_id: tuple(terms) for record_id, terms in doc_terms.items()}
+        return self._doc_terms
+
+    def discard(self, record_id: str) -> None:
+        terms = self._terms_of().pop(record_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._lengths.pop(record_id)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[record_id]
+            if not postings:
+                del self._postings[term]
+                if self._vocab is not None:
+                    del self._vocab[bisect_left(self._vocab, term)]
+
+    def _matches(self, prefix: str) -> Dict[str, int]:
+        # Term frequency per record, summed over every indexed term starting with prefix
+        if self._vocab is None:
+            self._vocab = sorted(self._postings)
+        vocab = self._vocab
+        start = bisect_left(vocab, prefix)
+        end = start
+        while end < len(vocab) and vocab[end].startswith(prefix):
+            end += 1
+        if end - start == 1:
+            return self._postings[vocab[start]]
+        merged: Dict[str, int] = {}
+        for term in vocab[start:end]:
+            for record_id, tf in self._postings[term].items():
+                merged[record_id] = merged.get(record_id, 0) + tf
+        return merged
+
+    def search(self, query: str) -> Optional[Dict[str, float]]:
+        # None when the query has no searchable terms (caller decides what that means)
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return None
+        matches = [self._matches(term) for term in terms]
+        matches.sort(key=len)
+        candidates = set(matches[0])
+        for postings in matches[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(postings)
+        total = len(self._lengths)
+        avg_length = (self._total_length / total) if total else 0.0
+        scores: Dict[str, float] = {}
+        for record_id in candidates:
+            norm = _K1 * (1 - _B + _B * self._lengths[record_id] / avg_length) if avg_length else _K1
+            score = 0.0
+            for postings in matches:
+                tf = postings[record_id]
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                score += idf * tf * (_K1 + 1) / (tf + norm)
+            scores[record_id] = score
+        return scores
+
+    def load(self, fingerprint: str) -> bool:
+        if self.path is None:
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                payload = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return False
+        if not isinstance(payload, dict) or payload.get("version") != _FORMAT_VERSION or payload.get("fingerprint") != fingerprint:
+            return False
+        self.clear()
+        self._postings = payload["postings"]
+        self._lengths = payload["lengths"]
+        self._total_length = sum(self._lengths.values())
+        self._doc_terms = None
+        return True
+
+    def save(self, fingerprint: str) -> None:
+        if self.path is None:
+            return
+        payload = {
+            "version": _FORMAT_VERSION,
+            "fingerprint": fingerprint,
+            "postings": self._postings,
+            "lengths": self._lengths,
+        }
+        # marshal: several times faster to load than JSON for this shape; the file
+        # is only a cache and is rebuilt if it cannot be read
+        atomic_write_bytes(self.path, marshal.dumps(payload))
@@ -0,0 +1,49 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Set
+
+from assistant.indexes.base import Index
+from assistant.indexes.postings import PostingLists
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex(Index):
+    # Trigram -> posting list over each record's lowercased search text. Used to
+    # narrow candidates for substring queries; every candidate is then checked
+    # with a real substring test, so matches are exactly those of a full scan.
+
+    def __init__(self, text_of: Callable[[Dict[str, Any]], str]) -> None:
+        self.text_of = text_of
+        self._postings = PostingLists()
+        self._text: Dict[str, str] = {}
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._text = {}
+
+    def add(self, record_id: str, record: Dict[str, Any]) -> None:
+        text = self.text_of(record)
+        if self._text.get(record_id) == text:
+            return
+        self.discard(record_id)
+        self._text[record_id] = text
+        self._postings.add(record_id, trigrams(text))
+
+    def discard(self, record_id: str) -> None:
+        text = self._text.pop(record_id, None)
+        if text is not None:
+            self._postings.discard(record_id, trigrams(text))
+
+    def search(self, query: str) -> List[str]:
+        # query must already be lowercased like the indexed text
+        if len(query) < 3:
+            return [record_id for record_id, text in self._text.items() if query in text]
+        ids = self._postings.ids
+        matches: List[str] = []
+        for slot in self._postings.intersect(trigrams(query)):
+            record_id = ids[slot]
+            if query in self._text[record_id]:
+                matches.append(record_id)
+        return matches
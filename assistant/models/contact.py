@@ -1,13 +1,44 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
 
 from assistant.utils.validation import is_valid_email, is_valid_phone, normalize_phone
 from assistant.utils.dates import parse_date, format_date
 
 
-@dataclass
+# Normalization schema of stored records. Records stamped with the current
+# version were normalized when written and are read as-is; older (unstamped)
+# ones are normalized on every read until rewritten (see upgrade_records)
+SCHEMA_FIELD = "_schema"
+SCHEMA_VERSION = 1
+
+
+def is_current(data: Dict) -> bool:
+    return data.get(SCHEMA_FIELD) == SCHEMA_VERSION
+
+
+def stored_phones(data: Dict) -> List[str]:
+    # Normalized phones of a stored record
+    phones = data.get("phones") or []
+    if is_current(data):
+        return list(phones)
+    return [normalize_phone(p) for p in phones if p]
+
+
+def search_text(data: Dict) -> str:
+    # Lowercased text that contact substring search matches against
+    phones = stored_phones(data)
+    return " ".join([
+        data.get("name") or "",
+        data.get("address") or "",
+        " ".join(phones),
+        data.get("email") or "",
+        data.get("birthday") or "",
+    ]).lower()
+
+
+@dataclass(slots=True)
 class Contact:
     id: str
     name: str
@@ -42,6 +73,12 @@ class Contact:
             "birthday": self.birthday,
         }
 
+    def to_record(self) -> Dict:
+        # The form written to storage: to_dict() stamped with the schema version
+        record = self.to_dict()
+        record[SCHEMA_FIELD] = SCHEMA_VERSION
+        return record
+
     @classmethod
     def new(
         cls,
@@ -73,6 +110,69 @@ class Contact:
             email=data.get("email"),
             birthday=data.get("birthday"),
         )
-        instance.normalize()
+        if not is_current(data):
+            instance.normalize()
         # Do not validate strictly on load to tolerate legacy data; validate on save
         return instance
+
+
+def upgrade_records(items: List[Tuple[str, Dict]]) -> List[Tuple[str, Optional[Dict], Optional[str]]]:
+    # (id, current-schema record, None) for each legacy record that normalizes
+    # and validates, (id, None, error) for the rest. Pure, so it can run in a
+    # worker process
+    results: List[Tuple[str, Optional[Dict], Optional[str]]] = []
+    for contact_id, data in items:
+        contact = Contact.from_dict(data)
+        try:
+            contact.validate()
+        except ValueError as e:
+            results.append((contact_id, None, str(e)))
+            continue
+        results.append((contact_id, contact.to_record(), None))
+    return results
+
+
+class ContactView:
+    # Read-only view over a stored contact record. Stored records were
+    # normalized and validated when written, so listing and search paths read
+    # them as-is instead of rebuilding a Contact per record (records from
+    # before the schema stamp only get their phones normalized).
+    __slots__ = ("_data",)
+
+    def __init__(self, data: Dict[str, Any]) -> None:
+        self._data = data
+
+    @property
+    def id(self) -> str:
+        return self._data.get("id")
+
+    @property
+    def name(self) -> str:
+        return self._data.get("name") or ""
+
+    @property
+    def address(self) -> Optional[str]:
+        return self._data.get("address")
+
+    @property
+    def phones(self) -> Tuple[str, ...]:
+        return tuple(stored_phones(self._data))
+
+    @property
+    def email(self) -> Optional[str]:
+        return self._data.get("email")
+
+    @property
+    def birthday(self) -> Optional[str]:
+        return self._data.get("birthday")
+
+    def to_dict(self) -> Dict:
+        data = self._data
+        return {
+            "id": data.get("id"),
+            "name": data.get("name") or "",
+            "address": data.get("address"),
+            "phones": stored_phones(data),
+            "email": data.get("email"),
+            "birthday": data.get("birthday"),
+        }
@@ -1,13 +1,13 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
 
 from assistant.utils.validation import split_tags
 
 
-@dataclass
+@dataclass(slots=True)
 class Note:
     id: str
     text: str
@@ -53,3 +53,42 @@ class Note:
         )
         # Validate lazily when editing/saving
         return instance
+
+
+class NoteView:
+    # Read-only view over a stored note record, used by listing and search
+    # paths instead of rebuilding a Note per record
+    __slots__ = ("_data",)
+
+    def __init__(self, data: Dict[str, Any]) -> None:
+        self._data = data
+
+    @property
+    def id(self) -> str:
+        return self._data.get("id")
+
+    @property
+    def text(self) -> str:
+        return self._data.get("text") or ""
+
+    @property
+    def tags(self) -> Tuple[str, ...]:
+        return tuple(self._data.get("tags") or ())
+
+    @property
+    def created_at(self) -> str:
+        return self._data.get("created_at") or ""
+
+    @property
+    def updated_at(self) -> str:
+        return self._data.get("updated_at") or ""
+
+    def to_dict(self) -> Dict:
+        data = self._data
+        return {
+            "id": data.get("id"),
+            "text": data.get("text") or "",
+            "tags": list(data.get("tags") or ()),
+            "created_at": data.get("created_at") or "",
+            "updated_at": data.get("updated_at") or "",
+        }
@@ -0,0 +1,238 @@
+from __future__ import annotations
+import asyncio
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date
+from functools import partial
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, Iterable, List, Optional, TextIO, Tuple, TypeVar
+
+from assistant.services.bulk import IMPORT_CHUNK_SIZE, IMPORT_FAILURE_LIMIT, BulkReport
+from assistant.services.contacts_service import FUZZY_LIMIT, MIGRATE_CHUNK_SIZE, ContactsService
+from assistant.services.notes_service import NotesService
+from assistant.utils.io import NumberedRecord
+
+
+T = TypeVar("T")
+
+ITER_CHUNK_SIZE = 1000  # records fetched per executor hop by the async iterators
+
+
+def _freeze(value: Any) -> Hashable:
+    # Hashable stand-in for call arguments, used as the read-coalescing key
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    hash(value)
+    return value
+
+
+class _AsyncService:
+    # Runs the wrapped sync service on its own single worker thread: the
+    # executor is bounded, calls execute in submission order (so results match
+    # the sync API called in the same order) and the service itself is never
+    # used from two threads at once. Identical reads that are in flight at the
+    # same time share one execution; a write ends that sharing so later reads
+    # always see it.
+
+    def __init__(self, service: Any) -> None:
+        self.service = service
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=type(service).__name__)
+        self._inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    async def _call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    async def _write(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        self._inflight.clear()
+        return await self._call(fn, *args, **kwargs)
+
+    async def _read(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        try:
+            key: Optional[Hashable] = (fn.__name__, _freeze(args), _freeze(kwargs))
+        except TypeError:
+            key = None
+        if key is None:
+            return await self._call(fn, *args, **kwargs)
+        future = self._inflight.get(key)
+        if future is not None:
+            # Joiners get their own copy, as each sync call returns fresh objects
+            return copy.deepcopy(await asyncio.shield(future))
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+        self._inflight[key] = future
+
+        def forget(done: "asyncio.Future[Any]") -> None:
+            if self._inflight.get(key) is done:
+                del self._inflight[key]
+
+        future.add_done_callback(forget)
+        # Shielded so one cancelled caller does not cancel the read for the others
+        return await asyncio.shield(future)
+
+    async def _iterate(self, make_iterator: Callable[[], Iterable[T]]) -> AsyncIterator[T]:
+        # Writes can run between chunks; the storage's iter_items() iterates a
+        # snapshot taken on the first chunk, so they do not show up part way
+        iterator = iter(await self._call(make_iterator))
+        while True:
+            chunk = await self._call(lambda: list(islice(iterator, ITER_CHUNK_SIZE)))
+            if not chunk:
+                return
+            for item in chunk:
+                yield item
+
+    @asynccontextmanager
+    async def bulk(self) -> AsyncIterator[BulkReport]:
+        # Same batch semantics as the sync bulk(): every call made while it is
+        # open (from any coroutine) joins the batch, committed on clean exit
+        manager = self.service.bulk()
+        report = await self._write(manager.__enter__)
+        try:
+            yield report
+        except BaseException as e:
+            if not await self._write(manager.__exit__, type(e), e, e.__traceback__):
+                raise
+        else:
+            await self._write(manager.__exit__, None, None, None)
+
+    async def close(self) -> None:
+        await self._call(self.service.close)
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> "_AsyncService":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+
+class AsyncContactsService(_AsyncService):
+    service: ContactsService
+
+    def __init__(self, service: ContactsService) -> None:
+        super().__init__(service)
+
+    async def list_contacts(self, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        return await self._read(self.service.list_contacts, limit=limit, offset=offset)
+
+    def iter_contacts(self, sort: bool = False) -> AsyncIterator[Dict]:
+        return self._iterate(partial(self.service.iter_contacts, sort=sort))
+
+    async def export_contacts(self, out: TextIO, fmt: str = "jsonl", sort: bool = False) -> int:
+        return await self._call(self.service.export_contacts, out, fmt, sort=sort)
+
+    async def add_contact(
+        self,
+        name: str,
+        address: Optional[str] = None,
+        phones: Optional[List[str]] = None,
+        email: Optional[str] = None,
+        birthday: Optional[str] = None,
+        reject_duplicates: bool = False,
+    ) -> Dict:
+        return await self._write(
+            self.service.add_contact,
+            name,
+            address=address,
+            phones=phones,
+            email=email,
+            birthday=birthday,
+            reject_duplicates=reject_duplicates,
+        )
+
+    async def search_contacts(self, query: str, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        return await self._read(self.service.search_contacts, query, limit=limit, offset=offset)
+
+    async def fuzzy_search(self, query: str, limit: int = FUZZY_LIMIT, offset: int = 0) -> List[Dict]:
+        return await self._read(self.service.fuzzy_search, query, limit=limit, offset=offset)
+
+    async def find_by_phone(self, phone: str) -> List[Dict]:
+        return await self._read(self.service.find_by_phone, phone)
+
+    async def find_by_email(self, email: str) -> List[Dict]:
+        return await self._read(self.service.find_by_email, email)
+
+    async def find_duplicates(self, record: Dict) -> List[Tuple[str, str, str]]:
+        return await self._read(self.service.find_duplicates, record)
+
+    async def edit_contact(self, contact_id: str, reject_duplicates: bool = False, **fields: str) -> Optional[Dict]:
+        return await self._write(self.service.edit_contact, contact_id, reject_duplicates=reject_duplicates, **fields)
+
+    async def delete_contact(self, contact_id: str) -> bool:
+        return await self._write(self.service.delete_contact, contact_id)
+
+    async def add_contacts(self, items: Iterable[Dict]) -> BulkReport:
+        return await self._write(self.service.add_contacts, items)
+
+    async def import_contacts(
+        self,
+        rows: Iterable[NumberedRecord],
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+        failure_limit: Optional[int] = IMPORT_FAILURE_LIMIT,
+    ) -> BulkReport:
+        return await self._write(self.service.import_contacts, rows, chunk_size=chunk_size, failure_limit=failure_limit)
+
+    async def delete_contacts(self, contact_ids: Iterable[str]) -> BulkReport:
+        return await self._write(self.service.delete_contacts, contact_ids)
+
+    async def migrate(self, workers: Optional[int] = None, check: bool = False, chunk_size: int = MIGRATE_CHUNK_SIZE) -> BulkReport:
+        return await self._write(self.service.migrate, workers, check=check, chunk_size=chunk_size)
+
+    async def birthdays_in(self, days: int, today: Optional[date] = None) -> List[Dict]:
+        # Resolve "today" here so coalesced calls agree on it
+        return await self._read(self.service.birthdays_in, days, today=today or date.today())
+
+
+class AsyncNotesService(_AsyncService):
+    service: NotesService
+
+    def __init__(self, service: NotesService) -> None:
+        super().__init__(service)
+
+    async def list_notes(self, sort_by: str = "created", limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        return await self._read(self.service.list_notes, sort_by=sort_by, limit=limit, offset=offset)
+
+    def iter_notes(self, sort_by: Optional[str] = None) -> AsyncIterator[Dict]:
+        return self._iterate(partial(self.service.iter_notes, sort_by=sort_by))
+
+    async def export_notes(self, out: TextIO, fmt: str = "jsonl", sort_by: Optional[str] = None) -> int:
+        return await self._call(self.service.export_notes, out, fmt, sort_by=sort_by)
+
+    async def add_note(self, text: str, tags_text: Optional[str] = None) -> Dict:
+        return await self._write(self.service.add_note, text, tags_text=tags_text)
+
+    async def search_notes(
+        self, query: str, rank: str = "relevance", limit: Optional[int] = None, offset: int = 0
+    ) -> List[Dict]:
+        return await self._read(self.service.search_notes, query, rank=rank, limit=limit, offset=offset)
+
+    async def search_by_tags(self, tags: List[str], limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        return await self._read(self.service.search_by_tags, tags, limit=limit, offset=offset)
+
+    async def tag_counts(self) -> List[Tuple[str, int]]:
+        return await self._read(self.service.tag_counts)
+
+    async def edit_note(self, note_id: str, **fields: str) -> Optional[Dict]:
+        return await self._write(self.service.edit_note, note_id, **fields)
+
+    async def delete_note(self, note_id: str) -> bool:
+        return await self._write(self.service.delete_note, note_id)
+
+    async def add_notes(self, items: Iterable[Dict]) -> BulkReport:
+        return await self._write(self.service.add_notes, items)
+
+    async def import_notes(
+        self,
+        rows: Iterable[NumberedRecord],
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+        failure_limit: Optional[int] = IMPORT_FAILURE_LIMIT,
+    ) -> BulkReport:
+        return await self._write(self.service.import_notes, rows, chunk_size=chunk_size, failure_limit=failure_limit)
+
+    async def delete_notes(self, note_ids: Iterable[str]) -> BulkReport:
+        return await self._write(self.service.delete_notes, note_ids)
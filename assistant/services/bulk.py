@@ -0,0 +1,51 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_FAILURE_LIMIT = 1000
+
+
+@dataclass
+class BulkReport:
+    succeeded: int = 0
+    # (item index, error message) for every item that was rejected
+    failures: List[Tuple[int, str]] = field(default_factory=list)
+    # Keep at most this many failures in memory; the rest are only counted
+    failure_limit: Optional[int] = None
+    dropped_failures: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def failed(self) -> int:
+        return len(self.failures) + self.dropped_failures
+
+    @property
+    def rate(self) -> float:
+        return self.total / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def total(self) -> int:
+        return self.succeeded + self.failed
+
+    def add_failure(self, index: int, error: str) -> None:
+        if self.failure_limit is not None and len(self.failures) >= self.failure_limit:
+            self.dropped_failures += 1
+            return
+        self.failures.append((index, error))
+
+
+def check_field_types(item: Dict[str, Any], text_fields: Iterable[str], list_fields: Iterable[str] = ()) -> None:
+    # Rows come from user files: a field of the wrong type (e.g. {"name": 123})
+    # fails the row with a ValueError instead of an error deep in the model
+    for name in text_fields:
+        value = item.get(name)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{name} must be a string, not {type(value).__name__}")
+    for name in list_fields:
+        value = item.get(name)
+        if value is None or isinstance(value, str):
+            continue
+        if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+            raise ValueError(f"{name} must be a string or a list of strings")
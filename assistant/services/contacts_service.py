@@ -1,23 +1,130 @@
 from __future__ import annotations
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from dataclasses import asdict
 from datetime import date
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
 
-from assistant.models.contact import Contact
-from assistant.storage.json_store import JSONStorage
-from assistant.utils.dates import days_until_next_birthday, parse_date
+from assistant.indexes.base import Index, IndexSet
+from assistant.indexes.birthdays import BirthdayIndex
+from assistant.indexes.fuzzy import FuzzyNameIndex
+from assistant.indexes.lookup import KeyIndex
+from assistant.indexes.trigram import TrigramIndex
+from assistant.models.contact import Contact, ContactView, is_current, search_text, stored_phones, upgrade_records
+from assistant.services.bulk import IMPORT_CHUNK_SIZE, IMPORT_FAILURE_LIMIT, BulkReport, check_field_types
+from assistant.storage.base import WRITE_ATTEMPTS, Batch, ConflictError, Storage, record_version, retry_pause
+from assistant.utils.dates import days_until_next_birthday
+from assistant.utils.extsort import external_sort
+from assistant.utils.instrumentation import timed
+from assistant.utils.io import NumberedRecord, write_records
+from assistant.utils.iterables import chunked, page
+from assistant.utils.memory import gc_paused
+from assistant.utils.validation import normalize_phone
+
+
+CONTACT_FIELDS = ["id", "name", "address", "phones", "email", "birthday"]
+FUZZY_LIMIT = 10  # fuzzy_search results when no limit is given
+MIGRATE_CHUNK_SIZE = 5000  # legacy records per validation task in migrate()
+
+
+def _phone_keys(record: Dict) -> List[str]:
+    return stored_phones(record)
+
+
+def _email_keys(record: Dict) -> List[str]:
+    email = (record.get("email") or "").strip().lower()
+    return [email] if email else []
+
+
+def _name(record: Dict) -> str:
+    return record.get("name") or ""
 
 
 class ContactsService:
-    def __init__(self, storage: JSONStorage) -> None:
+    def __init__(self, storage: Storage) -> None:
         self.storage = storage
+        self._batch: Optional[Batch] = None
+        self.phone_index = KeyIndex(_phone_keys)
+        self.email_index = KeyIndex(_email_keys)
+        self.birthday_index = BirthdayIndex()
+        indexes: List[Index] = [self.phone_index, self.email_index, self.birthday_index]
+        self.trigram_index: Optional[TrigramIndex] = None
+        if not storage.supports_query:
+            # Query-capable backends answer substring search themselves
+            self.trigram_index = TrigramIndex(search_text)
+            indexes.append(self.trigram_index)
+        # Built on the first fuzzy_search(), so other commands do not pay for it
+        self.fuzzy_index: Optional[FuzzyNameIndex] = None
+        self._indexes = IndexSet(storage, indexes)
+
+    def close(self) -> None:
+        self._indexes.close()
+        self.storage.close()
 
-    def list_contacts(self) -> List[Dict]:
-        data = self.storage.all()
-        contacts = [Contact.from_dict(v) for v in data.values()]
-        contacts.sort(key=lambda c: c.name.lower())
-        return [c.to_dict() for c in contacts]
+    def _store(self) -> Union[Storage, Batch]:
+        # Writes (and the reads they depend on) go to the open batch inside bulk()
+        return self._batch if self._batch is not None else self.storage
 
+    def _flush_batch(self) -> None:
+        # Reads served by the backend itself (queries, streaming) cannot see
+        # staged writes, so commit them first
+        if self._batch is not None and len(self._batch):
+            self._batch.commit()
+            self._indexes.checkpoint()
+
+    @contextmanager
+    def bulk(self) -> Iterator[BulkReport]:
+        report = BulkReport()
+        if self._batch is not None:
+            # Nested bulk() joins the outer batch
+            yield report
+            return
+        with self._indexes.writing(), self.storage.batch() as batch:
+            self._batch = batch
+            try:
+                yield report
+            finally:
+                self._batch = None
+
+    def savepoint(self) -> None:
+        # Inside bulk(): writes staged from here on can be dropped with rollback()
+        if self._batch is not None:
+            self._batch.savepoint()
+
+    def rollback(self) -> None:
+        # Drops the writes staged since savepoint() (ones already committed, e.g.
+        # by an import, stay). The indexes were updated for them, so commit what
+        # is left of the batch and rebuild them from the storage
+        if self._batch is not None and self._batch.rollback():
+            self._flush_batch()
+            self._indexes.reset()
+
+    @timed("contacts.list_contacts")
+    def list_contacts(self, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        # Sorting works on views; only the requested page is turned into dicts
+        with gc_paused():
+            if self.storage.supports_query:
+                self._flush_batch()
+                rows = self.storage.query(order_by="name", limit=limit, offset=offset)
+                return [ContactView(v).to_dict() for v in rows]
+            contacts = [ContactView(v) for v in self._store().all().values()]
+            contacts.sort(key=lambda c: c.name.lower())
+            return [c.to_dict() for c in page(contacts, offset, limit)]
+
+    def iter_contacts(self, sort: bool = False) -> Iterator[Dict]:
+        self._flush_batch()
+        records = (ContactView(v).to_dict() for _, v in self.storage.iter_items())
+        if sort:
+            records = external_sort(records, key=lambda c: c["name"].lower())
+        return records
+
+    @timed("contacts.export_contacts")
+    def export_contacts(self, out: TextIO, fmt: str = "jsonl", sort: bool = False) -> int:
+        return write_records(self.iter_contacts(sort=sort), out, fmt, CONTACT_FIELDS)
+
+    @timed("contacts.add_contact")
     def add_contact(
         self,
         name: str,
@@ -25,32 +132,113 @@ class ContactsService:
         phones: Optional[List[str]] = None,
         email: Optional[str] = None,
         birthday: Optional[str] = None,
+        reject_duplicates: bool = False,
     ) -> Dict:
         contact = Contact.new(name=name, address=address, phones=phones, email=email, birthday=birthday)
-        self.storage.upsert(contact.id, contact.to_dict())
+        record = contact.to_record()
+        if reject_duplicates:
+            self._check_duplicates(record)
+        with self._indexes.writing():
+            self._store().upsert(contact.id, record)
+            self._indexes.add(contact.id, record)
         return contact.to_dict()
 
-    def search_contacts(self, query: str) -> List[Dict]:
+    @timed("contacts.search_contacts")
+    def search_contacts(self, query: str, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
         q = query.strip().lower()
-        results: List[Contact] = []
-        for data in self.storage.all().values():
-            c = Contact.from_dict(data)
-            haystack = " ".join([
-                c.name or "",
-                c.address or "",
-                " ".join(c.phones or []),
-                c.email or "",
-                c.birthday or "",
-            ]).lower()
-            if q in haystack:
-                results.append(c)
+        if self.storage.supports_query:
+            self._flush_batch()
+            rows = self.storage.query(order_by="name", contains=q, limit=limit, offset=offset)
+            return [ContactView(v).to_dict() for v in rows]
+        self._indexes.refresh()
+        store = self._store()
+        results: List[ContactView] = []
+        for contact_id in self.trigram_index.search(q):
+            data = store.get(contact_id)
+            if data is not None:
+                results.append(ContactView(data))
+        results.sort(key=lambda c: c.name.lower())
+        return [c.to_dict() for c in page(results, offset, limit)]
+
+    @timed("contacts.fuzzy_search")
+    def fuzzy_search(self, query: str, limit: int = FUZZY_LIMIT, offset: int = 0) -> List[Dict]:
+        # Typo-tolerant name search, best match first; each result carries its "similarity"
+        if self.fuzzy_index is None:
+            self._flush_batch()
+            self.fuzzy_index = FuzzyNameIndex(_name)
+            self._indexes.attach(self.fuzzy_index)
+        self._indexes.refresh()
+        store = self._store()
+        results: List[Dict] = []
+        for score, contact_id in self.fuzzy_index.search(query, offset + limit)[offset:]:
+            data = store.get(contact_id)
+            if data is None:
+                continue
+            item = ContactView(data).to_dict()
+            item["similarity"] = round(score, 3)
+            results.append(item)
+        return results
+
+    def _lookup(self, index: KeyIndex, key: str) -> List[Dict]:
+        self._indexes.refresh()
+        store = self._store()
+        results = [ContactView(d) for d in (store.get(i) for i in index.lookup(key)) if d is not None]
         results.sort(key=lambda c: c.name.lower())
         return [c.to_dict() for c in results]
 
-    def edit_contact(self, contact_id: str, **fields: str) -> Optional[Dict]:
-        raw = self.storage.get(contact_id)
-        if not raw:
-            return None
+    @timed("contacts.find_by_phone")
+    def find_by_phone(self, phone: str) -> List[Dict]:
+        return self._lookup(self.phone_index, normalize_phone(phone))
+
+    @timed("contacts.find_by_email")
+    def find_by_email(self, email: str) -> List[Dict]:
+        return self._lookup(self.email_index, email.strip().lower())
+
+    @timed("contacts.find_duplicates")
+    def find_duplicates(self, record: Dict) -> List[Tuple[str, str, str]]:
+        # (field, value, other contact id) for each phone/email already used by another contact
+        self._indexes.refresh()
+        record_id = record.get("id")
+        found: List[Tuple[str, str, str]] = []
+        for field, index, keys in (
+            ("phone", self.phone_index, _phone_keys(record)),
+            ("email", self.email_index, _email_keys(record)),
+        ):
+            for key in keys:
+                found.extend((field, key, other) for other in index.lookup(key) if other != record_id)
+        return found
+
+    def _check_duplicates(self, record: Dict) -> None:
+        duplicates = self.find_duplicates(record)
+        if duplicates:
+            field, value, other = duplicates[0]
+            raise ValueError(f"Duplicate {field} {value}: already used by contact {other}")
+
+    @timed("contacts.edit_contact")
+    def edit_contact(self, contact_id: str, reject_duplicates: bool = False, **fields: str) -> Optional[Dict]:
+        # Optimistic: the write only succeeds if the record is still the version
+        # we read; otherwise re-read and re-apply the edit on top of the new one
+        for attempt in range(WRITE_ATTEMPTS):
+            if attempt:
+                retry_pause(attempt)
+            raw = self._store().get(contact_id)
+            if not raw:
+                return None
+            contact = self._edited(raw, fields)
+            record = contact.to_record()
+            if reject_duplicates:
+                self._check_duplicates(record)
+            try:
+                with self._indexes.writing():
+                    self._store().upsert(contact.id, record, expected_version=record_version(raw))
+                    self._indexes.add(contact.id, record)
+            except ConflictError:
+                continue
+            return contact.to_dict()
+        raise ConflictError(f"Contact {contact_id} kept changing; gave up after {WRITE_ATTEMPTS} attempts")
+
+    @staticmethod
+    def _edited(raw: Dict, fields: Dict[str, str]) -> Contact:
         contact = Contact.from_dict(raw)
         if (name := fields.get("name")) is not None:
             contact.name = name.strip()
@@ -67,26 +255,136 @@ class ContactsService:
         # Normalize and validate before save
         contact.normalize()
         contact.validate()
-        self.storage.upsert(contact.id, contact.to_dict())
-        return contact.to_dict()
+        return contact
 
+    @timed("contacts.delete_contact")
     def delete_contact(self, contact_id: str) -> bool:
-        return self.storage.delete(contact_id)
+        with self._indexes.writing():
+            found = self._store().delete(contact_id)
+            if found:
+                self._indexes.discard(contact_id)
+        return found
 
-    def birthdays_in(self, days: int) -> List[Dict]:
-        today = date.today()
+    def _add_item(self, report: BulkReport, index: int, item: Union[Dict, ValueError]) -> None:
+        if isinstance(item, ValueError):
+            report.add_failure(index, str(item))
+            return
+        try:
+            check_field_types(item, ("name", "address", "email", "birthday"), ("phones",))
+            phones = item.get("phones")
+            if isinstance(phones, str):
+                phones = [p.strip() for p in phones.split(",") if p.strip()]
+            self.add_contact(
+                name=item.get("name") or "",
+                address=item.get("address"),
+                phones=phones,
+                email=item.get("email"),
+                birthday=item.get("birthday"),
+            )
+        except ValueError as e:
+            report.add_failure(index, str(e))
+        else:
+            report.succeeded += 1
+
+    @timed("contacts.add_contacts")
+    def add_contacts(self, items: Iterable[Dict]) -> BulkReport:
+        with self.bulk() as report:
+            for index, item in enumerate(items):
+                self._add_item(report, index, item)
+        return report
+
+    @timed("contacts.import_contacts")
+    def import_contacts(
+        self,
+        rows: Iterable[NumberedRecord],
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+        failure_limit: Optional[int] = IMPORT_FAILURE_LIMIT,
+    ) -> BulkReport:
+        # rows as produced by iter_records(); failures are reported by line number
+        report = BulkReport(failure_limit=failure_limit)
+        started = time.perf_counter()
+        for chunk in chunked(rows, chunk_size):
+            with self.bulk():
+                for line, item in chunk:
+                    self._add_item(report, line, item)
+                # Inside an outer bulk() (e.g. a script) the chunk joined its batch:
+                # commit it here so staged rows stay bounded by chunk_size
+                self._flush_batch()
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    @timed("contacts.delete_contacts")
+    def delete_contacts(self, contact_ids: Iterable[str]) -> BulkReport:
+        with self.bulk() as report:
+            for index, contact_id in enumerate(contact_ids):
+                if self.delete_contact(contact_id):
+                    report.succeeded += 1
+                else:
+                    report.add_failure(index, f"Contact not found: {contact_id}")
+        return report
+
+    @timed("contacts.migrate")
+    def migrate(self, workers: Optional[int] = None, check: bool = False, chunk_size: int = MIGRATE_CHUNK_SIZE) -> BulkReport:
+        # Rewrites records stored under an older schema in the current one, so
+        # they stop being normalized on every read. Chunks of legacy records are
+        # validated across `workers` processes (default: one per CPU); records
+        # that fail validation are reported by id and left untouched. With
+        # check, nothing is written. report.succeeded counts upgradable records
+        report = BulkReport(failure_limit=IMPORT_FAILURE_LIMIT)
+        started = time.perf_counter()
+        self._flush_batch()
+        legacy = [(contact_id, record) for contact_id, record in self.storage.iter_items() if not is_current(record)]
+        versions = {contact_id: record_version(record) for contact_id, record in legacy}
+        chunks = list(chunked(legacy, chunk_size))
+        workers = min(workers or os.cpu_count() or 1, len(chunks))
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        upgrades: List[Tuple[str, Dict]] = []
+        try:
+            results = pool.map(upgrade_records, chunks) if pool is not None else map(upgrade_records, chunks)
+            for position, chunk in enumerate(results):
+                for offset, (contact_id, record, error) in enumerate(chunk):
+                    if record is None:
+                        report.add_failure(position * chunk_size + offset, f"{contact_id}: {error}")
+                    else:
+                        upgrades.append((contact_id, record))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        report.succeeded = len(upgrades)
+        if upgrades and not check:
+            # One commit: for whole-file backends every commit rewrites the store
+            self._commit_upgrades(upgrades, versions)
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    def _commit_upgrades(self, upgraded: List[Tuple[str, Dict]], versions: Dict[str, int]) -> None:
+        # Under the write lock, so a record edited since it was read is skipped
+        # (the edit already stored it in the current schema) rather than reverted.
+        # Indexes are left alone: they pick the change up from the storage
+        # generation if they are ever used
+        with self.storage.write_lock(), self.storage.batch() as batch:
+            for contact_id, record in upgraded:
+                try:
+                    batch.upsert(contact_id, record, expected_version=versions[contact_id])
+                except ConflictError:
+                    continue
+
+    @timed("contacts.birthdays_in")
+    def birthdays_in(self, days: int, today: Optional[date] = None) -> List[Dict]:
+        if today is None:
+            today = date.today()
+        self._indexes.refresh()
+        store = self._store()
         upcoming: List[Dict] = []
-        for data in self.storage.all().values():
-            c = Contact.from_dict(data)
-            if not c.birthday:
+        for contact_id, bday in self.birthday_index.candidates(today, days):
+            days_until = days_until_next_birthday(bday, today)
+            if not 0 <= days_until <= days:
                 continue
-            bday = parse_date(c.birthday)
-            if not bday:
+            data = store.get(contact_id)
+            if data is None:
                 continue
-            days_until = days_until_next_birthday(bday, today)
-            if 0 <= days_until <= days:
-                item = c.to_dict()
-                item["days_until_birthday"] = days_until
-                upcoming.append(item)
+            item = ContactView(data).to_dict()
+            item["days_until_birthday"] = days_until
+            upcoming.append(item)
         upcoming.sort(key=lambda x: (x.get("days_until_birthday", 0), x.get("name", "").lower()))
         return upcoming
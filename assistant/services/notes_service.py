@@ -1,73 +1,288 @@
 from __future__ import annotations
+import os
+import time
+from contextlib import contextmanager
 from dataclasses import asdict
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
 
-from assistant.models.note import Note
-from assistant.storage.json_store import JSONStorage
+from assistant.indexes.base import Index, IndexSet
+from assistant.indexes.sorted import SortIndex
+from assistant.indexes.tags import TagIndex
+from assistant.indexes.text import TextIndex
+from assistant.models.note import Note, NoteView
+from assistant.services.bulk import IMPORT_CHUNK_SIZE, IMPORT_FAILURE_LIMIT, BulkReport, check_field_types
+from assistant.storage.base import WRITE_ATTEMPTS, Batch, ConflictError, Storage, record_version, retry_pause
+from assistant.utils.extsort import external_sort
+from assistant.utils.instrumentation import timed
+from assistant.utils.io import NumberedRecord, write_records
+from assistant.utils.iterables import chunked, page
+from assistant.utils.memory import gc_paused
+
+
+NOTE_FIELDS = ["id", "text", "tags", "created_at", "updated_at"]
+
+# sort_by -> (key over note records, descending); the orders of list_notes
+NOTE_SORT_KEYS: Dict[str, Tuple[Callable[[Dict], str], bool]] = {
+    "created": (lambda n: n.get("created_at") or "", True),
+    "updated": (lambda n: n.get("updated_at") or "", True),
+    "text": (lambda n: (n.get("text") or "").lower(), False),
+    "tags": (lambda n: ",".join(n.get("tags") or ()).lower(), False),
+}
+
+SEARCH_RANKS = ("relevance", "updated")
+
+
+def _search_text(record: Dict) -> str:
+    return " ".join([record.get("text") or "", " ".join(record.get("tags") or [])])
+
+
+def search_index_path(file_path: str) -> str:
+    return os.path.splitext(file_path)[0] + ".search-index"
 
 
 class NotesService:
-    def __init__(self, storage: JSONStorage) -> None:
+    def __init__(self, storage: Storage) -> None:
         self.storage = storage
+        self._batch: Optional[Batch] = None
+        self.text_index = TextIndex(_search_text, path=search_index_path(storage.file_path))
+        self.tag_index = TagIndex()
+        indexes: List[Index] = [self.text_index, self.tag_index]
+        self.sort_index: Optional[SortIndex] = None
+        if not storage.supports_query:
+            # Query-capable backends sort (and limit) themselves
+            self.sort_index = SortIndex(NOTE_SORT_KEYS)
+            indexes.append(self.sort_index)
+        self._indexes = IndexSet(storage, indexes)
 
-    def list_notes(self, sort_by: str = "created") -> List[Dict]:
-        notes = [Note.from_dict(v) for v in self.storage.all().values()]
-        if sort_by == "updated":
-            notes.sort(key=lambda n: n.updated_at, reverse=True)
-        elif sort_by == "text":
-            notes.sort(key=lambda n: n.text.lower())
-        elif sort_by == "tags":
-            notes.sort(key=lambda n: ",".join(n.tags).lower())
-        else:
-            notes.sort(key=lambda n: n.created_at, reverse=True)
-        return [n.to_dict() for n in notes]
+    def close(self) -> None:
+        # Persists the search index so the next process can skip rebuilding it
+        self._indexes.close()
+        self.storage.close()
+
+    def _store(self) -> Union[Storage, Batch]:
+        # Writes (and the reads they depend on) go to the open batch inside bulk()
+        return self._batch if self._batch is not None else self.storage
+
+    def _flush_batch(self) -> None:
+        # Reads served by the backend itself (queries, streaming) cannot see
+        # staged writes, so commit them first
+        if self._batch is not None and len(self._batch):
+            self._batch.commit()
+            self._indexes.checkpoint()
+
+    @contextmanager
+    def bulk(self) -> Iterator[BulkReport]:
+        report = BulkReport()
+        if self._batch is not None:
+            # Nested bulk() joins the outer batch
+            yield report
+            return
+        with self._indexes.writing(), self.storage.batch() as batch:
+            self._batch = batch
+            try:
+                yield report
+            finally:
+                self._batch = None
+
+    def savepoint(self) -> None:
+        # Inside bulk(): writes staged from here on can be dropped with rollback()
+        if self._batch is not None:
+            self._batch.savepoint()
+
+    def rollback(self) -> None:
+        # Drops the writes staged since savepoint() (ones already committed, e.g.
+        # by an import, stay). The indexes were updated for them, so commit what
+        # is left of the batch and rebuild them from the storage
+        if self._batch is not None and self._batch.rollback():
+            self._flush_batch()
+            self._indexes.reset()
 
+    @timed("notes.list_notes")
+    def list_notes(self, sort_by: str = "created", limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        if sort_by not in NOTE_SORT_KEYS:
+            sort_by = "created"
+        with gc_paused():
+            if self.storage.supports_query:
+                descending = NOTE_SORT_KEYS[sort_by][1]
+                self._flush_batch()
+                rows = self.storage.query(order_by=sort_by, descending=descending, limit=limit, offset=offset)
+                return [NoteView(v).to_dict() for v in rows]
+            # Only the requested page is looked up and turned into dicts
+            self._indexes.refresh()
+            store = self._store()
+            records = (store.get(note_id) for note_id in self.sort_index.page(sort_by, offset, limit))
+            return [NoteView(data).to_dict() for data in records if data is not None]
+
+    def iter_notes(self, sort_by: Optional[str] = None) -> Iterator[Dict]:
+        self._flush_batch()
+        records = (NoteView(v).to_dict() for _, v in self.storage.iter_items())
+        if sort_by is not None:
+            key, descending = NOTE_SORT_KEYS.get(sort_by, NOTE_SORT_KEYS["created"])
+            records = external_sort(records, key=key, reverse=descending)
+        return records
+
+    @timed("notes.export_notes")
+    def export_notes(self, out: TextIO, fmt: str = "jsonl", sort_by: Optional[str] = None) -> int:
+        return write_records(self.iter_notes(sort_by=sort_by), out, fmt, NOTE_FIELDS)
+
+    @timed("notes.add_note")
     def add_note(self, text: str, tags_text: Optional[str] = None) -> Dict:
         note = Note.new(text=text, tags_text=tags_text)
-        self.storage.upsert(note.id, note.to_dict())
+        record = note.to_dict()
+        with self._indexes.writing():
+            self._store().upsert(note.id, record)
+            self._indexes.add(note.id, record)
         return note.to_dict()
 
-    def search_notes(self, query: str) -> List[Dict]:
+    @timed("notes.search_notes")
+    def search_notes(
+        self, query: str, rank: str = "relevance", limit: Optional[int] = None, offset: int = 0
+    ) -> List[Dict]:
+        if rank not in SEARCH_RANKS:
+            raise ValueError(f"rank must be one of: {', '.join(SEARCH_RANKS)}")
+        self._indexes.refresh()
+        scores = self.text_index.search(query)
+        if scores is None:
+            # No word characters in the query: fall back to a plain substring scan
+            return self._scan_notes(query, limit, offset)
+        store = self._store()
+        results: List[NoteView] = []
+        for note_id in sorted(scores):
+            data = store.get(note_id)
+            if data is not None:
+                results.append(NoteView(data))
+        results.sort(key=lambda n: n.updated_at, reverse=True)
+        if rank == "relevance":
+            results.sort(key=lambda n: scores[n.id], reverse=True)
+        return [n.to_dict() for n in page(results, offset, limit)]
+
+    def _scan_notes(self, query: str, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
         q = query.strip().lower()
-        results: List[Note] = []
-        for data in self.storage.all().values():
-            n = Note.from_dict(data)
+        if self.storage.supports_query:
+            self._flush_batch()
+            rows = self.storage.query(order_by="updated", descending=True, contains=q, limit=limit, offset=offset)
+            return [NoteView(v).to_dict() for v in rows]
+        results: List[NoteView] = []
+        for data in self._store().all().values():
+            n = NoteView(data)
             haystack = " ".join([n.text or "", ",".join(n.tags or [])]).lower()
             if q in haystack:
                 results.append(n)
         results.sort(key=lambda n: n.updated_at, reverse=True)
-        return [n.to_dict() for n in results]
+        return [n.to_dict() for n in page(results, offset, limit)]
 
-    def search_by_tags(self, tags: List[str]) -> List[Dict]:
+    @timed("notes.search_by_tags")
+    def search_by_tags(self, tags: List[str], limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
         tags_lower = {t.strip().lower() for t in tags if t.strip()}
-        results: List[Note] = []
-        for data in self.storage.all().values():
-            n = Note.from_dict(data)
-            note_tags = {t.lower() for t in (n.tags or [])}
-            if tags_lower.issubset(note_tags):
-                results.append(n)
+        if self.storage.supports_query:
+            self._flush_batch()
+            rows = self.storage.query(order_by="updated", descending=True, tags=tags_lower, limit=limit, offset=offset)
+            return [NoteView(v).to_dict() for v in rows]
+        self._indexes.refresh()
+        store = self._store()
+        results: List[NoteView] = []
+        for note_id in self.tag_index.lookup(tags_lower):
+            data = store.get(note_id)
+            if data is not None:
+                results.append(NoteView(data))
         results.sort(key=lambda n: n.updated_at, reverse=True)
-        return [n.to_dict() for n in results]
+        return [n.to_dict() for n in page(results, offset, limit)]
+
+    @timed("notes.tag_counts")
+    def tag_counts(self) -> List[Tuple[str, int]]:
+        self._indexes.refresh()
+        return self.tag_index.counts()
 
+    @timed("notes.edit_note")
     def edit_note(self, note_id: str, **fields: str) -> Optional[Dict]:
-        raw = self.storage.get(note_id)
-        if not raw:
-            return None
-        note = Note.from_dict(raw)
-        changed = False
-        if (text := fields.get("text")) is not None:
-            note.text = text.strip()
-            changed = True
-        if (tags := fields.get("tags")) is not None:
-            tag_list = [t.strip() for t in tags.split(",") if t.strip()]
-            note.tags = tag_list
-            changed = True
-        if changed:
+        # Optimistic: the write only succeeds if the note is still the version
+        # we read; otherwise re-read and re-apply the edit on top of the new one
+        for attempt in range(WRITE_ATTEMPTS):
+            if attempt:
+                retry_pause(attempt)
+            raw = self._store().get(note_id)
+            if not raw:
+                return None
+            note = Note.from_dict(raw)
+            changed = False
+            if (text := fields.get("text")) is not None:
+                note.text = text.strip()
+                changed = True
+            if (tags := fields.get("tags")) is not None:
+                tag_list = [t.strip() for t in tags.split(",") if t.strip()]
+                note.tags = tag_list
+                changed = True
+            if not changed:
+                return note.to_dict()
             note.validate()
             note.updated_at = datetime.utcnow().isoformat(timespec="seconds") + "Z"
-            self.storage.upsert(note.id, note.to_dict())
-        return note.to_dict()
+            record = note.to_dict()
+            try:
+                with self._indexes.writing():
+                    self._store().upsert(note.id, record, expected_version=record_version(raw))
+                    self._indexes.add(note.id, record)
+            except ConflictError:
+                continue
+            return note.to_dict()
+        raise ConflictError(f"Note {note_id} kept changing; gave up after {WRITE_ATTEMPTS} attempts")
 
+    @timed("notes.delete_note")
     def delete_note(self, note_id: str) -> bool:
-        return self.storage.delete(note_id)
+        with self._indexes.writing():
+            found = self._store().delete(note_id)
+            if found:
+                self._indexes.discard(note_id)
+        return found
+
+    def _add_item(self, report: BulkReport, index: int, item: Union[Dict, ValueError]) -> None:
+        if isinstance(item, ValueError):
+            report.add_failure(index, str(item))
+            return
+        try:
+            check_field_types(item, ("text",), ("tags",))
+            tags = item.get("tags")
+            if isinstance(tags, list):
+                tags = ",".join(tags)
+            self.add_note(text=item.get("text") or "", tags_text=tags)
+        except ValueError as e:
+            report.add_failure(index, str(e))
+        else:
+            report.succeeded += 1
+
+    @timed("notes.add_notes")
+    def add_notes(self, items: Iterable[Dict]) -> BulkReport:
+        with self.bulk() as report:
+            for index, item in enumerate(items):
+                self._add_item(report, index, item)
+        return report
+
+    @timed("notes.import_notes")
+    def import_notes(
+        self,
+        rows: Iterable[NumberedRecord],
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+        failure_limit: Optional[int] = IMPORT_FAILURE_LIMIT,
+    ) -> BulkReport:
+        # rows as produced by iter_records(); failures are reported by line number
+        report = BulkReport(failure_limit=failure_limit)
+        started = time.perf_counter()
+        for chunk in chunked(rows, chunk_size):
+            with self.bulk():
+                for line, item in chunk:
+                    self._add_item(report, line, item)
+                # Inside an outer bulk() (e.g. a script) the chunk joined its batch:
+                # commit it here so staged rows stay bounded by chunk_size
+                self._flush_batch()
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    @timed("notes.delete_notes")
+    def delete_notes(self, note_ids: Iterable[str]) -> BulkReport:
+        with self.bulk() as report:
+            for index, note_id in enumerate(note_ids):
+                if self.delete_note(note_id):
+                    report.succeeded += 1
+                else:
+                    report.add_failure(index, f"Note not found: {note_id}")
+        return report
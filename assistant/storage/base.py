@@ -0,0 +1,202 @@
+from __future__ import annotations
+import random
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+
+# Per-record write counter, stamped by the storage on every upsert
+VERSION_FIELD = "_version"
+# Optimistic edits re-read and retry this many times before giving up, waiting
+# a random, exponentially growing delay (starting at RETRY_DELAY seconds) between tries
+WRITE_ATTEMPTS = 8
+RETRY_DELAY = 0.002
+
+
+class ConflictError(RuntimeError):
+    # A versioned write found the record changed (or gone) since it was read
+    pass
+
+
+def retry_pause(attempt: int) -> None:
+    # Randomized so competing writers do not retry in lockstep
+    time.sleep(random.uniform(0, RETRY_DELAY * 2 ** attempt))
+
+
+def record_version(record: Optional[Dict[str, Any]]) -> int:
+    # Records written before versioning count as version 0
+    return (record or {}).get(VERSION_FIELD, 0)
+
+
+def check_version(entity_id: str, current: Optional[Dict[str, Any]], expected_version: Optional[int]) -> None:
+    if expected_version is not None and (current is None or record_version(current) != expected_version):
+        raise ConflictError(f"Record {entity_id} was changed by someone else")
+
+
+def stamp_version(
+    entity_id: str,
+    current: Optional[Dict[str, Any]],
+    entity: Dict[str, Any],
+    expected_version: Optional[int] = None,
+) -> None:
+    # Check an optimistic write against the stored record and stamp the new version
+    check_version(entity_id, current, expected_version)
+    entity[VERSION_FIELD] = record_version(current) + 1
+
+
+class Storage:
+    file_path: str
+    # Backends that can filter and sort server-side (see query()) set this to True
+    supports_query = False
+    # Bumped once per committed write and once per change picked up from disk, so
+    # derived indexes can tell their own writes apart from someone else's
+    _generation = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def fingerprint(self) -> Optional[str]:
+        # Cheap on-disk identity of the current contents, used to validate
+        # persisted indexes; None when the backend cannot provide one
+        return None
+
+    def close(self) -> None:
+        # Releases open handles (and flushes any in-memory bookkeeping)
+        pass
+
+    def load(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def save(self, data: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def all(self) -> Mapping[str, Any]:
+        # Read-only; may be a lazy view that decodes records on access
+        return self.load()
+
+    def get(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        return self.load().get(entity_id)
+
+    def iter_items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        # Backends that can stream from disk override this to avoid holding everything.
+        # Iterates a snapshot, as writes made while the caller iterates (e.g. the
+        # async services between chunks) change the cached dict
+        yield from list(self.load().items())
+
+    def write_lock(self) -> ContextManager[Any]:
+        # Held around read-modify-write cycles; file backends serialize writers
+        # across processes here, readers never take it
+        return nullcontext()
+
+    def upsert(self, entity_id: str, entity: Dict[str, Any], expected_version: Optional[int] = None) -> None:
+        # Stamps entity with the next version; with expected_version, raises
+        # ConflictError unless the stored record is still at that version
+        raise NotImplementedError
+
+    def delete(self, entity_id: str) -> bool:
+        raise NotImplementedError
+
+    def apply(self, upserts: Dict[str, Dict[str, Any]], deletes: Iterable[str]) -> None:
+        # Default: one load-modify-save cycle, i.e. a single write for the whole set
+        with self.write_lock():
+            data = self.load()
+            for entity_id in deletes:
+                data.pop(entity_id, None)
+            for entity_id, entity in upserts.items():
+                stamp_version(entity_id, data.get(entity_id), entity)
+            data.update(upserts)
+            self.save(data)
+
+    @contextmanager
+    def batch(self) -> Iterator["Batch"]:
+        batch = Batch(self)
+        yield batch
+        # Only reached when the block exits cleanly; on error the staged changes are dropped
+        batch.commit()
+
+    def query(
+        self,
+        order_by: Optional[str] = None,
+        descending: bool = False,
+        contains: Optional[str] = None,
+        tags: Iterable[str] = (),
+        require: Iterable[str] = (),
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class Batch:
+    def __init__(self, storage: Storage) -> None:
+        self.storage = storage
+        self._upserts: Dict[str, Dict[str, Any]] = {}
+        self._deletes: Set[str] = set()
+        # Staged state (upsert, deleted) of each entity before its first write since savepoint()
+        self._undo: Optional[Dict[str, Tuple[Optional[Dict[str, Any]], bool]]] = None
+
+    def __len__(self) -> int:
+        return len(self._upserts) + len(self._deletes)
+
+    def get(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        if entity_id in self._deletes:
+            return None
+        if entity_id in self._upserts:
+            return self._upserts[entity_id]
+        return self.storage.get(entity_id)
+
+    def all(self) -> Dict[str, Any]:
+        data = dict(self.storage.all())
+        for entity_id in self._deletes:
+            data.pop(entity_id, None)
+        data.update(self._upserts)
+        return data
+
+    def upsert(self, entity_id: str, entity: Dict[str, Any], expected_version: Optional[int] = None) -> None:
+        # Versions are checked against what the batch sees now and stamped at commit
+        if expected_version is not None:
+            check_version(entity_id, self.get(entity_id), expected_version)
+        self._remember(entity_id)
+        self._deletes.discard(entity_id)
+        self._upserts[entity_id] = entity
+
+    def delete(self, entity_id: str) -> bool:
+        if self.get(entity_id) is None:
+            return False
+        self._remember(entity_id)
+        self._upserts.pop(entity_id, None)
+        self._deletes.add(entity_id)
+        return True
+
+    def _remember(self, entity_id: str) -> None:
+        if self._undo is not None and entity_id not in self._undo:
+            self._undo[entity_id] = (self._upserts.get(entity_id), entity_id in self._deletes)
+
+    def savepoint(self) -> None:
+        # Writes staged from here on can be dropped with rollback(), until the next commit
+        self._undo = {}
+
+    def rollback(self) -> bool:
+        # Restores the staged state of the last savepoint(); True if anything was dropped
+        if not self._undo:
+            return False
+        for entity_id, (upsert, deleted) in self._undo.items():
+            self._upserts.pop(entity_id, None)
+            self._deletes.discard(entity_id)
+            if upsert is not None:
+                self._upserts[entity_id] = upsert
+            if deleted:
+                self._deletes.add(entity_id)
+        self._undo = {}
+        return True
+
+    def commit(self) -> None:
+        if not self._upserts and not self._deletes:
+            return
+        self.storage.apply(self._upserts, self._deletes)
+        self._upserts = {}
+        self._deletes = set()
+        if self._undo is not None:
+            # Committed writes cannot be dropped any more
+            self._undo = {}
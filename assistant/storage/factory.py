@@ -0,0 +1,44 @@
+from __future__ import annotations
+from typing import Optional
+
+from assistant.storage.base import Storage
+from assistant.storage.journal_store import JournalStorage
+from assistant.storage.json_store import JSONStorage
+from assistant.storage.jsonl_store import JSONLStorage
+from assistant.storage.sharded_store import ShardedStorage
+from assistant.storage.sqlite_store import SQLiteStorage
+from assistant.utils.io import DEFAULT_CODEC
+
+
+BACKENDS = ("json", "journal", "sqlite", "sharded", "jsonl")
+
+
+def open_storage(
+    file_path: str, backend: str = "json", kind: Optional[str] = None, codec: str = DEFAULT_CODEC
+) -> Storage:
+    # codec: file format of the json, journal (snapshot) and sharded backends;
+    # sqlite and jsonl keep their records as JSON text
+    if backend == "json":
+        return JSONStorage(file_path, codec)
+    if backend == "journal":
+        return JournalStorage(file_path, codec=codec)
+    if backend == "sqlite":
+        if kind is None:
+            raise ValueError("sqlite backend needs a record kind (contacts or notes)")
+        return SQLiteStorage(file_path, kind)
+    if backend == "sharded":
+        return ShardedStorage(file_path, codec=codec)
+    if backend == "jsonl":
+        return JSONLStorage(file_path)
+    raise ValueError(f"Unknown storage backend: {backend}. Choose one of: {', '.join(BACKENDS)}")
+
+
+def convert_storage(
+    file_path: str, source: str, target: str, kind: Optional[str] = None, codec: Optional[str] = None
+) -> int:
+    # With a codec, source and target may be the same backend (re-encoding in place)
+    if source == target and codec is None:
+        raise ValueError("Source and target backends are the same")
+    data = open_storage(file_path, source, kind).load()
+    open_storage(file_path, target, kind, codec or DEFAULT_CODEC).save(data)
+    return len(data)
@@ -0,0 +1,215 @@
+from __future__ import annotations
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from assistant.storage.base import Storage, stamp_version
+from assistant.utils.instrumentation import fsync, metrics
+from assistant.utils.io import (
+    DEFAULT_CODEC,
+    atomic_write_json,
+    ensure_directory,
+    get_codec,
+    read_data,
+    stat_signature,
+    truncate_torn_tail,
+)
+from assistant.utils.locking import FileLock
+
+
+DEFAULT_COMPACT_THRESHOLD = 4 * 1024 * 1024  # bytes of journal before folding it into the snapshot
+
+
+# Snapshot (same layout as JSONStorage) plus an append-only journal of changes:
+# each write (a whole batch included) appends one line, and the journal is replayed on load and folded
+# into the snapshot once it grows past compact_threshold bytes.
+class JournalStorage(Storage):
+    def __init__(
+        self, file_path: str, compact_threshold: int = DEFAULT_COMPACT_THRESHOLD, codec: str = DEFAULT_CODEC
+    ) -> None:
+        self.file_path = file_path
+        # Snapshot format; the journal itself is always JSON lines
+        self.codec = get_codec(codec).name
+        self.journal_path = file_path + ".journal"
+        self.compact_threshold = compact_threshold
+        self._data: Optional[Dict[str, Any]] = None
+        self._snapshot_signature: Optional[Tuple[int, int, int]] = None
+        self._journal_offset = 0
+        # Serializes appends and compaction across processes; readers replay
+        # whole lines only and never take it
+        self._lock = FileLock(file_path + ".lock")
+        ensure_directory(os.path.dirname(self.file_path))
+        if not os.path.exists(self.file_path):
+            atomic_write_json(self.file_path, {}, self.codec)
+
+    @property
+    def generation(self) -> int:
+        self.load()
+        return self._generation
+
+    def fingerprint(self) -> Optional[str]:
+        snapshot = stat_signature(self.file_path)
+        if snapshot is None:
+            return None
+        journal = stat_signature(self.journal_path) or (0, 0, 0)
+        return "journal:%d:%d:%d:" % snapshot + "%d:%d:%d" % journal
+
+    def _read_snapshot(self) -> Dict[str, Any]:
+        # Like JSONStorage.load: an unreadable snapshot raises rather than
+        # reading as empty and being compacted over
+        try:
+            data = read_data(self.file_path)
+        except FileNotFoundError:
+            return {}
+        if not isinstance(data, dict):
+            raise ValueError(f"Cannot read {self.file_path}: not a store")
+        return data
+
+    def _replay(self, data: Dict[str, Any], offset: int) -> int:
+        try:
+            with open(self.journal_path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return 0
+        end = chunk.rfind(b"\n")
+        if end < 0:
+            # Nothing complete yet; a torn trailing line is retried on the next read
+            return offset
+        for raw in chunk[: end + 1].splitlines():
+            try:
+                entry = json.loads(raw)
+            except ValueError:
+                continue
+            self._apply_entry(data, entry)
+        return offset + end + 1
+
+    @staticmethod
+    def _apply_entry(data: Dict[str, Any], entry: Dict[str, Any]) -> None:
+        op = entry.get("op")
+        if op == "put":
+            data[entry["id"]] = entry.get("data")
+        elif op == "del":
+            data.pop(entry.get("id"), None)
+        elif op == "batch":
+            for item in entry.get("entries") or []:
+                JournalStorage._apply_entry(data, item)
+
+    def load(self) -> Dict[str, Any]:
+        signature = stat_signature(self.file_path)
+        try:
+            journal_size = os.path.getsize(self.journal_path)
+        except OSError:
+            journal_size = 0
+        if self._data is None or signature != self._snapshot_signature or journal_size < self._journal_offset:
+            # Snapshot replaced (e.g. compacted by another process): rebuild from scratch
+            self._data = self._read_snapshot()
+            self._snapshot_signature = signature
+            self._journal_offset = 0
+            self._generation += 1
+        if journal_size > self._journal_offset:
+            offset = self._replay(self._data, self._journal_offset)
+            if offset != self._journal_offset:
+                self._generation += 1
+            self._journal_offset = offset
+        return self._data
+
+    def _append(self, entries: List[Dict[str, Any]]) -> None:
+        # Under the lock
+        payload = "".join(
+            json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n" for e in entries
+        ).encode("utf-8")
+        with open(self.journal_path, "a+b") as f:
+            start = truncate_torn_tail(f)
+            f.write(payload)
+            f.flush()
+            fsync(f.fileno())
+            end = f.tell()
+        if metrics.enabled:
+            metrics.add("bytes_written", len(payload))
+        self._generation += 1
+        if start == self._journal_offset:
+            self._journal_offset = end
+        # Otherwise another process appended in between; the next load() replays
+        # their entries together with ours (replay is idempotent)
+
+    def _maybe_compact(self) -> None:
+        if self._journal_offset >= self.compact_threshold:
+            self.compact()
+
+    def compact(self) -> None:
+        # Same contents, new layout: does not count as a change for generation
+        with self._lock:
+            self._write_snapshot(self.load())
+
+    def _write_snapshot(self, data: Dict[str, Any]) -> None:
+        try:
+            atomic_write_json(self.file_path, data, self.codec)
+            # Snapshot already contains every journaled change, so the journal can go
+            with open(self.journal_path, "wb") as f:
+                f.flush()
+                fsync(f.fileno())
+        except Exception:
+            self._data = None
+            raise
+        self._data = data
+        self._snapshot_signature = stat_signature(self.file_path)
+        self._journal_offset = 0
+
+    def write_lock(self) -> FileLock:
+        return self._lock
+
+    def save(self, data: Dict[str, Any]) -> None:
+        with self._lock:
+            self._write_snapshot(data)
+        self._generation += 1
+
+    def upsert(self, entity_id: str, entity: Dict[str, Any], expected_version: Optional[int] = None) -> None:
+        with self._lock:
+            # load() under the lock replays every append made before ours
+            data = self.load()
+            stamp_version(entity_id, data.get(entity_id), entity, expected_version)
+            try:
+                self._append([{"op": "put", "id": entity_id, "data": entity}])
+            except Exception:
+                self._data = None
+                raise
+            data[entity_id] = entity
+            self._maybe_compact()
+
+    def apply(self, upserts: Dict[str, Dict[str, Any]], deletes: Iterable[str]) -> None:
+        with self._lock:
+            data = self.load()
+            deletes = [entity_id for entity_id in deletes if entity_id in data]
+            for entity_id, entity in upserts.items():
+                stamp_version(entity_id, None if entity_id in deletes else data.get(entity_id), entity)
+            entries = [{"op": "del", "id": entity_id} for entity_id in deletes]
+            entries.extend({"op": "put", "id": entity_id, "data": entity} for entity_id, entity in upserts.items())
+            if not entries:
+                return
+            if len(entries) > 1:
+                # One line, so a torn write replays all of the batch or none of it
+                entries = [{"op": "batch", "entries": entries}]
+            try:
+                self._append(entries)
+            except Exception:
+                self._data = None
+                raise
+            for entity_id in deletes:
+                data.pop(entity_id, None)
+            data.update(upserts)
+            self._maybe_compact()
+
+    def delete(self, entity_id: str) -> bool:
+        with self._lock:
+            data = self.load()
+            if entity_id not in data:
+                return False
+            try:
+                self._append([{"op": "del", "id": entity_id}])
+            except Exception:
+                self._data = None
+                raise
+            data.pop(entity_id, None)
+            self._maybe_compact()
+            return True
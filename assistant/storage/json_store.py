@@ -1,48 +1,113 @@
 from __future__ import annotations
-import json
 import os
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from assistant.utils.io import atomic_write_json, ensure_directory
+from assistant.storage.base import Storage, stamp_version
+from assistant.utils.instrumentation import timed
+from assistant.utils.io import DEFAULT_CODEC, atomic_write_json, ensure_directory, get_codec, read_data, stat_signature
+from assistant.utils.locking import FileLock
 
 
-class JSONStorage:
-    def __init__(self, file_path: str) -> None:
+class JSONStorage(Storage):
+    def __init__(self, file_path: str, codec: str = DEFAULT_CODEC) -> None:
         self.file_path = file_path
+        # Format for writes; loads recognize any codec, so switching codecs
+        # converts the file on its next save
+        self.codec = get_codec(codec).name
+        # Parsed file contents, valid while the file's stat signature is unchanged
+        self._cache: Optional[Dict[str, Any]] = None
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Writers re-read under this lock (load() notices the new file by its
+        # stat signature) and apply only their own change on top
+        self._lock = FileLock(file_path + ".lock")
         ensure_directory(os.path.dirname(self.file_path))
         if not os.path.exists(self.file_path):
-            atomic_write_json(self.file_path, {})
+            atomic_write_json(self.file_path, {}, self.codec)
 
+    @property
+    def generation(self) -> int:
+        if stat_signature(self.file_path) != self._signature:
+            self.load()
+        return self._generation
+
+    def fingerprint(self) -> Optional[str]:
+        signature = stat_signature(self.file_path)
+        return None if signature is None else "json:%d:%d:%d" % signature
+
+    @timed("jsonstorage.load")
     def load(self) -> Dict[str, Any]:
-        if not os.path.exists(self.file_path):
+        signature = stat_signature(self.file_path)
+        if signature is None:
+            if self._cache is not None:
+                self._generation += 1
+            self.invalidate()
             return {}
+        if self._cache is not None and signature == self._signature:
+            self.cache_hits += 1
+            return self._cache
+        self.cache_misses += 1
+        # A file that does not decode (corrupt, or marshal from another Python)
+        # raises instead of reading as empty, so no save can overwrite it
         try:
-            with open(self.file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if isinstance(data, dict):
-                return data
-            return {}
-        except Exception:
-            return {}
+            data = read_data(self.file_path)
+        except FileNotFoundError:
+            # Removed since the stat above
+            data = {}
+        if not isinstance(data, dict):
+            raise ValueError(f"Cannot read {self.file_path}: not a store")
+        self._cache = data
+        self._signature = signature
+        self._generation += 1
+        return data
 
+    def write_lock(self) -> FileLock:
+        return self._lock
+
+    @timed("jsonstorage.save")
     def save(self, data: Dict[str, Any]) -> None:
-        atomic_write_json(self.file_path, data)
+        try:
+            with self._lock:
+                atomic_write_json(self.file_path, data, self.codec)
+        except Exception:
+            self.invalidate()
+            raise
+        self._cache = data
+        self._signature = stat_signature(self.file_path)
+        self._generation += 1
+
+    def invalidate(self) -> None:
+        self._cache = None
+        self._signature = None
+
+    def cache_stats(self) -> Dict[str, int]:
+        return {"hits": self.cache_hits, "misses": self.cache_misses}
 
     def all(self) -> Dict[str, Any]:
         return self.load()
 
     def get(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        # A cache hit skips load() and its timer, so point reads do not show up as loads
+        if self._cache is not None and stat_signature(self.file_path) == self._signature:
+            self.cache_hits += 1
+            return self._cache.get(entity_id)
         return self.load().get(entity_id)
 
-    def upsert(self, entity_id: str, entity: Dict[str, Any]) -> None:
-        data = self.load()
-        data[entity_id] = entity
-        self.save(data)
+    @timed("jsonstorage.upsert")
+    def upsert(self, entity_id: str, entity: Dict[str, Any], expected_version: Optional[int] = None) -> None:
+        with self._lock:
+            data = self.load()
+            stamp_version(entity_id, data.get(entity_id), entity, expected_version)
+            data[entity_id] = entity
+            self.save(data)
 
+    @timed("jsonstorage.delete")
     def delete(self, entity_id: str) -> bool:
-        data = self.load()
-        if entity_id in data:
+        with self._lock:
+            data = self.load()
+            if entity_id not in data:
+                return False
             del data[entity_id]
             self.save(data)
             return True
-        return False
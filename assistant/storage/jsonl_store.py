@@ -0,0 +1,344 @@
+from __future__ import annotations
+import mmap
+import os
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from assistant.storage.base import Storage, stamp_version
+from assistant.utils.instrumentation import fsync, metrics, timed
+from assistant.utils.io import (
+    atomic_write_json,
+    dumps_compact,
+    ensure_directory,
+    loads_json,
+    read_data,
+)
+from assistant.utils.locking import FileLock
+
+
+FORMAT = "assistant-jsonl"
+FORMAT_VERSION = 1
+# Compact once dead (superseded or deleted) lines make up this share of a file
+# of at least COMPACT_MIN_BYTES
+COMPACT_DEAD_RATIO = 0.5
+COMPACT_MIN_BYTES = 1024 * 1024
+
+# id -> (offset, length) of the record's live line, in insertion order
+Offsets = Dict[str, Tuple[int, int]]
+
+
+def jsonl_path(file_path: str) -> str:
+    return os.path.splitext(file_path)[0] + ".jsonl"
+
+
+def _record_line(entity_id: str, entity: Optional[Dict[str, Any]]) -> bytes:
+    entry: Dict[str, Any] = {"id": entity_id, "data": entity} if entity is not None else {"id": entity_id, "deleted": True}
+    return dumps_compact(entry) + b"\n"
+
+
+class RecordsView(Mapping[str, Any]):
+    # Read-only snapshot of a JSONLStorage: records are decoded from the map
+    # only when accessed, so iterating never holds more than one at a time
+    def __init__(self, data: "mmap.mmap", offsets: Offsets) -> None:
+        self._data = data
+        self._offsets = offsets
+
+    def __getitem__(self, entity_id: str) -> Any:
+        offset, length = self._offsets[entity_id]
+        return loads_json(self._data[offset : offset + length])["data"]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __contains__(self, entity_id: object) -> bool:
+        return entity_id in self._offsets
+
+
+class JSONLStorage(Storage):
+    # One JSON line per record version in <name>.jsonl, read through mmap:
+    #   {"format": "assistant-jsonl", "version": 1, "epoch": "..."}   header
+    #   {"id": "...", "data": {...}}                                 put
+    #   {"id": "...", "deleted": true}                               delete
+    #   {"batch": 3}                              the next 3 lines are one write
+    # Writes append (the last line for an id wins) and compaction rewrites the
+    # live lines into a new file with a new epoch. The id -> (offset, length)
+    # index is kept in a marshal sidecar (<name>.jsonl.idx) tagged with the
+    # epoch and the file length it covers; lines appended after that length
+    # (e.g. by another process) are scanned on top. Opening the store reads
+    # nothing but the header: the index is loaded on first use.
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = jsonl_path(file_path)
+        self.index_path = self.file_path + ".idx"
+        self._lock = FileLock(self.file_path + ".lock")
+        ensure_directory(os.path.dirname(self.file_path))
+        self._file: Optional[Any] = None
+        self._map: Optional[mmap.mmap] = None
+        self._inode: Optional[int] = None
+        self._epoch = ""
+        self._offsets: Optional[Offsets] = None
+        self._end = 0  # bytes of the file reflected in _offsets
+        self._dead = 0  # bytes of lines superseded since the last compaction
+        self._saved_end = 0  # _end as of the sidecar on disk
+        if not os.path.exists(self.file_path):
+            with self._lock:
+                if not os.path.exists(self.file_path):
+                    self._rewrite({})
+        self._open()
+
+    # --- file and index state -------------------------------------------
+
+    def _open(self) -> None:
+        self._close_file()
+        self._file = open(self.file_path, "rb")
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        header = loads_json(self._file.readline())
+        if header.get("format") != FORMAT or header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{self.file_path} is not a version {FORMAT_VERSION} {FORMAT} file")
+        self._epoch = header["epoch"]
+        self._map = None
+        self._offsets = None
+
+    def _close_file(self) -> None:
+        # Views handed out by all() keep their own reference to the old map
+        self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _mapped(self, size: int) -> mmap.mmap:
+        if self._map is None or len(self._map) < size:
+            assert self._file is not None
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _index(self) -> Offsets:
+        # Brings the index up to date with the file (reopening it if another
+        # process compacted) and returns it
+        try:
+            st = os.stat(self.file_path)
+        except FileNotFoundError:
+            st = None
+        if st is not None and st.st_ino != self._inode:
+            self._open()
+            self._generation += 1
+        if self._offsets is None:
+            self._load_sidecar()
+            self._generation += 1
+        size = st.st_size if st is not None else self._end
+        if size > self._end and self._scan(self._end, size):
+            self._generation += 1
+        assert self._offsets is not None
+        return self._offsets
+
+    def _load_sidecar(self) -> None:
+        try:
+            epoch, end, dead, offsets = read_data(self.index_path)
+        except (OSError, ValueError, TypeError, EOFError):
+            epoch = None
+        if epoch == self._epoch:
+            self._offsets, self._end, self._dead = offsets, end, dead
+        else:
+            # Missing or from another epoch: index the file from the top
+            assert self._file is not None
+            self._file.seek(0)
+            self._offsets, self._end, self._dead = {}, len(self._file.readline()), 0
+        self._saved_end = self._end if epoch == self._epoch else 0
+
+    @timed("jsonlstorage.scan")
+    def _scan(self, start: int, size: int) -> bool:
+        # Indexes the complete lines in [start, size); a torn last line or an
+        # incomplete batch (a write in progress elsewhere, or one that died) is
+        # left for a later scan
+        assert self._offsets is not None
+        data = self._mapped(size)
+        offsets, dead = self._offsets, 0
+        position = start
+        while position < size:
+            newline = data.find(b"\n", position, size)
+            if newline < 0:
+                break
+            try:
+                entry = loads_json(data[position:newline])
+                entity_id = entry.get("id")
+            except (ValueError, AttributeError):
+                entry, entity_id = None, None
+            if entity_id is None and isinstance(entry, dict) and isinstance(entry.get("batch"), int):
+                # Only applied once all its lines are there
+                last = newline
+                for _ in range(entry["batch"]):
+                    last = data.find(b"\n", last + 1, size)
+                    if last < 0:
+                        break
+                if last < 0:
+                    break
+                dead += newline - position + 1
+            if entity_id is not None:
+                previous = offsets.pop(entity_id, None) if entry.get("deleted") else offsets.get(entity_id)
+                if previous is not None:
+                    dead += previous[1] + 1
+                if entry.get("deleted"):
+                    dead += newline - position + 1
+                else:
+                    offsets[entity_id] = (position, newline - position)
+            position = newline + 1
+        if metrics.enabled:
+            metrics.add("bytes_read", position - start)
+        changed = position != start
+        self._end = position
+        self._dead += dead
+        return changed
+
+    def _save_sidecar(self) -> None:
+        if self._offsets is None or self._end == self._saved_end:
+            return
+        atomic_write_json(self.index_path, [self._epoch, self._end, self._dead, self._offsets], "marshal")
+        self._saved_end = self._end
+
+    def _rewrite(self, records: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        # Under the lock: writes a new file (new epoch) holding only live records
+        epoch = uuid.uuid4().hex
+        header = dumps_compact({"format": FORMAT, "version": FORMAT_VERSION, "epoch": epoch}) + b"\n"
+        temp_path = self.file_path + ".tmp"
+        offsets: Offsets = {}
+        with open(temp_path, "wb") as f:
+            f.write(header)
+            position = len(header)
+            for entity_id, entity in records:
+                line = _record_line(entity_id, entity)
+                f.write(line)
+                offsets[entity_id] = (position, len(line) - 1)
+                position += len(line)
+            f.flush()
+            fsync(f.fileno())
+        if metrics.enabled:
+            metrics.add("bytes_written", position)
+        atomic_write_json(self.index_path, [epoch, position, 0, offsets], "marshal")
+        os.replace(temp_path, self.file_path)
+        self._close_file()
+        self._offsets = None
+
+    # --- Storage API ----------------------------------------------------
+
+    @property
+    def generation(self) -> int:
+        self._index()
+        return self._generation
+
+    def fingerprint(self) -> Optional[str]:
+        self._index()
+        return f"jsonl:{self._epoch}:{self._end}"
+
+    def close(self) -> None:
+        self._save_sidecar()
+        self._close_file()
+
+    def write_lock(self) -> FileLock:
+        return self._lock
+
+    def load(self) -> Dict[str, Any]:
+        # Materializes every record; all() and iter_items() are the lazy forms
+        return dict(self.all())
+
+    def all(self) -> RecordsView:
+        offsets = self._index()
+        return RecordsView(self._mapped(self._end), dict(offsets))
+
+    def iter_items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        view = self.all()
+        for entity_id in view:
+            yield entity_id, view[entity_id]
+
+    def get(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        location = self._index().get(entity_id)
+        if location is None:
+            return None
+        offset, length = location
+        return loads_json(self._mapped(offset + length)[offset : offset + length])["data"]
+
+    @timed("jsonlstorage.save")
+    def save(self, data: Dict[str, Any]) -> None:
+        with self._lock:
+            generation = self._generation
+            self._rewrite(data.items())
+            self._open()
+            self._index()
+            self._generation = generation + 1
+
+    def _append(self, changes: List[Tuple[str, Optional[Dict[str, Any]]]]) -> None:
+        # Under the lock, with the index just refreshed: everything up to _end
+        # is committed, and anything after it was left by a writer that died
+        # mid-append (a torn line, or part of a batch). It is cut off first,
+        # and offsets count from where our lines actually land. Several changes
+        # go in as a batch, so a torn write keeps all of them or none
+        assert self._offsets is not None
+        lines = [_record_line(entity_id, entity) for entity_id, entity in changes]
+        header = dumps_compact({"batch": len(lines)}) + b"\n" if len(lines) > 1 else b""
+        payload = header + b"".join(lines)
+        with open(self.file_path, "a+b") as f:
+            if f.seek(0, os.SEEK_END) > self._end:
+                f.truncate(self._end)
+            start = f.seek(0, os.SEEK_END)
+            f.write(payload)
+            f.flush()
+            fsync(f.fileno())
+        if metrics.enabled:
+            metrics.add("bytes_written", len(payload))
+        self._dead += len(header)
+        position = start + len(header)
+        for (entity_id, entity), line in zip(changes, lines):
+            previous = self._offsets.pop(entity_id, None) if entity is None else self._offsets.get(entity_id)
+            if previous is not None:
+                self._dead += previous[1] + 1
+            if entity is None:
+                self._dead += len(line)
+            else:
+                self._offsets[entity_id] = (position, len(line) - 1)
+            position += len(line)
+        self._end = position
+        self._generation += 1
+        if self._end >= COMPACT_MIN_BYTES and self._dead >= self._end * COMPACT_DEAD_RATIO:
+            self.compact()
+
+    @timed("jsonlstorage.upsert")
+    def upsert(self, entity_id: str, entity: Dict[str, Any], expected_version: Optional[int] = None) -> None:
+        with self._lock:
+            self._index()
+            stamp_version(entity_id, self.get(entity_id), entity, expected_version)
+            self._append([(entity_id, entity)])
+
+    @timed("jsonlstorage.delete")
+    def delete(self, entity_id: str) -> bool:
+        with self._lock:
+            if entity_id not in self._index():
+                return False
+            self._append([(entity_id, None)])
+            return True
+
+    @timed("jsonlstorage.apply")
+    def apply(self, upserts: Dict[str, Dict[str, Any]], deletes: Iterable[str]) -> None:
+        # One append (and one fsync) for the whole set
+        with self._lock:
+            offsets = self._index()
+            changes: List[Tuple[str, Optional[Dict[str, Any]]]] = [
+                (entity_id, None) for entity_id in deletes if entity_id in offsets and entity_id not in upserts
+            ]
+            for entity_id, entity in upserts.items():
+                stamp_version(entity_id, self.get(entity_id), entity)
+                changes.append((entity_id, entity))
+            if changes:
+                self._append(changes)
+
+    @timed("jsonlstorage.compact")
+    def compact(self) -> None:
+        # Same contents, new file: does not count as a change for generation
+        with self._lock:
+            self._index()
+            generation = self._generation
+            self._rewrite(self.iter_items())
+            self._open()
+            self._index()
+            self._generation = generation
@@ -0,0 +1,340 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from assistant.storage.base import Storage, stamp_version
+from assistant.storage.json_store import JSONStorage
+from assistant.utils.instrumentation import timed
+from assistant.utils.io import DEFAULT_CODEC, atomic_write_json, ensure_directory, get_codec, stat_signature
+from assistant.utils.locking import FileLock
+
+
+DEFAULT_SHARDS = 16
+TARGET_SHARD_BYTES = 1 << 20  # reshard without an explicit count aims for shards about this size
+MANIFEST = "manifest.json"
+SCAN_WORKERS = 8  # shards read concurrently by a full load
+
+Signature = Optional[Tuple[int, int, int]]
+Change = Dict[str, Optional[Dict[str, Any]]]  # id -> record, or None to delete
+
+
+def sharded_path(file_path: str) -> str:
+    return os.path.splitext(file_path)[0] + ".shards"
+
+
+def shard_of(entity_id: str, count: int) -> int:
+    # crc32 rather than hash(): string hashing is salted per process
+    return zlib.crc32(entity_id.encode("utf-8")) % count
+
+
+class ShardedStorage(Storage):
+    # A store split by id hash into `count` JSONStorage files inside
+    # <name>.shards/, so a write rewrites one shard instead of the whole store.
+    # manifest.json lists the current file of each shard
+    # (epoch-000002/shard-003-of-016.json). A write to one shard replaces its
+    # file in place. A write spanning several shards (a batch, save(), a
+    # reshard) writes new files for the shards it touches into the next epoch
+    # directory and commits by switching the manifest over, so readers and a
+    # crash see all of it or none. Files of the previous manifest are kept for
+    # readers still on it; older ones are removed. (Stores from before epochs
+    # have no file list and keep their shard files at the top level.)
+    #
+    # Writers take the store lock; readers never do. The merged view of all
+    # shards is cached and kept current by our own writes; a shard changed by
+    # another process is noticed by its stat signature. A read that raced a
+    # manifest switch (the manifest moved while it ran) is retried.
+
+    def __init__(self, file_path: str, shards: int = DEFAULT_SHARDS, codec: str = DEFAULT_CODEC) -> None:
+        self.file_path = sharded_path(file_path)
+        # Shard file format (the manifest stays plain JSON)
+        self.codec = get_codec(codec).name
+        ensure_directory(self.file_path)
+        self._lock = FileLock(os.path.join(self.file_path, "store.lock"))
+        self._manifest_path = os.path.join(self.file_path, MANIFEST)
+        self._manifest_signature: Signature = None
+        self._epoch: Optional[int] = None  # latest epoch directory in use
+        self._files: List[str] = []  # shard files, relative to the store directory
+        self._shards: List[JSONStorage] = []
+        self._merged: Optional[Dict[str, Any]] = None
+        self._signatures: List[Signature] = []
+        if not os.path.exists(self._manifest_path):
+            with self._lock:
+                if not os.path.exists(self._manifest_path):
+                    self._write_shards([{} for _ in range(shards)])
+        self._open_shards()
+
+    @property
+    def shard_count(self) -> int:
+        return len(self._shards)
+
+    @staticmethod
+    def _shard_name(index: int, count: int, epoch: Optional[int]) -> str:
+        # None: the pre-epoch layout, shard files directly in the store directory
+        name = f"shard-{index:03d}-of-{count:03d}.json"
+        return name if epoch is None else f"epoch-{epoch:06d}/{name}"
+
+    def _open_shards(self) -> None:
+        signature = stat_signature(self._manifest_path)
+        with open(self._manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        count = int(manifest["shards"])
+        self._manifest_signature = signature
+        self._epoch = manifest.get("epoch")
+        files = manifest.get("files") or [self._shard_name(i, count, self._epoch) for i in range(count)]
+        # Shards whose file did not change keep their cache (and their place in the merged view)
+        current = {shard.file_path: (shard, old) for shard, old in zip(self._shards, self._signatures)}
+        shards: List[JSONStorage] = []
+        signatures: List[Signature] = []
+        for name in files:
+            path = os.path.join(self.file_path, name)
+            shard, old = current.get(path, (None, None))
+            shards.append(shard if shard is not None else JSONStorage(path, self.codec))
+            signatures.append(old)
+        if len(files) != len(self._shards):
+            self._merged = None
+        self._files, self._shards, self._signatures = list(files), shards, signatures
+
+    def _manifest_moved(self) -> bool:
+        return stat_signature(self._manifest_path) != self._manifest_signature
+
+    def _check_manifest(self) -> None:
+        # Another process resharded: switch to the new shard set
+        if self._manifest_moved():
+            self._open_shards()
+
+    def _next_epoch(self) -> int:
+        epoch = (self._epoch or 0) + 1
+        ensure_directory(os.path.join(self.file_path, f"epoch-{epoch:06d}"))
+        return epoch
+
+    def _write_shards(self, shards: List[Dict[str, Any]]) -> None:
+        # Under the store lock: a complete new shard set in the next epoch,
+        # committed by the manifest. The caller reopens the shards
+        count = len(shards)
+        epoch = self._next_epoch()
+        files = [self._shard_name(index, count, epoch) for index in range(count)]
+        for name, data in zip(files, shards):
+            atomic_write_json(os.path.join(self.file_path, name), data, self.codec)
+        self._switch(files, epoch)
+
+    def _switch(self, files: List[str], epoch: int) -> None:
+        # Under the store lock, every file in `files` written: commits them as
+        # the shard set, then removes shard files that neither this nor the
+        # previous manifest uses (readers of the previous one may still be on it)
+        keep = set(self._files) | set(files)
+        atomic_write_json(self._manifest_path, {"shards": len(files), "epoch": epoch, "files": files})
+        self._manifest_signature = stat_signature(self._manifest_path)
+        self._epoch = epoch
+        self._files = list(files)
+        for entry in os.listdir(self.file_path):
+            if entry.startswith("shard-"):
+                self._remove_unused(entry, keep)
+            elif entry.startswith("epoch-"):
+                directory = os.path.join(self.file_path, entry)
+                for name in os.listdir(directory):
+                    self._remove_unused(f"{entry}/{name}", keep)
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass  # still in use
+
+    def _remove_unused(self, name: str, keep: Set[str]) -> None:
+        # A shard file, or the lock file next to it
+        if name.endswith(".lock"):
+            shard_name = name[: -len(".lock")]
+        else:
+            shard_name = name
+        if shard_name not in keep:
+            try:
+                os.remove(os.path.join(self.file_path, name))
+            except OSError:
+                pass
+
+    @property
+    def generation(self) -> int:
+        self.load()
+        return self._generation
+
+    def fingerprint(self) -> Optional[str]:
+        signatures = [stat_signature(shard.file_path) for shard in self._shards]
+        if any(s is None for s in signatures):
+            return None
+        digest = hashlib.sha1(repr(signatures).encode("ascii")).hexdigest()
+        return f"sharded:{len(signatures)}:{digest}"
+
+    @timed("shardedstorage.load")
+    def load(self) -> Dict[str, Any]:
+        while True:
+            merged = self._load_shards()
+            if not self._manifest_moved():
+                return merged
+            # The manifest switched while we read: our files may be gone by now
+
+    def _load_shards(self) -> Dict[str, Any]:
+        self._check_manifest()
+        signatures = [stat_signature(shard.file_path) for shard in self._shards]
+        if self._merged is not None and signatures == self._signatures:
+            return self._merged
+        stale = [shard for shard, old, new in zip(self._shards, self._signatures, signatures) if old != new]
+        if len(stale) > 1:
+            # Reading and decoding overlap across threads; JSON parsing itself
+            # still takes turns on the GIL
+            with ThreadPoolExecutor(max_workers=min(SCAN_WORKERS, len(stale))) as pool:
+                list(pool.map(JSONStorage.load, stale))
+        merged: Dict[str, Any] = {}
+        for shard in self._shards:
+            merged.update(shard.load())
+        self._merged = merged
+        self._signatures = signatures
+        self._generation += 1
+        return merged
+
+    def write_lock(self) -> FileLock:
+        return self._lock
+
+    @staticmethod
+    def _apply_change(data: Dict[str, Any], change: Change, upsert_versions: bool) -> None:
+        for entity_id, entity in change.items():
+            if entity is None:
+                data.pop(entity_id, None)
+                continue
+            if upsert_versions:
+                stamp_version(entity_id, data.get(entity_id), entity)
+            data[entity_id] = entity
+
+    def _in_sync(self, index: int) -> bool:
+        # Nobody else touched this shard since we merged it
+        return self._merged is not None and stat_signature(self._shards[index].file_path) == self._signatures[index]
+
+    def _merge_change(self, index: int, change: Change, in_sync: bool) -> None:
+        # After our write to shard `index`: patch the merged view, if it was current
+        if in_sync:
+            assert self._merged is not None
+            for entity_id, entity in change.items():
+                if entity is None:
+                    self._merged.pop(entity_id, None)
+                else:
+                    self._merged[entity_id] = entity
+            self._signatures[index] = stat_signature(self._shards[index].file_path)
+        else:
+            self._merged = None
+
+    def _commit_shard(self, index: int, change: Change, upsert_versions: bool) -> None:
+        # Under the store lock: apply {id: record, or None to delete} to one
+        # shard, in place. The caller bumps the generation, once per write
+        shard = self._shards[index]
+        in_sync = self._in_sync(index)
+        data = shard.load()
+        self._apply_change(data, change, upsert_versions)
+        shard.save(data)
+        self._merge_change(index, change, in_sync)
+
+    def _commit_shards(self, changes: Dict[int, Change]) -> None:
+        # Under the store lock: a write spanning shards goes to new files for
+        # the touched shards, committed together by the manifest switch
+        epoch = self._next_epoch()
+        files = list(self._files)
+        written: Dict[int, Tuple[JSONStorage, bool]] = {}
+        for index, change in sorted(changes.items()):
+            # Copied: the old file (and its cached contents) stay as they are until the switch
+            in_sync = self._in_sync(index)
+            data = dict(self._shards[index].load())
+            self._apply_change(data, change, upsert_versions=True)
+            files[index] = self._shard_name(index, len(files), epoch)
+            shard = JSONStorage(os.path.join(self.file_path, files[index]), self.codec)
+            shard.save(data)
+            written[index] = (shard, in_sync)
+        self._switch(files, epoch)
+        for index, (shard, in_sync) in written.items():
+            self._shards[index] = shard
+            self._merge_change(index, changes[index], in_sync)
+
+    def save(self, data: Dict[str, Any]) -> None:
+        with self._lock:
+            self._check_manifest()
+            count = len(self._shards)
+            shards: List[Dict[str, Any]] = [{} for _ in range(count)]
+            for entity_id, entity in data.items():
+                shards[shard_of(entity_id, count)][entity_id] = entity
+            self._write_shards(shards)
+            self._open_shards()
+            self._merged = None
+            self._generation += 1
+
+    def get(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        # A point read only needs (and only re-validates) its own shard
+        while True:
+            self._check_manifest()
+            record = self._shards[shard_of(entity_id, len(self._shards))].get(entity_id)
+            if record is not None or not self._manifest_moved():
+                return record
+            # Not found, but the manifest switched meanwhile: the file may have been removed under us
+
+    @timed("shardedstorage.upsert")
+    def upsert(self, entity_id: str, entity: Dict[str, Any], expected_version: Optional[int] = None) -> None:
+        with self._lock:
+            self._check_manifest()
+            index = shard_of(entity_id, len(self._shards))
+            stamp_version(entity_id, self._shards[index].get(entity_id), entity, expected_version)
+            self._commit_shard(index, {entity_id: entity}, upsert_versions=False)
+            self._generation += 1
+
+    @timed("shardedstorage.delete")
+    def delete(self, entity_id: str) -> bool:
+        with self._lock:
+            self._check_manifest()
+            index = shard_of(entity_id, len(self._shards))
+            if self._shards[index].get(entity_id) is None:
+                return False
+            self._commit_shard(index, {entity_id: None}, upsert_versions=False)
+            self._generation += 1
+            return True
+
+    @timed("shardedstorage.apply")
+    def apply(self, upserts: Dict[str, Dict[str, Any]], deletes: Iterable[str]) -> None:
+        # One rewrite per touched shard; several are committed together (see _commit_shards)
+        with self._lock:
+            self._check_manifest()
+            count = len(self._shards)
+            changes: Dict[int, Change] = {}
+            for entity_id in deletes:
+                changes.setdefault(shard_of(entity_id, count), {})[entity_id] = None
+            for entity_id, entity in upserts.items():
+                changes.setdefault(shard_of(entity_id, count), {})[entity_id] = entity
+            if not changes:
+                return
+            if len(changes) > 1:
+                self._commit_shards(changes)
+            else:
+                [(index, change)] = changes.items()
+                self._commit_shard(index, change, upsert_versions=True)
+            self._generation += 1
+
+    def size(self) -> int:
+        # Bytes on disk across the current shards
+        return sum((stat_signature(shard.file_path) or (0, 0, 0))[1] for shard in self._shards)
+
+    def recommended_shards(self) -> int:
+        return max(1, -(-self.size() // TARGET_SHARD_BYTES))
+
+    def reshard(self, count: Optional[int] = None) -> int:
+        # Rewrites the store into `count` shards (default: recommended_shards());
+        # returns the number of records
+        if count is None:
+            count = self.recommended_shards()
+        if count < 1:
+            raise ValueError("Shard count must be at least 1")
+        with self._lock:
+            data = self.load()
+            shards: List[Dict[str, Any]] = [{} for _ in range(count)]
+            for entity_id, entity in data.items():
+                shards[shard_of(entity_id, count)][entity_id] = entity
+            if count != len(self._shards):
+                self._write_shards(shards)
+                self._open_shards()
+                self._generation += 1
+            return len(data)
@@ -0,0 +1,229 @@
+from __future__ import annotations
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from assistant.models.contact import search_text as contact_search_text
+from assistant.storage.base import VERSION_FIELD, Storage, stamp_version
+from assistant.utils.io import ensure_directory, stat_signature
+
+
+def _contact_columns(entity: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "name_key": (entity.get("name") or "").lower(),
+        "email": (entity.get("email") or "").lower() or None,
+        "birthday": entity.get("birthday") or None,
+        "search_text": contact_search_text(entity),
+    }
+
+
+def _note_columns(entity: Dict[str, Any]) -> Dict[str, Any]:
+    tags = list(entity.get("tags") or [])
+    return {
+        "created_at": entity.get("created_at"),
+        "updated_at": entity.get("updated_at"),
+        "text_key": (entity.get("text") or "").lower(),
+        "tags_key": ",".join(tags).lower(),
+        "search_text": " ".join([entity.get("text") or "", ",".join(tags)]).lower(),
+    }
+
+
+# kind -> (column name -> SQL type, indexed columns, sort key -> column, column extractor)
+_SCHEMAS: Dict[str, Tuple[Dict[str, str], Tuple[str, ...], Dict[str, str], Callable[[Dict[str, Any]], Dict[str, Any]]]] = {
+    "contacts": (
+        {"name_key": "TEXT", "email": "TEXT", "birthday": "TEXT", "search_text": "TEXT"},
+        ("name_key", "email", "birthday"),
+        {"name": "name_key"},
+        _contact_columns,
+    ),
+    "notes": (
+        {"created_at": "TEXT", "updated_at": "TEXT", "text_key": "TEXT", "tags_key": "TEXT", "search_text": "TEXT"},
+        ("created_at", "updated_at"),
+        {"created": "created_at", "updated": "updated_at", "text": "text_key", "tags": "tags_key"},
+        _note_columns,
+    ),
+}
+
+
+def sqlite_path(file_path: str) -> str:
+    return os.path.splitext(file_path)[0] + ".db"
+
+
+class SQLiteStorage(Storage):
+    supports_query = True
+
+    def __init__(self, file_path: str, kind: str) -> None:
+        if kind not in _SCHEMAS:
+            raise ValueError(f"Unknown record kind: {kind}")
+        self.file_path = sqlite_path(file_path)
+        self.kind = kind
+        self._columns, indexed, self._sort_columns, self._extract = _SCHEMAS[kind]
+        ensure_directory(os.path.dirname(self.file_path))
+        # Callers serialize access themselves (the async services hop threads
+        # but never run two calls at once), so the connection may move threads
+        self._conn = sqlite3.connect(self.file_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema(indexed)
+        self._data_version = self._read_data_version()
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    @property
+    def generation(self) -> int:
+        # data_version only moves when another connection commits
+        data_version = self._read_data_version()
+        if data_version != self._data_version:
+            self._data_version = data_version
+            self._generation += 1
+        return self._generation
+
+    def fingerprint(self) -> Optional[str]:
+        main = stat_signature(self.file_path)
+        if main is None:
+            return None
+        wal = stat_signature(self.file_path + "-wal") or (0, 0, 0)
+        return "sqlite:%d:%d:%d:" % main + "%d:%d:%d" % wal
+
+    def _create_schema(self, indexed: Tuple[str, ...]) -> None:
+        columns = "".join(f", {name} {sql_type}" for name, sql_type in self._columns.items())
+        with self._conn:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS records (id TEXT PRIMARY KEY, data TEXT NOT NULL{columns})")
+            for name in indexed:
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_records_{name} ON records ({name})")
+            if self.kind == "notes":
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS note_tags ("
+                    "note_id TEXT NOT NULL, tag TEXT NOT NULL, PRIMARY KEY (note_id, tag))"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_note_tags_tag ON note_tags (tag)")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    @contextmanager
+    def _write_transaction(self) -> Iterator[None]:
+        # BEGIN IMMEDIATE takes SQLite's write lock up front, so version checks
+        # and the writes that follow are atomic across processes; readers (WAL)
+        # are never blocked
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.rollback()
+            raise
+        self._conn.commit()
+
+    def _stamp(self, entity_id: str, entity: Dict[str, Any], expected_version: Optional[int] = None) -> None:
+        row = self._conn.execute(
+            f"SELECT json_extract(data, '$.{VERSION_FIELD}') FROM records WHERE id = ?", (entity_id,)
+        ).fetchone()
+        current = None if row is None else {VERSION_FIELD: row[0] or 0}
+        stamp_version(entity_id, current, entity, expected_version)
+
+    def _write(self, entity_id: str, entity: Dict[str, Any]) -> None:
+        values = self._extract(entity)
+        names = ["id", "data", *values.keys()]
+        placeholders = ", ".join("?" for _ in names)
+        updates = ", ".join(f"{n} = excluded.{n}" for n in names[1:])
+        self._conn.execute(
+            f"INSERT INTO records ({', '.join(names)}) VALUES ({placeholders}) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}",
+            [entity_id, json.dumps(entity, ensure_ascii=False), *values.values()],
+        )
+        if self.kind == "notes":
+            self._conn.execute("DELETE FROM note_tags WHERE note_id = ?", (entity_id,))
+            tags = {t.lower() for t in (entity.get("tags") or []) if t}
+            self._conn.executemany(
+                "INSERT INTO note_tags (note_id, tag) VALUES (?, ?)", [(entity_id, t) for t in tags]
+            )
+
+    def _remove(self, entity_id: str) -> int:
+        if self.kind == "notes":
+            self._conn.execute("DELETE FROM note_tags WHERE note_id = ?", (entity_id,))
+        return self._conn.execute("DELETE FROM records WHERE id = ?", (entity_id,)).rowcount
+
+    def load(self) -> Dict[str, Any]:
+        rows = self._conn.execute("SELECT id, data FROM records ORDER BY rowid")
+        return {entity_id: json.loads(data) for entity_id, data in rows}
+
+    def iter_items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for entity_id, data in self._conn.execute("SELECT id, data FROM records ORDER BY rowid"):
+            yield entity_id, json.loads(data)
+
+    def save(self, data: Dict[str, Any]) -> None:
+        with self._write_transaction():
+            self._conn.execute("DELETE FROM records")
+            if self.kind == "notes":
+                self._conn.execute("DELETE FROM note_tags")
+            for entity_id, entity in data.items():
+                self._write(entity_id, entity)
+        self._generation += 1
+
+    def get(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute("SELECT data FROM records WHERE id = ?", (entity_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def upsert(self, entity_id: str, entity: Dict[str, Any], expected_version: Optional[int] = None) -> None:
+        with self._write_transaction():
+            self._stamp(entity_id, entity, expected_version)
+            self._write(entity_id, entity)
+        self._generation += 1
+
+    def delete(self, entity_id: str) -> bool:
+        with self._write_transaction():
+            removed = self._remove(entity_id) > 0
+        if removed:
+            self._generation += 1
+        return removed
+
+    def apply(self, upserts: Dict[str, Dict[str, Any]], deletes: Iterable[str]) -> None:
+        with self._write_transaction():
+            for entity_id in deletes:
+                self._remove(entity_id)
+            for entity_id, entity in upserts.items():
+                self._stamp(entity_id, entity)
+                self._write(entity_id, entity)
+        self._generation += 1
+
+    def query(
+        self,
+        order_by: Optional[str] = None,
+        descending: bool = False,
+        contains: Optional[str] = None,
+        tags: Iterable[str] = (),
+        require: Iterable[str] = (),
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if contains:
+            clauses.append("instr(search_text, ?) > 0")
+            params.append(contains.lower())
+        for tag in {t.lower() for t in tags}:
+            clauses.append("EXISTS (SELECT 1 FROM note_tags WHERE note_id = records.id AND tag = ?)")
+            params.append(tag)
+        for column in require:
+            if column not in self._columns:
+                raise ValueError(f"Unknown column: {column}")
+            clauses.append(f"{column} IS NOT NULL AND {column} != ''")
+        sql = "SELECT data FROM records"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if order_by is not None:
+            column = self._sort_columns.get(order_by)
+            if column is None:
+                raise ValueError(f"Cannot sort {self.kind} by: {order_by}")
+            # rowid keeps ties in insertion order, matching a stable in-memory sort
+            sql += f" ORDER BY {column} {'DESC' if descending else 'ASC'}, rowid ASC"
+        if limit is not None or offset:
+            if offset < 0 or (limit is not None and limit < 0):
+                raise ValueError("limit and offset must be non-negative")
+            # LIMIT -1 means no limit in SQLite
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([-1 if limit is None else limit, offset])
+        return [json.loads(data) for (data,) in self._conn.execute(sql, params)]
@@ -0,0 +1,48 @@
+from __future__ import annotations
+import heapq
+import json
+import tempfile
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List
+
+from assistant.utils.iterables import chunked
+
+
+DEFAULT_RUN_SIZE = 100_000
+
+
+def _write_run(records: List[Dict[str, Any]]) -> IO[str]:
+    run = tempfile.TemporaryFile("w+", encoding="utf-8")
+    for record in records:
+        run.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        run.write("\n")
+    run.seek(0)
+    return run
+
+
+def _read_run(run: IO[str]) -> Iterator[Dict[str, Any]]:
+    for line in run:
+        yield json.loads(line)
+
+
+def external_sort(
+    records: Iterable[Dict[str, Any]],
+    key: Callable[[Dict[str, Any]], Any],
+    reverse: bool = False,
+    run_size: int = DEFAULT_RUN_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    # Sorts runs of run_size records in memory, spills them to temp files and
+    # k-way merges them, so at most one run is held in memory at a time.
+    # Stable, like list.sort(): heapq.merge prefers earlier runs on ties.
+    runs: List[IO[str]] = []
+    try:
+        for chunk in chunked(records, run_size):
+            chunk.sort(key=key, reverse=reverse)
+            if not runs and len(chunk) < run_size:
+                # Everything fit in a single run; no need to touch the disk
+                yield from chunk
+                return
+            runs.append(_write_run(chunk))
+        yield from heapq.merge(*(_read_run(r) for r in runs), key=key, reverse=reverse)
+    finally:
+        for run in runs:
+            run.close()
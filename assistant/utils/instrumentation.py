@@ -0,0 +1,147 @@
+from __future__ import annotations
+import functools
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional, TextIO, TypeVar, cast
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+COUNTERS = ("bytes_read", "bytes_written", "parse_seconds", "serialize_seconds", "fsyncs", "fsync_seconds")
+
+
+@dataclass
+class Timer:
+    count: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+class Metrics:
+    # Process-wide timings and I/O counters. Everything is gated on `enabled`,
+    # so instrumented code pays one attribute check when it is off.
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.trace_memory = False
+        self._trace: Optional[TextIO] = None
+        self.reset()
+
+    def reset(self) -> None:
+        self.timers: Dict[str, Timer] = {}
+        self.counters: Dict[str, float] = dict.fromkeys(COUNTERS, 0)
+        self.peak_memory = 0
+
+    def enable(self, trace_path: Optional[str] = None, trace_memory: bool = False) -> None:
+        self.enabled = True
+        if trace_path is not None and self._trace is None:
+            self._trace = open(trace_path, "a", encoding="utf-8")
+        if trace_memory and not self.trace_memory:
+            self.trace_memory = True
+            tracemalloc.start()
+
+    def disable(self) -> None:
+        # The trace file stays open, so `stats off` then `stats on` keeps tracing
+        self.enabled = False
+        if self.trace_memory:
+            self.trace_memory = False
+            tracemalloc.stop()
+
+    def close(self) -> None:
+        self.disable()
+        if self._trace is not None:
+            self._trace.close()
+            self._trace = None
+
+    def record(self, name: str, seconds: float) -> None:
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = Timer()
+        timer.count += 1
+        timer.seconds += seconds
+        if seconds > timer.max_seconds:
+            timer.max_seconds = seconds
+
+    def add(self, counter: str, amount: float = 1) -> None:
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    @contextmanager
+    def command(self, line: str) -> Iterator[None]:
+        # Times one REPL/script command; with a trace file, appends a JSON line
+        # with the storage/service calls and I/O it caused
+        timers_before = {name: (t.count, t.seconds) for name, t in self.timers.items()}
+        counters_before = dict(self.counters)
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            name = "command." + " ".join(line.split()[:2]).lower()
+            self.record(name, elapsed)
+            peak = None
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                self.peak_memory = max(self.peak_memory, peak)
+            if self._trace is not None:
+                calls = {}
+                for call, timer in self.timers.items():
+                    count, seconds = timers_before.get(call, (0, 0.0))
+                    if timer.count != count and call != name:
+                        calls[call] = {"count": timer.count - count, "seconds": round(timer.seconds - seconds, 6)}
+                record = {
+                    "command": line,
+                    "elapsed": round(elapsed, 6),
+                    "calls": calls,
+                    "io": {k: round(v - counters_before.get(k, 0), 6) for k, v in self.counters.items()},
+                    "peak_memory": peak,
+                }
+                self._trace.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self._trace.flush()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "timers": {
+                name: {"count": t.count, "seconds": t.seconds, "max_seconds": t.max_seconds}
+                for name, t in sorted(self.timers.items())
+            },
+            "counters": dict(self.counters),
+            "peak_memory": self.peak_memory if self.trace_memory else None,
+        }
+
+
+metrics = Metrics()
+
+
+def timed(name: str) -> Callable[[F], F]:
+    # Records the wall time of each call under `name` while metrics are enabled
+    def decorate(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not metrics.enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metrics.record(name, time.perf_counter() - started)
+
+        return cast(F, wrapper)
+
+    return decorate
+
+
+def fsync(fd: int) -> None:
+    # os.fsync, counted and timed while metrics are enabled
+    if not metrics.enabled:
+        os.fsync(fd)
+        return
+    started = time.perf_counter()
+    os.fsync(fd)
+    metrics.add("fsyncs")
+    metrics.add("fsync_seconds", time.perf_counter() - started)
@@ -1,23 +1,178 @@
 from __future__ import annotations
+import csv
+import gzip
 import json
+import marshal
 import os
 import tempfile
-from typing import Any, Dict
+import time
+import zlib
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+from assistant.utils.instrumentation import fsync, metrics
+
+try:
+    import orjson
+except ImportError:
+    # Optional: a much faster JSON encoder/decoder, used by every JSON codec when installed
+    orjson = None
+
+
+DEFAULT_CODEC = "json"
+ZLIB_LEVEL = 1  # every save rewrites the whole file: favour speed (level 6 is ~3x slower for ~20% less)
+# Marshal's format may change between Python versions, so its files carry the version
+MARSHAL_MAGIC = b"\x00ASTMARSHAL" + bytes([marshal.version])
+GZIP_MAGIC = b"\x1f\x8b"
+TAIL_BLOCK = 64 * 1024  # bytes read at a time when looking for the last complete line
+
+
+def _dumps_pretty(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def dumps_compact(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads_json(payload: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def _loads_marshal(payload: bytes) -> Any:
+    if not payload.startswith(MARSHAL_MAGIC):
+        # Only the Python that wrote it can read it back
+        found = payload[len(MARSHAL_MAGIC) - 1] if len(payload) >= len(MARSHAL_MAGIC) else "unknown"
+        raise ValueError(
+            f"written with marshal version {found}, this Python has {marshal.version}. Run "
+            "`python -m assistant convert --from BACKEND --to BACKEND --codec compact` "
+            "with the Python that wrote it, then retry"
+        )
+    return marshal.loads(payload[len(MARSHAL_MAGIC):])
+
+
+class Codec:
+    # Whole-file encoding of a store: encode() -> bytes, decode(bytes) -> data
+    def __init__(self, name: str, encode: Callable[[Any], bytes], decode: Callable[[bytes], Any]) -> None:
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+
+
+CODECS: Dict[str, Codec] = {
+    codec.name: codec
+    for codec in (
+        # Human-readable, and the format every store had before codecs existed
+        Codec("json", _dumps_pretty, loads_json),
+        Codec("compact", dumps_compact, loads_json),
+        Codec("zlib", lambda data: zlib.compress(dumps_compact(data), ZLIB_LEVEL), lambda p: loads_json(zlib.decompress(p))),
+        Codec("gzip", lambda data: gzip.compress(dumps_compact(data), ZLIB_LEVEL, mtime=0), lambda p: loads_json(gzip.decompress(p))),
+        # Fastest to load, but only readable by a Python with the same marshal
+        # version: a store in it has to be converted before upgrading Python
+        Codec("marshal", lambda data: MARSHAL_MAGIC + marshal.dumps(data), _loads_marshal),
+    )
+}
+
+
+def get_codec(name: str) -> Codec:
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Unknown codec: {name}. Choose one of: {', '.join(CODECS)}")
+    return codec
+
+
+def detect_codec(payload: bytes) -> Codec:
+    # Every codec is recognizable by its first bytes, so loading needs no configuration
+    if payload.startswith(MARSHAL_MAGIC[:-1]):
+        return CODECS["marshal"]
+    if payload.startswith(GZIP_MAGIC):
+        return CODECS["gzip"]
+    if len(payload) >= 2 and payload[0] == 0x78 and (payload[0] << 8 | payload[1]) % 31 == 0:
+        return CODECS["zlib"]
+    return CODECS["json"]
+
+
+def decode(payload: bytes) -> Any:
+    return detect_codec(payload).decode(payload)
 
 
 def ensure_directory(path: str) -> None:
     os.makedirs(path, exist_ok=True)
 
 
-def atomic_write_json(file_path: str, data: Any) -> None:
+def stat_signature(file_path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def atomic_write_json(file_path: str, data: Any, codec: str = DEFAULT_CODEC) -> None:
+    # Named for its original (and default) format; any codec in CODECS works
+    encode = get_codec(codec).encode
+    started = time.perf_counter()
+    payload = encode(data)
+    if metrics.enabled:
+        metrics.add("serialize_seconds", time.perf_counter() - started)
+    atomic_write_bytes(file_path, payload)
+
+
+def read_data(file_path: str) -> Any:
+    # Whole-file read of anything written by atomic_write_json, whatever the codec
+    with open(file_path, "rb") as f:
+        payload = f.read()
+    started = time.perf_counter()
+    try:
+        data = decode(payload)
+    except (ValueError, TypeError, EOFError, OSError, zlib.error) as e:
+        raise ValueError(f"Cannot read {file_path}: {e}") from e
+    if metrics.enabled:
+        metrics.add("bytes_read", len(payload))
+        metrics.add("parse_seconds", time.perf_counter() - started)
+    return data
+
+
+def truncate_torn_tail(f: IO[bytes]) -> int:
+    # For append-only line files, under the writer lock (f opened "a+b"): drops
+    # a partial last line left by a writer that died mid-append, so the next
+    # line is not glued onto it. Returns the size, i.e. where the next append lands
+    size = f.seek(0, os.SEEK_END)
+    if size == 0:
+        return 0
+    f.seek(size - 1)
+    if f.read(1) == b"\n":
+        return size
+    end = size
+    while end > 0:
+        start = max(0, end - TAIL_BLOCK)
+        f.seek(start)
+        newline = f.read(end - start).rfind(b"\n")
+        if newline >= 0:
+            end = start + newline + 1
+            break
+        end = start
+    f.truncate(end)
+    f.seek(end)
+    return end
+
+
+def atomic_write_bytes(file_path: str, payload: bytes) -> None:
     directory = os.path.dirname(file_path)
     ensure_directory(directory)
     fd, temp_path = tempfile.mkstemp(prefix=".tmp_", dir=directory)
     try:
-        with os.fdopen(fd, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
             f.flush()
-            os.fsync(f.fileno())
+            if metrics.enabled:
+                metrics.add("bytes_written", len(payload))
+            fsync(f.fileno())
         os.replace(temp_path, file_path)
     finally:
         if os.path.exists(temp_path):
@@ -25,3 +180,57 @@ def atomic_write_json(file_path: str, data: Any) -> None:
                 os.remove(temp_path)
             except OSError:
                 pass
+
+
+# (line number in the file, record or the reason it could not be parsed)
+NumberedRecord = Tuple[int, Union[Dict[str, Any], ValueError]]
+
+
+def iter_records(file_path: str) -> Iterator[NumberedRecord]:
+    # Streams rows from a .csv or .jsonl file with their line numbers, so
+    # failures can be reported against the file; unparseable rows are yielded
+    # as ValueError instances so callers can report them without stopping the import
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".csv":
+        with open(file_path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                # line_num is the row's last line (quoted fields may span several)
+                yield reader.line_num, {k.strip(): v for k, v in row.items() if k is not None}
+        return
+    if ext in (".jsonl", ".ndjson"):
+        with open(file_path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield number, ValueError(f"Invalid JSON: {e}")
+                    continue
+                if not isinstance(record, dict):
+                    yield number, ValueError("Row is not a JSON object")
+                    continue
+                yield number, record
+        return
+    raise ValueError(f"Unsupported file type: {ext or file_path}. Use .csv or .jsonl")
+
+
+def write_records(records: Iterable[Dict[str, Any]], out: TextIO, fmt: str, fields: List[str]) -> int:
+    # List values (phones, tags) are comma-joined in CSV so the file can be re-imported
+    count = 0
+    if fmt == "jsonl":
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+            out.write("\n")
+            count += 1
+        return count
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for record in records:
+            row = {k: ",".join(v) if isinstance(v, list) else v for k, v in record.items()}
+            writer.writerow(row)
+            count += 1
+        return count
+    raise ValueError(f"Unsupported export format: {fmt}. Use csv or jsonl")
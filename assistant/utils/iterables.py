@@ -0,0 +1,22 @@
+from __future__ import annotations
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def page(items: Iterable[T], offset: int = 0, limit: Optional[int] = None) -> Iterator[T]:
+    # Lazily skips `offset` items and yields at most `limit` (all when None)
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError("limit and offset must be non-negative")
+    return islice(items, offset, None if limit is None else offset + limit)
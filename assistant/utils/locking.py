@@ -0,0 +1,52 @@
+from __future__ import annotations
+import threading
+from types import TracebackType
+from typing import IO, Optional, Type
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no advisory locks; writers are only serialized within the process
+    fcntl = None
+
+
+class FileLock:
+    # Exclusive advisory lock on a sidecar file, held by writers only: readers
+    # never take it because every write lands via an atomic rename (or, for
+    # the journal, whole appended lines). Reentrant, and also serializes
+    # threads of this process.
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file: Optional[IO[bytes]] = None
+
+    def __enter__(self) -> "FileLock":
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.path, "a+b")
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            # Closing the file releases the flock
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
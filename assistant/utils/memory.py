@@ -0,0 +1,33 @@
+from __future__ import annotations
+import gc
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+
+_depth = 0
+_was_enabled = False
+
+
+@contextmanager
+def gc_paused() -> Iterator[None]:
+    # Materializing hundreds of thousands of small acyclic objects (result dicts,
+    # views) triggers repeated full collections that dominate the runtime; pause
+    # the cyclic GC for the duration. Reentrant. gc.disable() is process-wide,
+    # so this only pauses in a single-threaded process (the CLI); with other
+    # threads running (serve's connection threads, the async services'
+    # executors) it would turn collection off under them too, and is a no-op
+    global _depth, _was_enabled
+    if _depth == 0:
+        if threading.active_count() > 1:
+            yield
+            return
+        _was_enabled = gc.isenabled()
+        gc.disable()
+    _depth += 1
+    try:
+        yield
+    finally:
+        _depth -= 1
+        if _depth == 0 and _was_enabled:
+            gc.enable()
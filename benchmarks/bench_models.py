@@ -0,0 +1,107 @@
+# Listing hot path: model round trip vs. read-only views.
+#
+#   python -m benchmarks.bench_models [--records 1000000]
+from __future__ import annotations
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from assistant.models.contact import Contact, ContactView
+from assistant.utils.memory import gc_paused
+
+
+@dataclass
+class _PlainContact:
+    # Contact's layout without __slots__, for the per-instance size comparison
+    id: str
+    name: str
+    address: Optional[str] = None
+    phones: List[str] = field(default_factory=list)
+    email: Optional[str] = None
+    birthday: Optional[str] = None
+
+
+def make_records(count: int) -> List[Dict]:
+    return [
+        {
+            "id": f"{i:08x}-0000-4000-8000-000000000000",
+            "name": f"Contact {count - i}",
+            "address": f"{i % 997} Main St",
+            "phones": [f"+1555{i % 10_000_000:07d}"],
+            "email": f"user{i}@example.com",
+            "birthday": f"19{50 + i % 50}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+        }
+        for i in range(count)
+    ]
+
+
+def list_via_models(records: List[Dict]) -> List[Dict]:
+    contacts = [Contact.from_dict(v) for v in records]
+    contacts.sort(key=lambda c: c.name.lower())
+    return [c.to_dict() for c in contacts]
+
+
+def list_via_views(records: List[Dict]) -> List[Dict]:
+    # Mirrors ContactsService.list_contacts (which also pauses the GC, see measure())
+    contacts = [ContactView(v) for v in records]
+    contacts.sort(key=lambda c: c.name.lower())
+    return [c.to_dict() for c in contacts]
+
+
+def measure(fn: Callable[[List[Dict]], List[Dict]], records: List[Dict], paused: bool) -> Dict[str, float]:
+    # Both paths are measured under the same GC setting, so the comparison is
+    # models vs. views and gc_paused's share is reported on its own
+    def run() -> None:
+        if paused:
+            with gc_paused():
+                fn(records)
+        else:
+            fn(records)
+
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Timing without tracemalloc overhead
+    gc.collect()
+    started = time.perf_counter()
+    run()
+    return {"seconds": time.perf_counter() - started, "traced_seconds": elapsed, "peak_mb": peak / 1e6}
+
+
+def instance_size(obj: object) -> int:
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    records = make_records(args.records)
+    sample = records[0]
+    print(f"records: {args.records}")
+    print(f"instance bytes: plain dataclass={instance_size(_PlainContact(**sample))} "
+          f"slotted Contact={instance_size(Contact(**sample))} "
+          f"ContactView={instance_size(ContactView(sample))}")
+    for setting, paused in (("gc on", False), ("gc paused", True)):
+        models = measure(list_via_models, records, paused)
+        views = measure(list_via_views, records, paused)
+        for label, result in (("from_dict/normalize/to_dict", models), ("ContactView", views)):
+            print(f"{setting:9} {label:28} {result['seconds']:.2f}s  peak {result['peak_mb']:.0f} MB")
+        print(f"{setting:9} speedup {models['seconds'] / views['seconds']:.2f}x, "
+              f"peak memory {views['peak_mb'] / models['peak_mb']:.0%} of model path")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Deterministic synthetic contacts and notes for the benchmarks: the same
+# (count, seed) always produces the same records, ids and timestamps.
+from __future__ import annotations
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from assistant.models.contact import SCHEMA_FIELD, SCHEMA_VERSION
+from assistant.utils.io import atomic_write_json
+
+
+SIZES: Dict[str, int] = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+FIRST_NAMES = [
+    "Anna", "Boris", "Carla", "Dmytro", "Elena", "Farid", "Greta", "Hugo", "Iryna", "Jonas",
+    "Katya", "Liam", "Maria", "Nikolai", "Olga", "Pavel", "Quinn", "Roman", "Sofia", "Taras",
+]
+LAST_NAMES = [
+    "Adams", "Bondar", "Chen", "Dubois", "Evans", "Fischer", "Garcia", "Horvat", "Ivanova", "Jensen",
+    "Kovalenko", "Lopez", "Melnyk", "Novak", "Olsen", "Petrenko", "Rossi", "Schmidt", "Tkachenko", "Weber",
+]
+STREETS = ["Main St", "Oak Ave", "Khreshchatyk", "Park Rd", "Baker St", "Shevchenka Blvd", "Elm St", "Lake Dr"]
+WORDS = [
+    "meeting", "project", "budget", "review", "call", "deadline", "invoice", "draft", "release", "plan",
+    "lunch", "travel", "report", "design", "client", "follow", "update", "backup", "server", "idea",
+    "alpha", "beta", "gamma", "delta", "sprint", "retro", "hiring", "contract", "launch", "notes",
+]
+TAGS = ["work", "home", "urgent", "ideas", "finance", "travel", "health", "family", "books", "todo"]
+
+_EPOCH = datetime(2020, 1, 1)
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def generate_contacts(count: int, seed: int = 0) -> Dict[str, Dict]:
+    rng = random.Random(seed)
+    contacts: Dict[str, Dict] = {}
+    for i in range(count):
+        contact_id = _uuid(rng)
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        birthday = None
+        if rng.random() < 0.7:
+            birthday = f"{rng.randint(1950, 2005)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        contacts[contact_id] = {
+            "id": contact_id,
+            "name": f"{first} {last}",
+            "address": f"{rng.randint(1, 999)} {rng.choice(STREETS)}" if rng.random() < 0.5 else None,
+            "phones": [f"+380{rng.randint(0, 999_999_999):09d}" for _ in range(rng.randint(0, 2))],
+            "email": f"{first.lower()}.{last.lower()}{i}@example.com" if rng.random() < 0.8 else None,
+            "birthday": birthday,
+            # Stamped like records the assistant writes
+            SCHEMA_FIELD: SCHEMA_VERSION,
+        }
+    return contacts
+
+
+def generate_notes(count: int, seed: int = 0) -> Dict[str, Dict]:
+    rng = random.Random(seed + 1)
+    notes: Dict[str, Dict] = {}
+    for i in range(count):
+        note_id = _uuid(rng)
+        created = _EPOCH + timedelta(seconds=i * 60 + rng.randint(0, 59))
+        updated = created + timedelta(seconds=rng.randint(0, 90 * 86400))
+        notes[note_id] = {
+            "id": note_id,
+            "text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 20))),
+            # Skewed so a few tags are common and most are rare, like real tagging
+            "tags": sorted({TAGS[min(int(rng.expovariate(0.5)), len(TAGS) - 1)] for _ in range(rng.randint(0, 3))}),
+            "created_at": created.isoformat(timespec="seconds") + "Z",
+            "updated_at": updated.isoformat(timespec="seconds") + "Z",
+        }
+    return notes
+
+
+def write_dataset(directory: str, count: int, seed: int = 0) -> List[str]:
+    # contacts.json and notes.json in JSONStorage layout; returns their paths
+    paths = []
+    for name, records in (("contacts.json", generate_contacts(count, seed)), ("notes.json", generate_notes(count, seed))):
+        path = os.path.join(directory, name)
+        atomic_write_json(path, records)
+        paths.append(path)
+    return paths
@@ -0,0 +1,199 @@
+# Benchmark suite: times the ContactsService / NotesService operations, the
+# JSONStorage load/save paths and the store codecs on generated data
+# (benchmarks.data), writes the results as JSON and optionally compares them
+# against a saved baseline.
+#
+#   python -m benchmarks.run [--sizes 1k,100k,1m] [--backend json|journal|sqlite|sharded|jsonl]
+#                            [--output results.json] [--baseline baseline.json] [--threshold 1.25]
+#
+# Save a results file as the baseline before a change (or upgrade), then run
+# again with --baseline; the exit status is 1 when an operation regressed.
+from __future__ import annotations
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from itertools import chain
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from assistant.services.contacts_service import ContactsService
+from assistant.services.notes_service import NotesService
+from assistant.storage.factory import BACKENDS, convert_storage, open_storage
+from assistant.storage.json_store import JSONStorage
+from assistant.utils.io import CODECS, read_data
+from benchmarks.data import SIZES, write_dataset
+
+
+DEFAULT_REPEAT = 5
+TIME_BUDGET = 2.0  # seconds per operation; slow operations run fewer times (at least once)
+NOISE_FLOOR = 0.001  # seconds; slowdowns smaller than this are not reported as regressions
+BIRTHDAYS_TODAY = date(2024, 6, 1)
+
+Timing = Dict[str, float]
+Results = Dict[str, Dict[str, Timing]]
+
+
+def time_op(fn: Callable[[], object], repeat: int = DEFAULT_REPEAT, budget: float = TIME_BUDGET) -> Timing:
+    runs: List[float] = []
+    deadline = time.perf_counter() + budget
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - started)
+        if time.perf_counter() > deadline:
+            break
+    return {"min": min(runs), "median": statistics.median(runs), "runs": len(runs)}
+
+
+def _cycle(ids: List[str]) -> Iterator[str]:
+    while True:
+        yield from ids
+
+
+def bench_json_storage(contacts_path: str, notes_path: str, repeat: int) -> Iterator[Tuple[str, Timing]]:
+    for kind, path in (("contacts", contacts_path), ("notes", notes_path)):
+        yield f"jsonstorage.{kind}.load", time_op(lambda: JSONStorage(path).load(), repeat)
+        storage = JSONStorage(path)
+        data = storage.load()
+        yield f"jsonstorage.{kind}.load_cached", time_op(storage.load, repeat)
+        yield f"jsonstorage.{kind}.save", time_op(lambda: storage.save(data), repeat)
+
+
+def bench_codecs(contacts_path: str, notes_path: str, repeat: int) -> Iterator[Tuple[str, Timing]]:
+    # Encode/decode time per store codec; "bytes" is the encoded size
+    for kind, path in (("contacts", contacts_path), ("notes", notes_path)):
+        data = read_data(path)
+        for name, codec in CODECS.items():
+            payload = codec.encode(data)
+            yield f"codec.{name}.{kind}.encode", dict(time_op(lambda: codec.encode(data), repeat), bytes=len(payload))
+            yield f"codec.{name}.{kind}.decode", dict(time_op(lambda: codec.decode(payload), repeat), bytes=len(payload))
+
+
+def bench_contacts(service: ContactsService, repeat: int) -> Iterator[Tuple[str, Timing]]:
+    # Reads first (the first one also builds the in-memory indexes), then writes
+    yield "contacts.first_search", time_op(lambda: service.search_contacts("anna"), 1)
+    yield "contacts.list", time_op(service.list_contacts, repeat)
+    yield "contacts.list_page", time_op(lambda: service.list_contacts(limit=20, offset=100), repeat)
+    yield "contacts.search", time_op(lambda: service.search_contacts("anna"), repeat)
+    yield "contacts.search_rare", time_op(lambda: service.search_contacts("melnyk1"), repeat)
+    yield "contacts.first_fuzzy", time_op(lambda: service.fuzzy_search("dmitro kovalenko"), 1)
+    yield "contacts.fuzzy", time_op(lambda: service.fuzzy_search("dmitro kovalenko"), repeat)
+    phone = next((c["phones"][0] for c in service.list_contacts(limit=50) if c["phones"]), "+380000000000")
+    yield "contacts.find_by_phone", time_op(lambda: service.find_by_phone(phone), repeat)
+    yield "contacts.birthdays_in", time_op(lambda: service.birthdays_in(30, today=BIRTHDAYS_TODAY), repeat)
+    ids = _cycle([c["id"] for c in service.list_contacts(limit=repeat * 2)])
+    yield "contacts.add", time_op(lambda: service.add_contact("Bench Contact", phones=["+380991234567"]), repeat)
+    yield "contacts.edit", time_op(lambda: service.edit_contact(next(ids), address="1 Bench St"), repeat)
+    yield "contacts.delete", time_op(lambda: service.delete_contact(next(ids)), repeat)
+
+
+def bench_notes(service: NotesService, repeat: int) -> Iterator[Tuple[str, Timing]]:
+    yield "notes.first_search", time_op(lambda: service.search_notes("budget"), 1)
+    yield "notes.list", time_op(service.list_notes, repeat)
+    yield "notes.list_updated_top20", time_op(lambda: service.list_notes(sort_by="updated", limit=20), repeat)
+    yield "notes.search", time_op(lambda: service.search_notes("budget review"), repeat)
+    yield "notes.search_prefix", time_op(lambda: service.search_notes("rel"), repeat)
+    yield "notes.search_by_tags", time_op(lambda: service.search_by_tags(["work"]), repeat)
+    yield "notes.search_by_tags_and", time_op(lambda: service.search_by_tags(["work", "urgent"]), repeat)
+    yield "notes.tag_counts", time_op(service.tag_counts, repeat)
+    ids = _cycle([n["id"] for n in service.list_notes(limit=repeat * 2)])
+    yield "notes.add", time_op(lambda: service.add_note("bench note text", tags_text="work,bench"), repeat)
+    yield "notes.edit", time_op(lambda: service.edit_note(next(ids), text="edited bench note"), repeat)
+    yield "notes.delete", time_op(lambda: service.delete_note(next(ids)), repeat)
+
+
+def run_size(label: str, count: int, backend: str, seed: int, repeat: int) -> Dict[str, Timing]:
+    results: Dict[str, Timing] = {}
+    with tempfile.TemporaryDirectory(prefix="assistant-bench-") as directory:
+        contacts_path, notes_path = write_dataset(directory, count, seed)
+        benches = list(chain(bench_json_storage(contacts_path, notes_path, repeat), bench_codecs(contacts_path, notes_path, repeat)))
+        if backend != "json":
+            convert_storage(contacts_path, "json", backend, kind="contacts")
+            convert_storage(notes_path, "json", backend, kind="notes")
+        contacts = ContactsService(open_storage(contacts_path, backend, kind="contacts"))
+        notes = NotesService(open_storage(notes_path, backend, kind="notes"))
+        try:
+            for name, timing in chain(benches, bench_contacts(contacts, repeat), bench_notes(notes, repeat)):
+                results[name] = timing
+                size = f", {timing['bytes'] / 1e6:.2f} MB" if "bytes" in timing else ""
+                print(f"{label:>5} {name:32} {timing['median'] * 1000:12.3f} ms  (min {timing['min'] * 1000:.3f}, {timing['runs']} runs{size})")
+        finally:
+            contacts.close()
+            notes.close()
+    return results
+
+
+def compare(results: Results, baseline: Results, threshold: float) -> List[Tuple[str, str, float, float]]:
+    # (size, operation, baseline median, new median) for each regression beyond threshold
+    regressions = []
+    for size, timings in results.items():
+        for name, timing in timings.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                continue
+            new_median, old_median = timing["median"], base["median"]
+            if new_median > old_median * threshold and new_median - old_median > NOISE_FLOOR:
+                regressions.append((size, name, old_median, new_median))
+    return regressions
+
+
+def parse_sizes(text: str) -> List[Tuple[str, int]]:
+    sizes = []
+    for label in (s.strip().lower() for s in text.split(",") if s.strip()):
+        if label in SIZES:
+            sizes.append((label, SIZES[label]))
+        elif label.isdigit():
+            sizes.append((label, int(label)))
+        else:
+            raise argparse.ArgumentTypeError(f"unknown size {label!r}; use {', '.join(SIZES)} or a number")
+    return sizes
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    parser.add_argument("--sizes", type=parse_sizes, default=parse_sizes("1k,100k"), help="e.g. 1k,100k,1m")
+    parser.add_argument("--backend", choices=BACKENDS, default="json")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    results: Results = {}
+    for label, count in args.sizes:
+        results[label] = run_size(label, count, args.backend, args.seed, args.repeat)
+    payload = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "backend": args.backend,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.baseline is None:
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("meta", {}).get("backend") != args.backend:
+        print(f"Warning: baseline was recorded with backend {baseline.get('meta', {}).get('backend')}")
+    regressions = compare(results, baseline.get("results", {}), args.threshold)
+    for size, name, old, new in regressions:
+        print(f"REGRESSION {size:>5} {name:32} {old * 1000:.3f} ms -> {new * 1000:.3f} ms ({new / old:.2f}x)")
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.2f}x against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
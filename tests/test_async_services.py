@@ -0,0 +1,247 @@
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+import unittest
+import uuid
+from contextlib import ExitStack, contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterator, List
+from unittest import mock
+
+from assistant.models.contact import SCHEMA_FIELD, is_current
+from assistant.services.async_services import ITER_CHUNK_SIZE, AsyncContactsService, AsyncNotesService
+from assistant.services.contacts_service import ContactsService
+from assistant.services.notes_service import NotesService
+from assistant.storage.factory import open_storage
+
+
+BACKENDS = ("json", "journal", "sqlite", "sharded", "jsonl")
+EPOCH = datetime(2026, 1, 1)
+
+
+class _Clock:
+    # Stands in for datetime in the note modules: each reading is one second
+    # after the last, so every run of a scenario gets the same timestamps
+    def __init__(self) -> None:
+        self.ticks = 0
+
+    def utcnow(self) -> datetime:
+        self.ticks += 1
+        return EPOCH + timedelta(seconds=self.ticks)
+
+
+class _SyncAsAsync:
+    # A sync service behind the async services' interface, so one scenario
+    # drives both
+    def __init__(self, service: Any) -> None:
+        self.service = service
+
+    def __getattr__(self, name: str) -> Any:
+        method = getattr(self.service, name)
+        if name.startswith("iter_"):
+
+            async def iterate(*args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+                for item in method(*args, **kwargs):
+                    yield item
+
+            return iterate
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return method(*args, **kwargs)
+
+        return call
+
+
+class AsyncServicesTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+
+    def contacts(self, backend: str, name: str = "contacts") -> ContactsService:
+        return ContactsService(open_storage(os.path.join(self._tmp.name, name + ".json"), backend, kind="contacts"))
+
+    def notes(self, backend: str, name: str = "notes") -> NotesService:
+        return NotesService(open_storage(os.path.join(self._tmp.name, name + ".json"), backend, kind="notes"))
+
+
+class ParityTest(AsyncServicesTestCase):
+    # The async services return exactly what the sync ones do for the same
+    # calls: each scenario runs once per API with the same clock and ids and
+    # the two logs of results must match
+
+    @contextmanager
+    def deterministic(self) -> Iterator[None]:
+        counter = itertools.count(1)
+        clock = _Clock()
+        with ExitStack() as stack:
+            for module in ("assistant.models.contact", "assistant.models.note"):
+                stack.enter_context(mock.patch(module + ".uuid4", lambda: uuid.UUID(int=next(counter))))
+            for module in ("assistant.models.note", "assistant.services.notes_service"):
+                stack.enter_context(mock.patch(module + ".datetime", clock))
+            yield
+
+    async def contacts_scenario(self, contacts: Any) -> List[Any]:
+        log: List[Any] = []
+        for i in range(30):
+            log.append(
+                await contacts.add_contact(
+                    f"Anna {i:02d}" if i % 2 else f"Boris {i:02d}",
+                    phones=[f"+38099{i:07d}"],
+                    email=f"user{i}@example.com",
+                    birthday=f"199{i % 10}-01-{1 + i % 28:02d}",
+                )
+            )
+        first, second = log[0]["id"], log[1]["id"]
+        log.append(await contacts.list_contacts())
+        log.append(await contacts.list_contacts(limit=5, offset=10))
+        log.append(await contacts.search_contacts("anna 1"))
+        log.append(await contacts.fuzzy_search("Ana 11"))
+        log.append(await contacts.fuzzy_search("boris", limit=3, offset=2))
+        log.append(await contacts.find_by_phone("+380990000007"))
+        log.append(await contacts.find_by_email("user3@example.com"))
+        log.append(await contacts.birthdays_in(10, today=date(2026, 1, 5)))
+        log.append(await contacts.edit_contact(first, name="Anna Edited", address="Main St 1"))
+        log.append(await contacts.edit_contact(second, phones="+380990000099"))
+        log.append(await contacts.edit_contact("missing", name="Nobody"))
+        log.append(await contacts.find_by_phone("+380990000099"))
+        log.append(await contacts.fuzzy_search("Anna Edited"))
+        log.append(await contacts.delete_contact(second))
+        log.append(await contacts.delete_contact(second))
+        log.append(await contacts.list_contacts())
+        log.append([c async for c in contacts.iter_contacts(sort=True)])
+        return log
+
+    async def notes_scenario(self, notes: Any) -> List[Any]:
+        log: List[Any] = []
+        for i in range(20):
+            log.append(await notes.add_note(f"note {i} about work", tags_text="work,x" if i % 3 else "home"))
+        first, second = log[0]["id"], log[1]["id"]
+        for sort_by in ("created", "updated", "text", "tags"):
+            log.append(await notes.list_notes(sort_by=sort_by))
+        log.append(await notes.list_notes(limit=4, offset=3))
+        log.append(await notes.tag_counts())
+        log.append(await notes.search_by_tags(["work"]))
+        log.append(await notes.search_by_tags(["work", "x"], limit=2, offset=1))
+        log.append(await notes.search_notes("note 1"))
+        log.append(await notes.edit_note(first, text="first note, edited"))
+        log.append(await notes.edit_note(second, tags="home,later"))
+        log.append(await notes.edit_note("missing", text="nothing"))
+        log.append(await notes.list_notes(sort_by="updated"))
+        log.append(await notes.tag_counts())
+        log.append(await notes.delete_note(second))
+        log.append(await notes.delete_note(second))
+        log.append(await notes.list_notes())
+        log.append([n async for n in notes.iter_notes(sort_by="created")])
+        return log
+
+    async def test_contacts(self) -> None:
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                with self.deterministic():
+                    sync = self.contacts(backend, "sync-" + backend)
+                    expected = await self.contacts_scenario(_SyncAsAsync(sync))
+                    sync.close()
+                with self.deterministic():
+                    async with AsyncContactsService(self.contacts(backend, "async-" + backend)) as contacts:
+                        self.assertEqual(await self.contacts_scenario(contacts), expected)
+
+    async def test_notes(self) -> None:
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                with self.deterministic():
+                    sync = self.notes(backend, "sync-" + backend)
+                    expected = await self.notes_scenario(_SyncAsAsync(sync))
+                    sync.close()
+                with self.deterministic():
+                    async with AsyncNotesService(self.notes(backend, "async-" + backend)) as notes:
+                        self.assertEqual(await self.notes_scenario(notes), expected)
+
+
+class CoalescingTest(AsyncServicesTestCase):
+    def counting(self, service: ContactsService) -> List[int]:
+        # Wraps search_contacts to count executions; slow enough that concurrent calls overlap
+        calls = [0]
+        search = service.search_contacts
+
+        def wrapper(*args: Any, **kwargs: Any) -> List[Dict]:
+            calls[0] += 1
+            time.sleep(0.05)
+            return search(*args, **kwargs)
+
+        service.search_contacts = wrapper  # type: ignore[method-assign]
+        return calls
+
+    async def test_identical_reads_share_one_execution(self) -> None:
+        service = self.contacts("json")
+        calls = self.counting(service)
+        async with AsyncContactsService(service) as contacts:
+            for i in range(10):
+                await contacts.add_contact(f"Anna {i}")
+            results = await asyncio.gather(*[contacts.search_contacts("anna") for _ in range(8)])
+            self.assertEqual(calls[0], 1)
+            self.assertTrue(all(r == results[0] for r in results))
+            # Each caller gets its own objects
+            self.assertIsNot(results[0], results[1])
+            self.assertEqual(len(results[0]), 10)
+
+    async def test_different_reads_are_not_shared(self) -> None:
+        service = self.contacts("json")
+        calls = self.counting(service)
+        async with AsyncContactsService(service) as contacts:
+            await asyncio.gather(contacts.search_contacts("a"), contacts.search_contacts("b"))
+            self.assertEqual(calls[0], 2)
+
+    async def test_write_ends_sharing(self) -> None:
+        service = self.contacts("json")
+        calls = self.counting(service)
+        async with AsyncContactsService(service) as contacts:
+            await contacts.add_contact("Anna 0")
+            before = asyncio.ensure_future(contacts.search_contacts("anna"))
+            await asyncio.sleep(0)
+            write = asyncio.ensure_future(contacts.add_contact("Anna 1"))
+            after = asyncio.ensure_future(contacts.search_contacts("anna"))
+            first, _, second = await asyncio.gather(before, write, after)
+            self.assertEqual(calls[0], 2)
+            self.assertEqual((len(first), len(second)), (1, 2))
+
+
+class IterateTest(AsyncServicesTestCase):
+    async def test_writes_during_iteration(self) -> None:
+        # Adds between chunks must not break a running iteration. Snapshot
+        # backends do not yield the late record; sqlite streams from a cursor
+        # and may
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                async with AsyncContactsService(self.contacts(backend, backend)) as contacts:
+                    await contacts.add_contacts({"name": f"Anna {i}"} for i in range(ITER_CHUNK_SIZE + 10))
+                    seen = 0
+                    async for _ in contacts.iter_contacts():
+                        if seen == 0:
+                            await contacts.add_contact("Late")
+                        seen += 1
+                    late = (0, 1) if backend == "sqlite" else (0,)
+                    self.assertIn(seen - ITER_CHUNK_SIZE - 10, late)
+                    self.assertEqual(len(await contacts.list_contacts()), ITER_CHUNK_SIZE + 11)
+
+
+
+class MigrateTest(AsyncServicesTestCase):
+    async def test_migrate_rewrites_legacy_records(self) -> None:
+        service = self.contacts("json")
+        # Unstamped records, as written before the schema field existed
+        service.storage.upsert("legacy-1", {"id": "legacy-1", "name": "Anna", "phones": ["+38 (099) 000-0001"]})
+        service.storage.upsert("legacy-2", {"id": "legacy-2", "name": " ", "phones": []})
+        async with AsyncContactsService(service) as contacts:
+            checked = await contacts.migrate(workers=1, check=True)
+            self.assertEqual((checked.succeeded, checked.failed), (1, 1))
+            self.assertNotIn(SCHEMA_FIELD, service.storage.get("legacy-1"))
+            report = await contacts.migrate(workers=1)
+            self.assertEqual((report.succeeded, report.failed), (1, 1))
+            self.assertTrue(is_current(service.storage.get("legacy-1")))
+            self.assertFalse(is_current(service.storage.get("legacy-2")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from typing import Tuple
+
+from assistant.storage.journal_store import JournalStorage
+
+
+class JournalStorageTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = os.path.join(self._tmp.name, "contacts.json")
+
+    def reopen(self, snapshot: bytes, journal: bytes) -> JournalStorage:
+        # A fresh store over the files a writer that died left behind
+        directory = tempfile.mkdtemp(dir=self._tmp.name)
+        storage = JournalStorage(os.path.join(directory, "contacts.json"))
+        with open(storage.file_path, "wb") as f:
+            f.write(snapshot)
+        with open(storage.journal_path, "wb") as f:
+            f.write(journal)
+        return JournalStorage(storage.file_path)
+
+    def written(self, storage: JournalStorage) -> Tuple[bytes, bytes]:
+        with open(storage.file_path, "rb") as f:
+            snapshot = f.read()
+        with open(storage.journal_path, "rb") as f:
+            return snapshot, f.read()
+
+
+class TornTailTest(JournalStorageTestCase):
+    def test_torn_tail_is_dropped_before_the_next_append(self) -> None:
+        storage = JournalStorage(self.path)
+        storage.upsert("a", {"name": "a"})
+        storage.upsert("b", {"name": "b"})
+        snapshot, committed = self.written(storage)
+        storage.upsert("c", {"name": "c"})
+        _, full = self.written(storage)
+
+        # Every cut inside the last line, newline excluded
+        for cut in range(len(committed), len(full)):
+            with self.subTest(cut=cut):
+                torn = self.reopen(snapshot, full[:cut])
+                self.assertEqual(sorted(torn.load()), ["a", "b"])
+                torn.upsert("d", {"name": "d"})
+                again = JournalStorage(torn.file_path)
+                self.assertEqual(sorted(again.load()), ["a", "b", "d"])
+                self.assertEqual(again.get("d"), {"name": "d", "_version": 1})
+                _, journal = self.written(again)
+                self.assertEqual(journal[: len(committed)], committed)
+                self.assertTrue(journal.endswith(b"\n"))
+
+
+class BatchTest(JournalStorageTestCase):
+    def test_partial_batch_is_all_or_nothing(self) -> None:
+        storage = JournalStorage(self.path)
+        storage.upsert("a", {"name": "a"})
+        snapshot, committed = self.written(storage)
+        storage.apply({"b": {"name": "b"}, "c": {"name": "c"}, "d": {"name": "d"}}, ["a"])
+        _, full = self.written(storage)
+        self.assertEqual(full.count(b"\n"), committed.count(b"\n") + 1)
+
+        for cut in range(len(committed), len(full) + 1):
+            with self.subTest(cut=cut):
+                torn = self.reopen(snapshot, full[:cut])
+                expected = ["b", "c", "d"] if cut == len(full) else ["a"]
+                self.assertEqual(sorted(torn.load()), expected)
+                torn.upsert("e", {"name": "e"})
+                again = JournalStorage(torn.file_path)
+                self.assertEqual(sorted(again.load()), sorted(expected + ["e"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
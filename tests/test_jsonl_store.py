@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from assistant.services.notes_service import NotesService
+from assistant.storage.factory import open_storage
+from assistant.storage.jsonl_store import JSONLStorage
+from assistant.utils.io import read_data
+
+
+class JSONLStorageTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = os.path.join(self._tmp.name, "notes.json")
+
+
+class SidecarTest(JSONLStorageTestCase):
+    def test_notes_service_close_saves_the_sidecar(self) -> None:
+        notes = NotesService(open_storage(self.path, "jsonl", kind="notes"))
+        for i in range(50):
+            notes.add_note(f"note {i}", tags_text="a")
+        notes.close()
+
+        storage = JSONLStorage(self.path)
+        _, end, _, offsets = read_data(storage.index_path)
+        self.assertEqual(end, os.path.getsize(storage.file_path))
+        self.assertEqual(len(offsets), 50)
+        self.assertEqual(len(storage.load()), 50)
+        storage.close()
+
+
+class TornAppendTest(JSONLStorageTestCase):
+    def reopen(self, payload: bytes) -> JSONLStorage:
+        # A fresh store over `payload`, as left by a writer that died; no sidecar
+        directory = tempfile.mkdtemp(dir=self._tmp.name)
+        path = os.path.join(directory, "notes.json")
+        storage = JSONLStorage(path)
+        with open(storage.file_path, "wb") as f:
+            f.write(payload)
+        storage.close()
+        return JSONLStorage(path)
+
+    def test_batch_is_all_or_nothing(self) -> None:
+        storage = JSONLStorage(self.path)
+        storage.upsert("a", {"text": "a"})
+        committed = os.path.getsize(storage.file_path)
+        storage.apply({"b": {"text": "b"}, "c": {"text": "c"}, "d": {"text": "d"}}, ["a"])
+        storage.close()
+        with open(storage.file_path, "rb") as f:
+            full = f.read()
+
+        for cut in range(committed, len(full) + 1):
+            with self.subTest(cut=cut):
+                torn = self.reopen(full[:cut])
+                expected = ["b", "c", "d"] if cut == len(full) else ["a"]
+                self.assertEqual(sorted(torn.load()), expected)
+                # The next write drops the torn part instead of extending it
+                torn.upsert("e", {"text": "e"})
+                torn.close()
+                again = JSONLStorage(torn.file_path[: -len(".jsonl")] + ".json")
+                self.assertEqual(sorted(again.load()), sorted(expected + ["e"]))
+                self.assertEqual(again.get("e"), {"text": "e", "_version": 1})
+                again.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import stat
+import tempfile
+import threading
+import unittest
+from typing import Any
+from unittest import mock
+
+from assistant.cli import repl
+from assistant.cli.client import Client, connect
+from assistant.cli.repl import App
+from assistant.cli.server import Request, Server
+
+
+class _FailingApp(App):
+    # "boom" stages a write and then fails, like a command that breaks half way
+    def handle_line(self, line: str) -> bool:
+        if line == "boom":
+            self.contacts.add_contact("Ghost")
+            raise RuntimeError("boom")
+        return super().handle_line(line)
+
+
+class ServerTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        for name, path in (("CONTACTS_FILE", "contacts.json"), ("NOTES_FILE", "notes.json")):
+            patcher = mock.patch.object(repl, name, os.path.join(tmp.name, path))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.server = self.start(socket_path=os.path.join(tmp.name, "assistant.sock"))
+
+    def start(self, **kwargs: Any) -> Server:
+        with mock.patch("assistant.cli.server.App", _FailingApp):
+            server = Server(**kwargs)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        def stop() -> None:
+            server.shutdown()
+            thread.join()
+
+        self.addCleanup(stop)
+        return server
+
+
+class GroupCommitTest(ServerTestCase):
+    def test_failed_command_is_not_committed_with_its_group(self) -> None:
+        group = [Request({"command": line}) for line in ("contact add name=Anna", "boom", "contact add name=Bob")]
+        self.server._run_group(group)
+        self.assertEqual([request.response["ok"] for request in group], [True, False, True])
+        self.assertEqual(group[1].response["output"], ["Error: boom"])
+
+        names = sorted(c["name"] for c in self.server._app.contacts.list_contacts())
+        self.assertEqual(names, ["Anna", "Bob"])
+        self.assertEqual(self.server._app.contacts.search_contacts("ghost"), [])
+        reopened = App()
+        self.addCleanup(reopened.close)
+        self.assertEqual(sorted(c["name"] for c in reopened.contacts.list_contacts()), ["Anna", "Bob"])
+
+
+class AccessTest(ServerTestCase):
+    def test_unix_socket_is_private(self) -> None:
+        assert self.server.socket_path is not None
+        self.assertEqual(stat.S_IMODE(os.stat(self.server.socket_path).st_mode), 0o600)
+        with Client(self.server.socket_path) as client:
+            self.assertTrue(client.run("contact list")["ok"])
+
+    def test_tcp_requires_the_token(self) -> None:
+        token_path = os.path.join(self.dir, "server.token")
+        server = self.start(port=0, token_path=token_path)
+        port = int(server.address.rsplit(":", 1)[1])
+        self.assertEqual(stat.S_IMODE(os.stat(token_path).st_mode), 0o600)
+
+        with Client(port=port, token_path=token_path) as client:
+            self.assertTrue(client.run("contact add name=Anna")["ok"])
+
+        wrong = os.path.join(self.dir, "wrong.token")
+        with open(wrong, "w") as f:
+            f.write("0" * 64)
+        with self.assertRaises(PermissionError):
+            Client(port=port, token_path=wrong)
+
+        # Commands before authenticating are refused and end the connection
+        sock = connect(port=port)
+        with sock, sock.makefile("rb") as reader:
+            sock.sendall(b'{"command": "contact list"}\n')
+            self.assertIn(b'"ok": false', reader.readline())
+            self.assertEqual(reader.readline(), b"")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import threading
+import unittest
+from typing import List
+from unittest import mock
+
+from assistant.storage.sharded_store import ShardedStorage, shard_of
+
+
+SHARDS = 4
+
+
+class ShardedStorageTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = os.path.join(self._tmp.name, "contacts.json")
+        self.storage = ShardedStorage(self.path, shards=SHARDS)
+
+    def ids_in_distinct_shards(self) -> List[str]:
+        ids = {}
+        i = 0
+        while len(ids) < SHARDS:
+            ids.setdefault(shard_of(f"id{i}", SHARDS), f"id{i}")
+            i += 1
+        return list(ids.values())
+
+    def shard_files(self) -> List[str]:
+        return [
+            name
+            for _, _, names in os.walk(self.storage.file_path)
+            for name in names
+            if name.startswith("shard-") and name.endswith(".json")
+        ]
+
+
+class BatchTest(ShardedStorageTestCase):
+    def test_readers_see_all_of_a_batch_or_none(self) -> None:
+        # Two records in different shards always hold 100 between them
+        a, b = self.ids_in_distinct_shards()[:2]
+        self.storage.apply({a: {"n": 100}, b: {"n": 0}}, [])
+        reader = ShardedStorage(self.path)
+        torn: List[int] = []
+        done = threading.Event()
+
+        def read() -> None:
+            while not done.is_set():
+                data = reader.load()
+                total = data[a]["n"] + data[b]["n"]
+                if total != 100:
+                    torn.append(total)
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        try:
+            for i in range(1, 200):
+                self.storage.apply({a: {"n": 100 - i % 100}, b: {"n": i % 100}}, [])
+        finally:
+            done.set()
+            thread.join()
+        self.assertEqual(torn, [])
+
+    def test_crash_before_commit_keeps_nothing(self) -> None:
+        ids = self.ids_in_distinct_shards()
+        self.storage.apply({ids[0]: {"n": 1}}, [])
+        with mock.patch.object(ShardedStorage, "_switch", side_effect=OSError("crash")):
+            with self.assertRaises(OSError):
+                self.storage.apply({entity_id: {"n": 2} for entity_id in ids}, [ids[0]])
+        reopened = ShardedStorage(self.path)
+        self.assertEqual(reopened.load(), {ids[0]: {"n": 1, "_version": 1}})
+
+    def test_old_files_are_removed(self) -> None:
+        ids = self.ids_in_distinct_shards()
+        for i in range(10):
+            self.storage.apply({entity_id: {"n": i} for entity_id in ids}, [])
+        # The current set and the previous manifest's
+        self.assertLessEqual(len(self.shard_files()), 2 * SHARDS)
+        reopened = ShardedStorage(self.path)
+        self.assertEqual({entity_id: record["n"] for entity_id, record in reopened.load().items()}, dict.fromkeys(ids, 9))
+
+    def test_single_shard_write_stays_in_place(self) -> None:
+        a = self.ids_in_distinct_shards()[0]
+        self.storage.upsert(a, {"n": 1})
+        self.storage.apply({a: {"n": 2}}, [])
+        self.assertEqual(len(self.shard_files()), SHARDS)
+        self.assertEqual(ShardedStorage(self.path).get(a), {"n": 2, "_version": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()